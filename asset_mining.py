@@ -0,0 +1,223 @@
+# asset_mining.py
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+
+from log_stream import iter_records, peak_rss_mb
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOURCES = ['predictpulse_mockdata.json', 'predictpulse_realdata.json']
+DEFAULT_OUTPUT = 'public/asset_bundles.json'
+DEFAULT_MIN_SUPPORT = 0.3
+DEFAULT_MIN_CONFIDENCE = 0.8
+DEFAULT_MAX_COUNTERS = 100_000
+REQUIRED_KEYS = ['page', 'assets']
+
+class LossyCounter:
+    """Frequency counts in bounded memory (Misra-Gries with batched decrements).
+
+    When more than ``capacity`` keys are held, the median count is subtracted from every
+    key and keys that reach zero are dropped. A count is then an underestimate by at most
+    ``error``, and any key more frequent than ``error`` is still present.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.error = 0
+
+    def add(self, key, weight=1):
+        self.counts[key] = self.counts.get(key, 0) + weight
+        if len(self.counts) > self.capacity:
+            cut = sorted(self.counts.values())[len(self.counts) // 2]
+            self.error += cut
+            self.counts = {k: c - cut for k, c in self.counts.items() if c > cut}
+
+    def get(self, key):
+        return self.counts.get(key, 0)
+
+    def __len__(self):
+        return len(self.counts)
+
+class AssetCooccurrence:
+    """One streaming pass of per-page asset support, cache misses and asset pair co-occurrence.
+
+    Each visit counts an asset once; it counts as a miss when any of its requests in that
+    visit was not served from cache.
+    """
+
+    def __init__(self, max_counters=DEFAULT_MAX_COUNTERS):
+        self.visits = Counter()
+        self.requests = LossyCounter(max_counters)
+        self.misses = LossyCounter(max_counters)
+        self.asset_visits = LossyCounter(max_counters)
+        self.pairs = LossyCounter(max_counters)
+        self.types = {}
+        self.max_counters = max_counters
+
+    def add_visit(self, entry):
+        page = entry['page'].lower()
+        missed = {}
+        for asset in entry['assets']:
+            url = asset.get('url')
+            if not url:
+                continue
+            missed[url] = missed.get(url, False) or not asset.get('fromCache', False)
+            if url not in self.types:
+                self.types[url] = asset.get('type')
+        self.visits[page] += 1
+        for url, miss in missed.items():
+            self.requests.add((page, url))
+            self.asset_visits.add(url)
+            if miss:
+                self.misses.add((page, url))
+        urls = sorted(missed)
+        for i, a in enumerate(urls):
+            for b in urls[i + 1:]:
+                self.pairs.add((a, b))
+        if len(self.types) > 2 * self.max_counters:
+            self.types = {url: t for url, t in self.types.items() if url in self.asset_visits.counts}
+
+    def confidence(self, a, b):
+        """Share of the visits requesting ``a`` that also request ``b``."""
+        together = self.pairs.get((a, b) if a < b else (b, a))
+        return together / self.asset_visits.get(a) if self.asset_visits.get(a) else 0.0
+
+    def core_sets(self, min_support):
+        """Page -> assets requested on at least ``min_support`` of its visits, most-missed first."""
+        pages = {}
+        for (page, url), count in self.requests.counts.items():
+            support = count / self.visits[page]
+            if support >= min_support:
+                pages.setdefault(page, []).append({
+                    'url': url, 'type': self.types.get(url), 'support': round(support, 4),
+                    'miss_rate': round(self.misses.get((page, url)) / self.visits[page], 4),
+                })
+        for assets in pages.values():
+            assets.sort(key=lambda a: (-a['miss_rate'], -a['support'], a['url']))
+        return dict(sorted(pages.items()))
+
+    def shared_bundles(self, core, min_confidence):
+        """Groups of assets in the core set of the same two or more pages and requested together.
+
+        Assets sharing a page set are split greedily, most requested first, so that every
+        pair in a bundle has confidence of at least ``min_confidence`` in both directions.
+        """
+        by_pages = {}
+        for page, assets in core.items():
+            for asset in assets:
+                by_pages.setdefault(asset['url'], set()).add(page)
+        groups = {}
+        for url, pages in by_pages.items():
+            if len(pages) >= 2:
+                groups.setdefault(tuple(sorted(pages)), []).append(url)
+
+        bundles = []
+        for pages, urls in groups.items():
+            members = []
+            for url in sorted(urls, key=lambda u: (-self.asset_visits.get(u), u)):
+                for bundle in members:
+                    if all(min(self.confidence(url, other), self.confidence(other, url)) >= min_confidence
+                           for other in bundle):
+                        bundle.append(url)
+                        break
+                else:
+                    members.append([url])
+            visits = sum(self.visits[p] for p in pages)
+            for bundle in members:
+                confidence = min((min(self.confidence(a, b), self.confidence(b, a))
+                                  for i, a in enumerate(bundle) for b in bundle[i + 1:]), default=1.0)
+                assets = [{'url': url, 'type': self.types.get(url),
+                           'miss_rate': round(sum(self.misses.get((p, url)) for p in pages) / visits, 4)}
+                          for url in bundle]
+                assets.sort(key=lambda a: (-a['miss_rate'], a['url']))
+                bundles.append({
+                    'pages': list(pages),
+                    'assets': assets,
+                    'support': round(min(self.requests.get((p, url)) / self.visits[p] for p in pages for url in bundle), 4),
+                    'confidence': round(confidence, 4),
+                    'miss_rate': round(max(a['miss_rate'] for a in assets), 4),
+                })
+        bundles.sort(key=lambda b: (-len(b['pages']), -b['miss_rate'], b['assets'][0]['url']))
+        return bundles
+
+    def error_bounds(self):
+        return {'requests': self.requests.error, 'misses': self.misses.error,
+                'asset_visits': self.asset_visits.error, 'pairs': self.pairs.error}
+
+def mine_assets(sources, min_support=DEFAULT_MIN_SUPPORT, min_confidence=DEFAULT_MIN_CONFIDENCE,
+                max_counters=DEFAULT_MAX_COUNTERS):
+    """Stream every source once and return the core sets, shared bundles and run statistics."""
+    start = time.perf_counter()
+    mining = AssetCooccurrence(max_counters)
+    stats = {}
+    for path in sources:
+        if not os.path.exists(path):
+            logger.info(f"Skipping missing source {path}")
+            continue
+        for entry in iter_records(path, REQUIRED_KEYS, stats):
+            mining.add_visit(entry)
+    mined = time.perf_counter()
+    core = mining.core_sets(min_support)
+    bundles = mining.shared_bundles(core, min_confidence)
+    report = {
+        'thresholds': {'min_support': min_support, 'min_confidence': min_confidence, 'max_counters': max_counters},
+        'stats': {
+            'records': stats.get('valid', 0), 'pages': len(mining.visits), 'assets': len(mining.asset_visits),
+            'pairs': len(mining.pairs), 'count_error_bounds': mining.error_bounds(),
+            'scan_seconds': round(mined - start, 3), 'mine_seconds': round(time.perf_counter() - mined, 3),
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+        },
+        'pages': core,
+        'bundles': bundles,
+    }
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mine per-page core asset sets and cross-page shared bundles.')
+    parser.add_argument('--data', nargs='+', default=DEFAULT_SOURCES,
+                        help='Logs to scan (JSON array, NDJSON or .gz/.zst NDJSON); missing files are skipped')
+    parser.add_argument('--min-support', type=float, default=DEFAULT_MIN_SUPPORT,
+                        help="Smallest share of a page's visits that must request an asset")
+    parser.add_argument('--min-confidence', type=float, default=DEFAULT_MIN_CONFIDENCE,
+                        help='Smallest pairwise co-request confidence within a shared bundle')
+    parser.add_argument('--max-counters', type=int, default=DEFAULT_MAX_COUNTERS,
+                        help='Counters kept per table before the least frequent are pruned')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    args = parser.parse_args(argv)
+
+    report = mine_assets(args.data, args.min_support, args.min_confidence, args.max_counters)
+    stats = report['stats']
+    if not stats['records']:
+        logger.error("No log records with page and assets found")
+        sys.exit(1)
+    for page, assets in report['pages'].items():
+        top = ', '.join(f"{a['url'].rsplit('/', 1)[-1]} {a['miss_rate']:.2f}" for a in assets[:4])
+        logger.info(f"Core set {page}: {len(assets)} assets (miss rate: {top})")
+    for bundle in report['bundles']:
+        logger.info(f"Shared bundle over {','.join(bundle['pages'])}: "
+                    f"{[a['url'].rsplit('/', 1)[-1] for a in bundle['assets']]} support {bundle['support']:.2f}, "
+                    f"confidence {bundle['confidence']:.2f}, miss rate {bundle['miss_rate']:.2f}")
+    total = stats['scan_seconds'] + stats['mine_seconds']
+    logger.info(f"Mined {stats['records']} visits ({stats['pages']} pages, {stats['assets']} assets, "
+                f"{stats['pairs']} pairs) at min support {args.min_support}, min confidence {args.min_confidence} "
+                f"in {total:.2f}s ({stats['records'] / max(total, 1e-9):.0f} visits/sec), "
+                f"count error bound {max(stats['count_error_bounds'].values())}, peak RSS {stats['peak_rss_mb']} MB")
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Asset bundles saved to {args.output}")
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()
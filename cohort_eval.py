@@ -0,0 +1,351 @@
+# cohort_eval.py
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ['device', 'browser', 'page', 'prev_page', 'entry_page', 'screen_band', 'hour', 'window']
+DEFAULT_DIMENSIONS = ['device', 'browser', 'entry_page', 'screen_band', 'window']
+DEFAULT_WIDTH_BANDS = [576, 768, 992, 1200]
+DEFAULT_WINDOW_HOURS = 24
+DEFAULT_REPLICATES = 200
+DEFAULT_CI = 0.95
+DEFAULT_MIN_ROWS = 30
+DEFAULT_OUTPUT = 'cohort_results.json'
+METRICS = ['accuracy', 'precision', 'recall', 'f1_score', 'resource_efficiency', 'load_time_avg']
+# Rows x replicates per resampling block: a 16 MB float32 weight matrix
+BLOCK_CELLS = 1 << 22
+POISSON_BITS = 16
+
+def _poisson_cuts(bits=POISSON_BITS):
+    """Thresholds on ``bits``-bit uniforms: a Poisson(1) draw is the number of thresholds reached."""
+    cdf = np.cumsum([math.exp(-1) / math.factorial(k) for k in range(20)])
+    cuts = np.round(cdf * (1 << bits)).astype(np.int64)
+    return [int(cut) for cut in cuts if cut < 1 << bits]
+
+POISSON_CUTS = _poisson_cuts()
+
+def poisson_weights(rng, shape):
+    """Poisson(1) bootstrap weights as float32, from four 16-bit uniforms per raw 64-bit draw."""
+    uniforms = rng.bit_generator.random_raw(-(-int(np.prod(shape)) // 4)).view(np.uint16)[:int(np.prod(shape))]
+    weights = np.zeros(len(uniforms), dtype=np.uint8)
+    for cut in POISSON_CUTS:
+        np.add(weights, uniforms >= cut, out=weights, casting='unsafe')
+    return weights.reshape(shape).astype(np.float32)
+
+def _factorized(values, labels=None):
+    """Dense codes for the values present, sorted, and their labels (``labels[value]`` for integer values)."""
+    import pandas as pd
+
+    codes, uniques = pd.factorize(values, sort=True)
+    return codes, [str(labels[u] if labels is not None else u) for u in uniques]
+
+def width_band_labels(bands):
+    return ([f"<{bands[0]}"] + [f"{lo}-{hi - 1}" for lo, hi in zip(bands, bands[1:])] + [f">={bands[-1]}"])
+
+def cohort_codes(columns, dimension, width_bands=DEFAULT_WIDTH_BANDS, window_hours=DEFAULT_WINDOW_HOURS):
+    """Per-row cohort code and the cohort labels for ``dimension``; ``a+b`` crosses two dimensions.
+
+    ``window`` cohorts are ``window_hours``-long UTC windows and ``hour`` is the UTC hour of day,
+    both from the ``ts`` column; rows without a usable timestamp fall in ``unknown``.
+    """
+    if '+' in dimension:
+        combined, labels = None, []
+        for part in dimension.split('+'):
+            codes, part_labels = cohort_codes(columns, part, width_bands, window_hours)
+            combined = codes.astype(np.int64) if combined is None else combined * len(part_labels) + codes
+            labels.append(part_labels)
+        codes, uniques = _factorized(combined)
+        names = []
+        for value in map(int, uniques):
+            parts = []
+            for part_labels in reversed(labels):
+                value, code = divmod(value, len(part_labels))
+                parts.append(part_labels[code])
+            names.append('|'.join(reversed(parts)))
+        return codes, names
+    if dimension == 'screen_band':
+        bands = sorted(width_bands)
+        return _factorized(np.searchsorted(bands, columns['screenWidth'].to_numpy(), side='right'),
+                           width_band_labels(bands))
+    if dimension in ('hour', 'window'):
+        ts = columns['ts'].to_numpy(dtype=np.float64)
+        known = np.isfinite(ts)
+        if dimension == 'hour':
+            values = np.where(known, np.floor(np.where(known, ts, 0) / 3600) % 24, 24).astype(np.int64)
+            return _factorized(values, [f"{h:02d}:00" for h in range(24)] + ['unknown'])
+        width = window_hours * 3600
+        values = np.where(known, np.floor(np.where(known, ts, 0) / width), -1).astype(np.int64)
+        codes, uniques = _factorized(values)
+        return codes, ['unknown' if int(u) < 0 else
+                       datetime.fromtimestamp(int(u) * width, timezone.utc).strftime('%Y-%m-%dT%H:%MZ')
+                       for u in uniques]
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"Unknown cohort dimension {dimension!r}; choose from {DIMENSIONS} or cross them with '+'")
+    return _factorized(columns[dimension].to_numpy())
+
+def metrics_from_counts(n, correct, cache_hits, load_sum, tp, support, predicted):
+    """``evaluate.compute_metrics``-style weighted metrics from (weighted) counts.
+
+    Every argument may carry leading dimensions (cohorts, replicates); the per-class arrays
+    have classes last. Weighted recall is always the accuracy.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predicted > 0, tp / predicted, 0.0)
+        f1 = np.where(support + predicted > 0, 2 * tp / (support + predicted), 0.0)
+        accuracy = np.where(n > 0, correct / n, 0.0)
+        return {
+            'accuracy': accuracy,
+            'precision': np.where(n > 0, (precision * support).sum(axis=-1) / n, 0.0),
+            'recall': accuracy,
+            'f1_score': np.where(n > 0, (f1 * support).sum(axis=-1) / n, 0.0),
+            'resource_efficiency': np.where(n > 0, cache_hits / n * 100, 0.0),
+            'load_time_avg': np.where(n > 0, load_sum / n, 0.0),
+        }
+
+def grouped_metrics(codes, n_groups, y_true, y_pred, n_classes, cache_hit, load_time):
+    """Metrics of every cohort in one pass of ``bincount`` over ``cohort * n_classes + label``."""
+    correct = (y_true == y_pred).astype(np.float64)
+    true_index = codes * n_classes + y_true
+    cells = n_groups * n_classes
+    tp = np.bincount(true_index, weights=correct, minlength=cells).reshape(n_groups, n_classes)
+    support = np.bincount(true_index, minlength=cells).reshape(n_groups, n_classes).astype(np.float64)
+    predicted = np.bincount(codes * n_classes + y_pred, minlength=cells).reshape(n_groups, n_classes).astype(np.float64)
+    n = support.sum(axis=1)
+    return n, metrics_from_counts(n, tp.sum(axis=1), np.bincount(codes, weights=cache_hit, minlength=n_groups),
+                                  np.bincount(codes, weights=load_time, minlength=n_groups), tp, support, predicted)
+
+def bootstrap(rows, y_true, y_pred, n_classes, cache_hit, load_time, replicates, seed):
+    """Metrics of ``replicates`` Poisson-bootstrap resamples of ``rows``, as arrays of length ``replicates``.
+
+    Each row gets a Poisson(1) weight per replicate. The weighted counts of a block of rows
+    are two products with its (rows x replicates) weight matrix: a dense one for the row
+    totals and a sparse one for the per-class counts, so no loop runs over replicates.
+    """
+    import scipy.sparse as sp
+
+    rng = np.random.default_rng(seed)
+    totals = np.zeros((4, replicates))
+    per_class = np.zeros((3 * n_classes, replicates))
+    block = max(1, BLOCK_CELLS // replicates)
+    for start in range(0, len(rows), block):
+        r = rows[start:start + block]
+        m = len(r)
+        weights = poisson_weights(rng, (m, replicates))
+        correct = (y_true[r] == y_pred[r]).astype(np.float32)
+        # Rows: n, correct, cache hits, load time
+        totals += np.stack([np.ones(m, dtype=np.float32), correct, cache_hit[r], load_time[r]]).astype(np.float32) @ weights
+        # Rows: support, tp and predictions of each class
+        indicators = sp.csr_matrix(
+            (np.concatenate([np.ones(m, dtype=np.float32), correct, np.ones(m, dtype=np.float32)]),
+             (np.concatenate([y_true[r], n_classes + y_true[r], 2 * n_classes + y_pred[r]]), np.tile(np.arange(m), 3))),
+            shape=(3 * n_classes, m))
+        per_class += indicators @ weights
+    support, tp, predicted = (counts.T for counts in np.split(per_class, 3))
+    return metrics_from_counts(*totals, tp, support, predicted)
+
+# Set in the parent before a fork-based pool starts, so workers read the arrays without pickling them
+_bootstrap_source = None
+
+def _bootstrap_task(task):
+    dimension_index, group, start, end = task
+    y_true, y_pred, n_classes, cache_hit, load_time, orders, replicates, seed, ci = _bootstrap_source
+    resamples = bootstrap(orders[dimension_index][start:end], y_true, y_pred, n_classes, cache_hit, load_time,
+                          replicates, [seed, dimension_index, group])
+    tail = (1 - ci) / 2 * 100
+    return dimension_index, group, {metric: np.percentile(values, [tail, 100 - tail]).tolist()
+                                    for metric, values in resamples.items()}
+
+def _run_tasks(tasks, workers):
+    if workers > 1 and len(tasks) > 1:
+        import multiprocessing
+
+        if 'fork' in multiprocessing.get_all_start_methods():
+            # Largest cohorts first, so no worker is left with a big one at the end
+            tasks = sorted(tasks, key=lambda task: task[2] - task[3])
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                return list(pool.imap_unordered(_bootstrap_task, tasks, chunksize=max(1, len(tasks) // (workers * 8))))
+        logger.warning("No fork start method; bootstrapping cohorts in this process")
+    return [_bootstrap_task(task) for task in tasks]
+
+def evaluate_cohorts(columns, y_true, y_pred, n_classes, dimensions=DEFAULT_DIMENSIONS, replicates=DEFAULT_REPLICATES,
+                     ci=DEFAULT_CI, min_rows=DEFAULT_MIN_ROWS, width_bands=DEFAULT_WIDTH_BANDS,
+                     window_hours=DEFAULT_WINDOW_HOURS, workers=None, seed=0):
+    """Per-cohort metrics with bootstrap confidence intervals, for each dimension plus ``all``.
+
+    ``columns`` are the ``evaluate`` prediction columns and ``y_true``/``y_pred`` their class
+    codes. Cohorts under ``min_rows`` rows are left out. A cohort is flagged ``below_overall``
+    when its accuracy interval lies entirely below the overall accuracy.
+    """
+    global _bootstrap_source
+
+    y_true = np.asarray(y_true, dtype=np.int64)
+    y_pred = np.asarray(y_pred, dtype=np.int64)
+    cache_hit = columns['next_cache_hit'].to_numpy(dtype=np.float64)
+    load_time = columns['next_load_time'].to_numpy(dtype=np.float64)
+    workers = workers or os.cpu_count() or 1
+
+    start = time.perf_counter()
+    slices, orders, tasks = [], [], []
+    for dimension in ['all'] + list(dimensions):
+        codes, labels = ((np.zeros(len(y_true), dtype=np.int64), ['all']) if dimension == 'all' else
+                         cohort_codes(columns, dimension, width_bands, window_hours))
+        n, metrics = grouped_metrics(codes, len(labels), y_true, y_pred, n_classes, cache_hit, load_time)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.concatenate([[0], np.cumsum(n)]).astype(np.int64)
+        kept = [g for g in range(len(labels)) if n[g] >= min_rows]
+        slices.append((dimension, labels, n, metrics, kept, len(labels) - len(kept)))
+        tasks += [(len(orders), g, int(bounds[g]), int(bounds[g + 1])) for g in kept]
+        orders.append(order)
+    grouped_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    intervals = {}
+    if replicates:
+        _bootstrap_source = (y_true, y_pred, n_classes, cache_hit, load_time, orders, replicates, seed, ci)
+        try:
+            for dimension_index, group, interval in _run_tasks(tasks, workers):
+                intervals[(dimension_index, group)] = interval
+        finally:
+            _bootstrap_source = None
+    bootstrap_s = time.perf_counter() - start
+
+    overall = float(slices[0][3]['accuracy'][0])
+    results = {}
+    for dimension_index, (dimension, labels, n, metrics, kept, dropped) in enumerate(slices):
+        cohorts = []
+        for g in kept:
+            cohort = {'cohort': labels[g], 'rows': int(n[g]),
+                      **{metric: round(float(metrics[metric][g]), 6) for metric in METRICS}}
+            interval = intervals.get((dimension_index, g))
+            if interval:
+                cohort['ci'] = {metric: [round(lo, 6), round(hi, 6)] for metric, (lo, hi) in interval.items()}
+                cohort['below_overall'] = interval['accuracy'][1] < overall
+            cohorts.append(cohort)
+        results[dimension] = {'cohorts': cohorts, 'dropped_small': dropped}
+    n_cohorts = sum(len(s[4]) for s in slices) - 1
+    logger.info(f"{n_cohorts} cohorts over {len(dimensions)} dimensions from {len(y_true)} predictions: grouped "
+                f"metrics {grouped_s:.3f}s, {replicates} bootstrap replicates {bootstrap_s:.3f}s "
+                f"({min(workers, max(len(tasks), 1))} workers)")
+    return {'rows': len(y_true), 'replicates': replicates, 'ci': ci, 'min_rows': min_rows, 'seed': seed,
+            'timing': {'grouped_s': round(grouped_s, 4), 'bootstrap_s': round(bootstrap_s, 4)},
+            'dimensions': results}
+
+def log_cohorts(report, worst=5):
+    """Log the overall metrics and, per dimension, the cohorts with the lowest accuracy."""
+    overall = report['dimensions']['all']['cohorts'][0]
+    level = f" ({report['ci']:.0%} intervals)" if report['replicates'] else ''
+
+    def interval(cohort, metric):
+        return f" [{cohort['ci'][metric][0]:.3f}, {cohort['ci'][metric][1]:.3f}]" if 'ci' in cohort else ''
+
+    logger.info(f"Overall: accuracy {overall['accuracy']:.4f}{interval(overall, 'accuracy')}, "
+                f"F1 {overall['f1_score']:.4f}{interval(overall, 'f1_score')}{level}")
+    for dimension, result in report['dimensions'].items():
+        if dimension == 'all':
+            continue
+        cohorts = result['cohorts']
+        flagged = sum(1 for cohort in cohorts if cohort.get('below_overall'))
+        logger.info(f"{dimension}: {len(cohorts)} cohorts ({result['dropped_small']} under {report['min_rows']} rows "
+                    f"left out), {flagged} significantly below overall accuracy")
+        for cohort in sorted(cohorts, key=lambda c: c['accuracy'])[:worst]:
+            logger.info(f"  {cohort['cohort']}: {cohort['rows']} rows, accuracy {cohort['accuracy']:.4f}"
+                        f"{interval(cohort, 'accuracy')}, F1 {cohort['f1_score']:.4f}{interval(cohort, 'f1_score')}"
+                        f"{'  BELOW OVERALL' if cohort.get('below_overall') else ''}")
+
+def add_arguments(parser):
+    """The cohort options of ``evaluate.py``."""
+    group = parser.add_argument_group('cohorts')
+    group.add_argument('--cohorts', nargs='*', metavar='DIMENSION',
+                       help=f"Also report metrics per cohort (implies --batch). Dimensions: {', '.join(DIMENSIONS)}, "
+                            f"or two crossed as device+browser; none given means {' '.join(DEFAULT_DIMENSIONS)}")
+    group.add_argument('--bootstrap', type=int, default=DEFAULT_REPLICATES,
+                       help='Poisson bootstrap replicates per cohort (0 for no intervals)')
+    group.add_argument('--ci', type=float, default=DEFAULT_CI, help='Confidence level of the intervals')
+    group.add_argument('--min-cohort-rows', type=int, default=DEFAULT_MIN_ROWS, help='Leave out smaller cohorts')
+    group.add_argument('--width-bands', type=int, nargs='+', default=DEFAULT_WIDTH_BANDS,
+                       help='screenWidth band edges in pixels')
+    group.add_argument('--window-hours', type=float, default=DEFAULT_WINDOW_HOURS,
+                       help='Length of the time-window cohorts')
+    group.add_argument('--cohort-workers', type=int, help='Processes bootstrapping cohorts (default: all cores)')
+    group.add_argument('--cohort-output', default=DEFAULT_OUTPUT)
+    group.add_argument('--seed', type=int, default=0, help='Bootstrap seed')
+
+def synthetic_predictions(rows, n_cohorts, n_classes=20, seed=0):
+    """Prediction columns and labels with ``n_cohorts`` entry pages and a per-cohort accuracy spread."""
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    entry = rng.zipf(1.3, rows) % n_cohorts
+    y_true = rng.integers(0, n_classes, rows)
+    hit_rate = rng.uniform(0.3, 0.9, n_cohorts)[entry]
+    y_pred = np.where(rng.random(rows) < hit_rate, y_true, rng.integers(0, n_classes, rows))
+    columns = pd.DataFrame({
+        'device': rng.choice(np.array(['iphone', 'mac', 'other'], dtype=object), rows),
+        'browser': rng.choice(np.array(['chrome', 'firefox', 'safari', 'mobile safari'], dtype=object), rows),
+        'entry_page': np.array([f"page{i}" for i in range(n_cohorts)], dtype=object)[entry],
+        'screenWidth': rng.choice([375, 414, 768, 1024, 1280, 1440, 1920], rows),
+        'ts': 1.7e9 + np.sort(rng.uniform(0, 30 * 86400, rows)),
+        'next_cache_hit': rng.random(rows) < 0.8,
+        'next_load_time': rng.gamma(2.0, 150.0, rows),
+    })
+    return columns, y_true, y_pred
+
+def bench(args):
+    """Time grouped metrics and the bootstrap on synthetic predictions, and check them against compute_metrics."""
+    from evaluate import compute_metrics
+
+    columns, y_true, y_pred = synthetic_predictions(args.rows, args.n_cohorts, args.classes, args.seed)
+    results = []
+    for workers in args.workers:
+        report = evaluate_cohorts(columns, y_true, y_pred, args.classes, args.dimensions, args.bootstrap,
+                                  min_rows=args.min_cohort_rows, workers=workers, seed=args.seed)
+        results.append({'workers': workers, **report['timing'],
+                        'cohorts': sum(len(d['cohorts']) for d in report['dimensions'].values())})
+    codes, labels = cohort_codes(columns, 'entry_page')
+    for cohort in report['dimensions']['entry_page']['cohorts'][:5]:
+        mask = codes == labels.index(cohort['cohort'])
+        expected = compute_metrics(y_true[mask], y_pred[mask], args.classes)
+        for metric in ('accuracy', 'precision', 'recall', 'f1_score'):
+            if not math.isclose(cohort[metric], expected[metric], abs_tol=1e-6):
+                logger.error(f"Cohort {cohort['cohort']} {metric} {cohort[metric]} != {expected[metric]}")
+                sys.exit(1)
+    logger.info("Grouped cohort metrics match compute_metrics on each cohort's rows")
+    for result in results:
+        logger.info(f"{args.rows} rows, {result['cohorts']} cohorts, {result['workers']} workers: grouped "
+                    f"{result['grouped_s']:.3f}s, bootstrap {result['bootstrap_s']:.3f}s")
+    with open(args.bench_output, 'w') as f:
+        json.dump({'rows': args.rows, 'replicates': args.bootstrap, 'dimensions': args.dimensions,
+                   'runs': results}, f, indent=2)
+    logger.info(f"Benchmark saved to {args.bench_output}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark cohort-sliced evaluation on synthetic predictions '
+                                                 '(evaluate.py --cohorts runs it on real ones).')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--n-cohorts', type=int, default=300, help='Distinct entry pages')
+    parser.add_argument('--classes', type=int, default=20)
+    parser.add_argument('--dimensions', nargs='+', default=['device', 'browser', 'entry_page', 'screen_band', 'window',
+                                                            'device+browser'])
+    parser.add_argument('--bootstrap', type=int, default=DEFAULT_REPLICATES)
+    parser.add_argument('--min-cohort-rows', type=int, default=DEFAULT_MIN_ROWS)
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bench-output', default='cohort_bench.json')
+    bench(parser.parse_args(argv))
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()
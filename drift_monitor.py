@@ -0,0 +1,618 @@
+# drift_monitor.py
+import argparse
+import bisect
+import heapq
+import json
+import logging
+import math
+import os
+import random
+import shlex
+import subprocess
+import sys
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+import numpy as np
+
+import instrumentation
+from generate_asset_map import timestamp_key, write_atomic
+from log_stream import REQUIRED_KEYS, is_plain_ndjson, iter_records
+from model_bundle import DEFAULT_BUNDLE_DIR
+
+logger = logging.getLogger(__name__)
+
+DRIFT_FEATURES = ['page', 'device', 'screenWidth', 'loadTime']
+NUMERIC_FEATURES = {'screenWidth', 'loadTime'}
+OTHER = '(other)'
+DEFAULT_SNAPSHOT = 'drift_snapshot.json'
+DEFAULT_OUTPUT = 'drift_windows.ndjson'
+DEFAULT_TRIGGER = 'retrain_trigger.json'
+DEFAULT_COOLDOWN = 24 * 3600
+SNAPSHOT_SAMPLE = 20000
+NUMERIC_BINS = 10
+MAX_CATEGORIES = 50
+# Proportions are floored here so an empty bin on either side keeps the PSI finite
+PSI_FLOOR = 1e-4
+
+def _feature_value(entry, feature):
+    value = entry[feature]
+    return value if feature in NUMERIC_FEATURES else str(value).lower()
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+class DriftSnapshot:
+    """Binned distribution of each drift feature in the training data.
+
+    Categorical features keep their ``MAX_CATEGORIES`` most frequent values plus an ``(other)``
+    bin. Numeric features are cut at the deciles of a reservoir sample, so the snapshot has a
+    fixed size however long the training log is.
+    """
+
+    def __init__(self, features, source=None, rows=0, created=None):
+        self.features = features
+        self.source = source
+        self.rows = rows
+        self.created = created
+        self._index = {name: {value: i for i, value in enumerate(spec['categories'])}
+                       for name, spec in features.items() if spec['kind'] == 'categorical'}
+        self.expected = {name: self._proportions(spec['counts']) for name, spec in features.items()}
+
+    @staticmethod
+    def _proportions(counts):
+        counts = np.asarray(counts, dtype=np.float64)
+        return np.maximum(counts / max(counts.sum(), 1), PSI_FLOOR)
+
+    @classmethod
+    def build(cls, records, source=None, sample_size=SNAPSHOT_SAMPLE, bins=NUMERIC_BINS,
+              max_categories=MAX_CATEGORIES, seed=0):
+        rng = random.Random(seed)
+        categorical = {name: Counter() for name in DRIFT_FEATURES if name not in NUMERIC_FEATURES}
+        samples = {name: [] for name in DRIFT_FEATURES if name in NUMERIC_FEATURES}
+        rows = 0
+        for entry in records:
+            rows += 1
+            for name, counts in categorical.items():
+                counts[_feature_value(entry, name)] += 1
+            # Reservoir sampling: every row is kept with probability sample_size / rows
+            slot = rows - 1 if rows <= sample_size else rng.randrange(rows)
+            for name, sample in samples.items():
+                if slot < sample_size:
+                    value = float(entry[name])
+                    if slot == len(sample):
+                        sample.append(value)
+                    else:
+                        sample[slot] = value
+        features = {}
+        for name, counts in categorical.items():
+            top = counts.most_common(max_categories)
+            features[name] = {'kind': 'categorical', 'categories': [value for value, _ in top] + [OTHER],
+                              'counts': [count for _, count in top] + [rows - sum(count for _, count in top)]}
+        for name, sample in samples.items():
+            sample = np.asarray(sample)
+            edges = (np.unique(np.quantile(sample, np.linspace(0, 1, bins + 1)[1:-1])).tolist()
+                     if len(sample) else [])
+            counts = np.bincount(np.searchsorted(edges, sample, side='right'), minlength=len(edges) + 1)
+            # Scale the sample's bin counts up to the number of training rows
+            features[name] = {'kind': 'numeric', 'edges': edges,
+                              'counts': (counts * (rows / max(len(sample), 1))).round().astype(int).tolist()}
+        return cls(features, source, rows, datetime.now(timezone.utc).isoformat())
+
+    @classmethod
+    def from_feature_table(cls, df, path):
+        """Snapshot of ``train_model``'s feature table, extracted from the log at ``path``."""
+        rows = (dict(zip(DRIFT_FEATURES, values)) for values in df[DRIFT_FEATURES].itertuples(index=False, name=None))
+        return cls.build(rows, {'path': path, 'signature': _file_signature(path)})
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls(data['features'], data.get('source'), data.get('rows', 0), data.get('created'))
+
+    def save(self, path):
+        write_atomic(path, json.dumps({'source': self.source, 'rows': self.rows, 'created': self.created,
+                                       'features': self.features}, indent=2))
+
+    def n_bins(self, name):
+        spec = self.features[name]
+        return len(spec['categories']) if spec['kind'] == 'categorical' else len(spec['edges']) + 1
+
+    def bin_index(self, name, value):
+        spec = self.features[name]
+        if spec['kind'] == 'categorical':
+            return self._index[name].get(value, len(spec['categories']) - 1)
+        return bisect.bisect_right(spec['edges'], value)
+
+    def psi(self, name, counts):
+        """Population stability index of ``counts`` (one per bin) against the training distribution."""
+        actual = self._proportions(counts)
+        expected = self.expected[name]
+        return float(((actual - expected) * np.log(actual / expected)).sum())
+
+class WindowStats:
+    """Additive event counts of a window: outcomes, cell counts of the confusion matrix,
+    load-time moments and per-bin drift counts.
+
+    ``add`` is O(1) per event, and ``merge``/``subtract`` cost the size of the other window,
+    so a sliding window can take in a pane or drop an expired one without rescanning its events.
+    """
+
+    def __init__(self, n_bins, ks):
+        self.ks = ks
+        self.events = 0
+        self.predictions = 0
+        self.hits = [0] * len(ks)
+        self.cache_hits = 0
+        self.load_sum = 0.0
+        self.load_sumsq = 0.0
+        self.cells = Counter()
+        self.bins = {name: [0] * n for name, n in n_bins.items()}
+
+    def add(self, event):
+        self.events += 1
+        load = event['load_time']
+        self.load_sum += load
+        self.load_sumsq += load * load
+        self.cache_hits += event['cache_hit']
+        for name, index in event['bins']:
+            self.bins[name][index] += 1
+        if event['cell'] is not None:
+            self.predictions += 1
+            self.cells[event['cell']] += 1
+            for i, hit in enumerate(event['hits']):
+                self.hits[i] += hit
+
+    def _combine(self, other, sign):
+        self.events += sign * other.events
+        self.predictions += sign * other.predictions
+        self.hits = [a + sign * b for a, b in zip(self.hits, other.hits)]
+        self.cache_hits += sign * other.cache_hits
+        self.load_sum += sign * other.load_sum
+        self.load_sumsq += sign * other.load_sumsq
+        for cell, count in other.cells.items():
+            self.cells[cell] += sign * count
+            if not self.cells[cell]:
+                del self.cells[cell]
+        for name, counts in other.bins.items():
+            own = self.bins[name]
+            for i, count in enumerate(counts):
+                own[i] += sign * count
+
+    def merge(self, other):
+        self._combine(other, 1)
+
+    def subtract(self, other):
+        self._combine(other, -1)
+
+    def summary(self, snapshot, n_classes):
+        """Metrics of the window; precision and F1 are support-weighted, as in ``evaluate.compute_metrics``."""
+        n = self.predictions
+        support, predicted, tp = Counter(), Counter(), Counter()
+        for cell, count in self.cells.items():
+            actual, pred = divmod(cell, n_classes)
+            support[actual] += count
+            predicted[pred] += count
+            if actual == pred:
+                tp[actual] += count
+        precision = sum(tp[c] / predicted[c] * support[c] for c in tp if predicted[c]) / n if n else 0.0
+        f1 = sum(2 * tp[c] / (support[c] + predicted[c]) * support[c] for c in tp) / n if n else 0.0
+        mean = self.load_sum / self.events if self.events else 0.0
+        variance = max(self.load_sumsq / self.events - mean * mean, 0.0) if self.events else 0.0
+        return {
+            'events': self.events,
+            'predictions': n,
+            'accuracy': round(sum(tp.values()) / n, 6) if n else None,
+            **{f"hit@{k}": round(hits / n, 6) if n else None for k, hits in zip(self.ks, self.hits)},
+            'precision': round(precision, 6),
+            'f1_score': round(f1, 6),
+            'cache_hit_rate': round(self.cache_hits / self.events, 6) if self.events else None,
+            'load_time_mean': round(mean, 3),
+            'load_time_std': round(math.sqrt(variance), 3),
+            'psi': {name: round(snapshot.psi(name, counts), 6) for name, counts in self.bins.items()},
+        }
+
+class TumblingWindow:
+    """Back-to-back windows of ``width`` seconds; ``add`` returns each window as it closes."""
+
+    def __init__(self, width, new_stats):
+        self.width = width
+        self.new_stats = new_stats
+        self.start = None
+        self.stats = new_stats()
+
+    def add(self, ts, event):
+        closed = None
+        if self.start is None:
+            self.start = math.floor(ts / self.width) * self.width
+        elif ts >= self.start + self.width:
+            closed = (self.start, self.start + self.width, self.stats)
+            self.start = math.floor(ts / self.width) * self.width
+            self.stats = self.new_stats()
+        self.stats.add(event)
+        return closed
+
+    def flush(self):
+        if self.start is None or not self.stats.events:
+            return None
+        return self.start, self.start + self.width, self.stats
+
+class SlidingWindow:
+    """The last ``panes`` complete panes of ``width / panes`` seconds, and their running total.
+
+    An event goes into the open pane only. When time moves into a new pane, the pane just
+    closed is merged into the total and panes older than the window are subtracted from it,
+    so each event costs O(1) amortized and memory is bounded by the pane count, not the
+    event rate.
+    """
+
+    def __init__(self, width, panes, new_stats):
+        self.pane_width = width / panes
+        self.panes = panes
+        self.new_stats = new_stats
+        self.ring = deque()
+        self.pane_id = None
+        self.pane = None
+        self.total = new_stats()
+
+    def add(self, ts, event):
+        """Add ``event``; True when it closed a pane, i.e. the window slid."""
+        pane_id = math.floor(ts / self.pane_width)
+        slid = False
+        if self.pane_id is None or pane_id > self.pane_id:
+            if self.pane is not None:
+                self.ring.append((self.pane_id, self.pane))
+                self.total.merge(self.pane)
+                slid = True
+            self.pane_id, self.pane = pane_id, self.new_stats()
+            while self.ring and self.ring[0][0] < pane_id - self.panes:
+                self.total.subtract(self.ring.popleft()[1])
+        # An event older than the open pane (beyond the reorder buffer) is counted in the open pane
+        self.pane.add(event)
+        return slid
+
+class DriftMonitor:
+    """Feed scored events in time order; writes tumbling-window rows and fires retrain triggers
+    from the sliding window.
+
+    A trigger fires when the sliding window holds at least ``min_events`` predictions and either
+    a feature's PSI exceeds ``psi_threshold`` or accuracy falls more than ``max_accuracy_drop``
+    below the reference. While the breach lasts, it fires again only every ``cooldown`` seconds of
+    stream time.
+    """
+
+    def __init__(self, snapshot, n_classes, ks, sliding_seconds, panes, tumbling_seconds, psi_threshold,
+                 max_accuracy_drop, min_events, reference_accuracy=None, cooldown=DEFAULT_COOLDOWN, output=None,
+                 trigger_path=DEFAULT_TRIGGER, on_trigger=None):
+        self.snapshot = snapshot
+        self.n_classes = n_classes
+        n_bins = {name: snapshot.n_bins(name) for name in DRIFT_FEATURES}
+        new_stats = lambda: WindowStats(n_bins, ks)
+        self.sliding = SlidingWindow(sliding_seconds, panes, new_stats)
+        self.tumbling = TumblingWindow(tumbling_seconds, new_stats)
+        self.psi_threshold = psi_threshold
+        self.max_accuracy_drop = max_accuracy_drop
+        self.min_events = min_events
+        self.reference_accuracy = reference_accuracy or None
+        self.cooldown = cooldown
+        self.output = output
+        self.trigger_path = trigger_path
+        self.on_trigger = on_trigger
+        self.process = None
+        self.last_trigger = None
+        self.triggers = []
+        self.windows = 0
+
+    def event(self, entry, prediction, actual):
+        """Bin ``entry`` for drift and score ``prediction`` (top-k class codes, or None) against ``actual``."""
+        cell = None
+        hits = ()
+        if prediction is not None:
+            cell = actual * self.n_classes + int(prediction[0])
+            hits = [actual in prediction[:k] for k in self.sliding.total.ks]
+        return {
+            'cell': cell,
+            'hits': hits,
+            'cache_hit': any(asset.get('fromCache', False) for asset in entry.get('assets', ())),
+            'load_time': float(entry['loadTime']),
+            'bins': [(name, self.snapshot.bin_index(name, _feature_value(entry, name))) for name in DRIFT_FEATURES],
+        }
+
+    def observe(self, ts, event):
+        closed = self.tumbling.add(ts, event)
+        if closed:
+            self._emit_window(*closed)
+        if self.sliding.add(ts, event):
+            self._check(self.sliding.pane_id * self.sliding.pane_width)
+
+    def finish(self):
+        closed = self.tumbling.flush()
+        if closed:
+            self._emit_window(*closed)
+
+    def _emit_window(self, start, end, stats):
+        self.windows += 1
+        instrumentation.current().count('windows_closed')
+        row = {'start': _iso(start), 'end': _iso(end), **stats.summary(self.snapshot, self.n_classes)}
+        logger.info(f"Window {row['start']}: {row['predictions']} predictions, accuracy "
+                    f"{_format(row['accuracy'])}, load {row['load_time_mean']:.0f}ms, "
+                    f"PSI {', '.join(f'{name} {value:.3f}' for name, value in row['psi'].items())}")
+        if self.output:
+            self.output.write(json.dumps(row) + '\n')
+            self.output.flush()
+
+    def _check(self, now):
+        stats = self.sliding.total
+        # Accuracy is undefined until something has been scored, whatever --min-events says
+        if stats.predictions < max(self.min_events, 1):
+            return
+        summary = stats.summary(self.snapshot, self.n_classes)
+        if self.reference_accuracy is None:
+            self.reference_accuracy = summary['accuracy']
+            logger.info(f"Reference accuracy {self.reference_accuracy:.4f} from the first full sliding window")
+        reasons = [f"{name} PSI {value:.3f} > {self.psi_threshold}" for name, value in summary['psi'].items()
+                   if value > self.psi_threshold]
+        if summary['accuracy'] < self.reference_accuracy - self.max_accuracy_drop:
+            reasons.append(f"accuracy {summary['accuracy']:.4f} < reference {self.reference_accuracy:.4f} "
+                           f"- {self.max_accuracy_drop}")
+        # No trigger fires within the cooldown of the last one, whether the breach persisted or came back
+        if not reasons or (self.last_trigger is not None and now - self.last_trigger < self.cooldown):
+            return
+        self.last_trigger = now
+        self.fire({'time': _iso(now), 'reasons': reasons, 'window': summary})
+
+    def fire(self, trigger):
+        self.triggers.append(trigger)
+        instrumentation.current().count('retrain_triggers')
+        logger.warning(f"Retrain trigger at {trigger['time']}: {'; '.join(trigger['reasons'])}")
+        if self.trigger_path:
+            write_atomic(self.trigger_path, json.dumps(trigger, indent=2))
+        if not self.on_trigger:
+            return
+        if self.process is not None and self.process.poll() is None:
+            logger.info(f"`{self.on_trigger}` (pid {self.process.pid}) is still running; not starting another")
+            return
+        # Started in the background so monitoring carries on while the model retrains
+        self.process = subprocess.Popen(shlex.split(self.on_trigger))
+        logger.info(f"Started `{self.on_trigger}` (pid {self.process.pid})")
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def _format(value):
+    return 'n/a' if value is None else f"{value:.4f}"
+
+def follow_records(path, poll_seconds, required_keys=REQUIRED_KEYS):
+    """Yield valid records of a plain NDJSON log as it grows, and None each time it is caught up."""
+    with open(path, 'rb') as f:
+        pending = b''
+        while True:
+            line = f.readline()
+            if not line:
+                yield None
+                time.sleep(poll_seconds)
+                continue
+            pending += line
+            if not pending.endswith(b'\n'):
+                continue
+            line, pending = pending, b''
+            if line.strip():
+                entry = json.loads(line)
+                if isinstance(entry, dict) and all(k in entry for k in required_keys):
+                    yield entry
+
+def in_time_order(records, buffer_size):
+    """Reorder ``records`` by timestamp through a heap of ``buffer_size`` entries.
+
+    Entries later than the buffer can absorb come out late and are counted as ``events_late``;
+    entries without a usable timestamp are dropped. A None (caught up) is passed through.
+    """
+    run = instrumentation.current()
+    heap = []
+    seq = 0
+    last = float('-inf')
+    for entry in records:
+        if entry is None:
+            yield None
+            continue
+        ts = timestamp_key(entry['timestamp'])
+        if ts == float('-inf'):
+            run.count('events_untimed')
+            continue
+        heapq.heappush(heap, (ts, seq, entry))
+        seq += 1
+        if len(heap) > buffer_size:
+            ts, _, entry = heapq.heappop(heap)
+            if ts < last:
+                run.count('events_late')
+            last = max(last, ts)
+            yield ts, entry
+    while heap:
+        ts, _, entry = heapq.heappop(heap)
+        if ts < last:
+            run.count('events_late')
+        last = max(last, ts)
+        yield ts, entry
+
+def score_batch(pairs, model, ks):
+    """Top-k predicted class codes for each (entry, next entry) pair whose page the model knows, else None."""
+    import pandas as pd
+
+    from evaluate import build_feature_matrix
+
+    clf, ohe, page_encoder, scaler, feature_names, transition_freq, page_map = model
+    known = [i for i, (entry, _) in enumerate(pairs) if entry['page'].lower() in page_map]
+    predictions = [None] * len(pairs)
+    if not known:
+        return predictions
+    rows = [pairs[i][0] for i in known]
+    columns = pd.DataFrame({
+        'page': [entry['page'].lower() for entry in rows],
+        'prev_page': [entry['navPath'][-2].lower() if len(entry['navPath']) >= 2 else 'none' for entry in rows],
+        'device': [entry['device'].lower() for entry in rows],
+        'browser': [entry['browser'].lower() for entry in rows],
+        'screenWidth': [entry['screenWidth'] for entry in rows],
+        'loadTime': [entry['loadTime'] for entry in rows],
+        'transition_next': [pairs[i][1]['page'].lower() for i in known],
+    })
+    proba = clf.predict_proba(build_feature_matrix(columns, transition_freq, ohe, scaler, feature_names))
+    top = np.argsort(-proba, axis=1, kind='stable')[:, :max(ks)]
+    codes = np.array([page_map[page] for page in page_encoder.classes_])[top]
+    for i, row in zip(known, codes.tolist()):
+        predictions[i] = row
+    return predictions
+
+def run_stream(records, monitor, model, ks, batch_events):
+    """Score consecutive events in batches of ``batch_events`` and feed them to ``monitor`` in order.
+
+    The prediction made at an event is scored when the next event arrives; pages outside the
+    model vocabulary are an extra class that is never predicted. Returns the event count.
+    """
+    page_map = model[-1]
+    other = len(page_map)
+    previous = None
+    batch = []
+    events = 0
+
+    def flush():
+        nonlocal previous
+        # batch[i] is scored against the prediction made at the event before it
+        before = [previous] + batch[:-1]
+        scored = [i for i, prior in enumerate(before) if prior is not None]
+        predictions = dict(zip(scored, score_batch([(before[i][1], batch[i][1]) for i in scored], model, ks)))
+        for i, (ts, entry) in enumerate(batch):
+            monitor.observe(ts, monitor.event(entry, predictions.get(i), page_map.get(entry['page'].lower(), other)))
+        previous = batch[-1]
+        batch.clear()
+
+    for item in records:
+        if item is None:
+            if batch:
+                flush()
+            continue
+        batch.append(item)
+        events += 1
+        if len(batch) >= batch_events:
+            flush()
+    if batch:
+        flush()
+    monitor.finish()
+    return events
+
+def load_snapshot(args):
+    """The training snapshot ``train_model.py`` wrote, or one built from ``--training-data`` when asked to."""
+    if os.path.exists(args.snapshot) and not (args.rebuild_snapshot and args.training_data):
+        snapshot = DriftSnapshot.load(args.snapshot)
+        source = snapshot.source or {}
+        if (source.get('path') and os.path.exists(source['path'])
+                and _file_signature(source['path']) != source.get('signature')):
+            logger.warning(f"{source['path']} changed since the snapshot was taken; retraining on it "
+                           f"with train_model.py rewrites {args.snapshot}")
+        logger.info(f"Training snapshot {args.snapshot}: {snapshot.rows} rows from {source.get('path')}")
+        return snapshot
+    if not args.training_data:
+        logger.error(f"No training snapshot at {args.snapshot}; train_model.py writes one, "
+                     f"or pass --training-data with the log the model was trained on")
+        sys.exit(1)
+    try:
+        source = {'path': args.training_data, 'signature': _file_signature(args.training_data)}
+        snapshot = DriftSnapshot.build(iter_records(args.training_data), source)
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to build the training snapshot from {args.training_data}: {e}")
+        sys.exit(1)
+    if not snapshot.rows:
+        logger.error(f"No valid entries in {args.training_data} for the training snapshot")
+        sys.exit(1)
+    snapshot.save(args.snapshot)
+    logger.info(f"Training snapshot of {snapshot.rows} rows from {args.training_data} saved to {args.snapshot}")
+    return snapshot
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Replay or follow a log in time order, tracking windowed model '
+                                                 'quality and feature drift against the training data.')
+    parser.add_argument('--data', default='predictpulse_realdata.json',
+                        help='Log to monitor: JSON array, NDJSON or .gz/.zst compressed NDJSON')
+    parser.add_argument('--follow', action='store_true', help='Keep reading a plain NDJSON log as it grows')
+    parser.add_argument('--poll-seconds', type=float, default=5.0, help='Wait between reads with --follow')
+    parser.add_argument('--snapshot', default=DEFAULT_SNAPSHOT, help='Training distribution snapshot')
+    parser.add_argument('--training-data',
+                        help='Log the model was trained on, to build the snapshot when train_model.py has not')
+    parser.add_argument('--rebuild-snapshot', action='store_true', help='Rebuild the snapshot from --training-data')
+    parser.add_argument('--bundle-dir', default=DEFAULT_BUNDLE_DIR,
+                        help='Model bundle, used instead of the joblib files when present')
+    parser.add_argument('--sliding-minutes', type=float, default=60, help='Sliding window length')
+    parser.add_argument('--panes', type=int, default=12, help='Panes per sliding window (its time resolution)')
+    parser.add_argument('--tumbling-minutes', type=float, default=60, help='Length of each reported window')
+    parser.add_argument('--hit-k', type=int, nargs='+', default=[1, 3], help='k values for hit@k')
+    parser.add_argument('--psi-threshold', type=float, default=0.2, help='Trigger when a feature PSI exceeds this')
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.1,
+                        help='Trigger when sliding accuracy falls this far below the reference')
+    parser.add_argument('--reference-accuracy', type=float,
+                        help='Default: cross-validation accuracy from train_results.json, else the first full window')
+    parser.add_argument('--min-events', type=int, default=200,
+                        help='Predictions the sliding window needs before it can trigger')
+    parser.add_argument('--cooldown-minutes', type=float, default=DEFAULT_COOLDOWN / 60,
+                        help='Minutes after a trigger before the next one can fire')
+    parser.add_argument('--reorder-events', type=int, default=1000,
+                        help='Buffer for putting slightly out-of-order events back in time order')
+    parser.add_argument('--batch-events', type=int, default=2048, help='Events scored per model call')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='One JSON line per tumbling window')
+    parser.add_argument('--trigger-file', default=DEFAULT_TRIGGER, help='Latest retrain trigger')
+    parser.add_argument('--on-trigger', help="Command started on a trigger, e.g. 'python train_model.py'")
+    instrumentation.add_arguments(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    with instrumentation.from_args(args, 'drift-monitor') as run:
+        monitor_log(args, run)
+
+def monitor_log(args, run):
+    from evaluate import load_cv_results, load_model_and_encoders
+
+    if args.follow and not (os.path.isfile(args.data) and is_plain_ndjson(args.data)):
+        logger.error("--follow needs a plain (uncompressed) NDJSON log")
+        sys.exit(1)
+    with run.stage('snapshot'):
+        snapshot = load_snapshot(args)
+    with run.stage('load_model'):
+        clf, ohe, encoders, page_encoder, scaler, feature_names, transition_freq = load_model_and_encoders(args.bundle_dir)
+    page_map = {page: idx for idx, page in enumerate(encoders['page'])}
+    model = (clf, ohe, page_encoder, scaler, feature_names, transition_freq, page_map)
+    reference = args.reference_accuracy
+    if reference is None:
+        reference = load_cv_results()[0]
+
+    ks = sorted(set(args.hit_k))
+    with open(args.output, 'w') as output:
+        monitor = DriftMonitor(snapshot, len(page_map) + 1, ks, args.sliding_minutes * 60, args.panes,
+                               args.tumbling_minutes * 60, args.psi_threshold, args.max_accuracy_drop,
+                               args.min_events, reference, args.cooldown_minutes * 60, output, args.trigger_file,
+                               args.on_trigger)
+        stats = {}
+        records = (follow_records(args.data, args.poll_seconds) if args.follow
+                   else iter_records(args.data, stats=stats))
+        try:
+            with run.stage('monitor') as stage:
+                stage['rows'] = run_stream(in_time_order(records, args.reorder_events), monitor, model, ks,
+                                           args.batch_events)
+        except KeyboardInterrupt:
+            logger.info("Stopped")
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to read {args.data}: {e}")
+            sys.exit(1)
+    if stats:
+        run.count('records_invalid', stats['total'] - stats['valid'])
+    logger.info(f"{monitor.windows} windows written to {args.output}; {len(monitor.triggers)} retrain triggers"
+                f"{f', latest in {args.trigger_file}' if monitor.triggers and args.trigger_file else ''}")
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()
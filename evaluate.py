@@ -1,12 +1,20 @@
-import pandas as pd
 import json
 import numpy as np
-from sklearn.metrics import precision_score, recall_score, f1_score, confusion_matrix
 from collections import Counter
-import joblib
+import argparse
 import logging
 import sys
 import os
+import time
+import cohort_eval
+import instrumentation
+from log_stream import REQUIRED_KEYS, iter_records, peak_rss_mb
+from feature_cache import DEFAULT_CACHE_DIR, FeatureCache
+from generate_asset_map import timestamp_key
+from model_bundle import DEFAULT_BUNDLE_DIR, ModelBundle, bundle_exists
+from ngram_model import NGramModel, SessionTracker
+from sparse_features import is_sparse_encoder, sparse_feature_matrix
+from visit_table import VisitTable
 
 logging.basicConfig(
     level=logging.INFO,
@@ -15,7 +23,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def load_model_and_encoders():
+def load_model_and_encoders(bundle_dir=DEFAULT_BUNDLE_DIR, scorer='xgboost'):
+    if bundle_exists(bundle_dir):
+        return load_bundle(bundle_dir, scorer)
+    if scorer == 'forest':
+        logger.error(f"The forest scorer needs a model bundle; none found in {bundle_dir}")
+        sys.exit(1)
+    import joblib
+
     logger.info("Loading model and encoders...")
     try:
         clf = joblib.load('model.joblib')
@@ -33,14 +48,32 @@ def load_model_and_encoders():
         logger.error(f"Failed to load model or encoders: {e}")
         sys.exit(1)
 
+def load_bundle(bundle_dir, scorer='xgboost'):
+    logger.info(f"Loading model bundle from {bundle_dir}...")
+    try:
+        bundle = ModelBundle(bundle_dir)
+        clf = bundle.forest_classifier() if scorer == 'forest' else bundle.clf
+        page_encoder, feature_names = bundle.page_encoder, bundle.feature_names
+        logger.info(f"Bundle version {bundle.version}, scorer {scorer}")
+        logger.info(f"Page encoder classes: {page_encoder.classes_}")
+        logger.info(f"Feature names: {feature_names}, count: {len(feature_names)}")
+        return (clf, bundle.ohe, bundle.encoders, page_encoder, bundle.scaler, feature_names,
+                bundle.transition_freq)
+    except Exception as e:
+        logger.error(f"Failed to load model bundle: {e}")
+        sys.exit(1)
+
 def load_and_validate_data(file_path):
+    """Valid records as a list of dicts for the row-by-row evaluation; every one is held in memory."""
     logger.info("Loading data...")
     try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        required_keys = ['page', 'navPath', 'userAgent', 'timestamp', 'loadTime', 'browser', 'device', 'screenWidth']
-        valid_data = [entry for entry in data if all(key in entry for key in required_keys)]
-        logger.info(f"Loaded {len(valid_data)} valid entries from {len(data)} total entries")
+        stats = {}
+        with instrumentation.current().stage('load') as stage:
+            valid_data = list(iter_records(file_path, REQUIRED_KEYS, stats))
+            stage['rows'] = stats['total']
+        instrumentation.current().count('records_invalid', stats['total'] - len(valid_data))
+        logger.info(f"Loaded {len(valid_data)} valid entries from {stats['total']} total entries. "
+                    f"Peak RSS: {peak_rss_mb():.1f} MB")
         if len(valid_data) < 2:
             logger.error("Insufficient valid data points (need at least 2)")
             sys.exit(1)
@@ -49,6 +82,25 @@ def load_and_validate_data(file_path):
         logger.error(f"Failed to load or validate data: {e}")
         sys.exit(1)
 
+def load_visit_table(file_path):
+    """``load_and_validate_data`` into an interned, columnar ``VisitTable`` instead of a list of dicts."""
+    logger.info("Loading data...")
+    try:
+        stats = {}
+        with instrumentation.current().stage('load') as stage:
+            visits = VisitTable.from_log(file_path, stats)
+            stage['rows'] = stats['total']
+        instrumentation.current().count('records_invalid', stats['total'] - len(visits))
+        logger.info(f"Loaded {len(visits)} valid entries from {stats['total']} total entries "
+                    f"({visits.nbytes / (1024 * 1024):.1f} MB as a table). Peak RSS: {peak_rss_mb():.1f} MB")
+    except Exception as e:
+        logger.error(f"Failed to load or validate data: {e}")
+        sys.exit(1)
+    if len(visits) < 2:
+        logger.error("Insufficient valid data points (need at least 2)")
+        sys.exit(1)
+    return visits
+
 def filter_data_by_model_vocabulary(data, page_map):
     valid_data = [entry for entry in data if entry['page'].lower() in page_map]
     logger.info(f"Valid pages after filtering: {len(valid_data)}")
@@ -70,27 +122,33 @@ def extract_features(entry, full_data, i, transition_freq):
             'loadTime': entry['loadTime'],
             'transition_frequency': transition_freq.get(transition, 0)
         }
-        logger.debug(f"Extracted features: {features}")
+        if instrumentation.sampled(logger, logging.DEBUG, 'extracted_features'):
+            logger.debug(f"Extracted features: {features}")
         return features
     except Exception as e:
         logger.error(f"Error extracting features: {e}")
         raise
 
 def prepare_features_for_prediction(features_dict, ohe, scaler, feature_names):
+    import pandas as pd
+
     categorical_data = pd.DataFrame(
         [[features_dict['page'], features_dict['prev_page'], features_dict['device'], features_dict['browser']]],
         columns=['page', 'prev_page', 'device', 'browser']
     )
-    logger.debug(f"Categorical data: {categorical_data.to_dict()}")
+    if instrumentation.sampled(logger, logging.DEBUG, 'categorical_data'):
+        logger.debug(f"Categorical data: {categorical_data.to_dict()}")
 
     try:
         encoded_cols = pd.DataFrame(
             ohe.transform(categorical_data),
             columns=ohe.get_feature_names_out(['page', 'prev_page', 'device', 'browser'])
         )
-        logger.debug(f"Encoded columns: {ohe.get_feature_names_out(['page', 'prev_page', 'device', 'browser']).tolist()}")
+        if instrumentation.sampled(logger, logging.DEBUG, 'encoded_columns'):
+            logger.debug(f"Encoded columns: {ohe.get_feature_names_out(['page', 'prev_page', 'device', 'browser']).tolist()}")
     except Exception as e:
-        logger.warning(f"One-hot encoding failed: {e}. Using zeros.")
+        if instrumentation.sampled(logger, logging.WARNING, 'one_hot_failed'):
+            logger.warning(f"One-hot encoding failed: {e}. Using zeros.")
         encoded_cols = pd.DataFrame(
             [[0] * len(ohe.get_feature_names_out(['page', 'prev_page', 'device', 'browser']))],
             columns=ohe.get_feature_names_out(['page', 'prev_page', 'device', 'browser'])
@@ -105,25 +163,229 @@ def prepare_features_for_prediction(features_dict, ohe, scaler, feature_names):
         columns=numeric_data.columns
     )
     features = pd.concat([numeric_data, encoded_cols], axis=1)
-    logger.debug(f"Features before alignment: {features.columns.tolist()}")
+    if instrumentation.sampled(logger, logging.DEBUG, 'features_before_alignment'):
+        logger.debug(f"Features before alignment: {features.columns.tolist()}")
 
     for col in feature_names:
         if col not in features.columns:
             features[col] = 0
     features = features[feature_names]
-    logger.info(f"Generated features: {features.columns.tolist()}, count: {len(features.columns)}")
+    if instrumentation.sampled(logger, logging.INFO, 'generated_features'):
+        logger.info(f"Generated features: {features.columns.tolist()}, count: {len(features.columns)}")
 
     return features.to_numpy()
 
+CATEGORICAL_COLS = ['page', 'prev_page', 'device', 'browser']
+NUMERIC_COLS = ['screenWidth', 'loadTime', 'transition_frequency']
+
+def extract_prediction_columns(valid_data, full_data):
+    """Extract the per-row prediction inputs and outcomes as a columnar DataFrame.
+
+    Row ``i`` mirrors ``extract_features(valid_data[i], full_data, i, ...)`` so the batch
+    path predicts exactly what the row-by-row path does.
+    """
+    import pandas as pd
+
+    n_rows = len(valid_data) - 1
+    rows = valid_data[:n_rows]
+    next_entries = valid_data[1:]
+    transition_next = [entry['page'].lower() for entry in full_data[1:n_rows + 1]]
+    transition_next += ['none'] * (n_rows - len(transition_next))
+    return pd.DataFrame({
+        'page': [entry['page'].lower() for entry in rows],
+        'prev_page': [entry['navPath'][-2].lower() if len(entry['navPath']) >= 2 else 'none' for entry in rows],
+        'device': [entry['device'].lower() for entry in rows],
+        'browser': [entry['browser'].lower() for entry in rows],
+        'screenWidth': [entry['screenWidth'] for entry in rows],
+        'loadTime': [entry['loadTime'] for entry in rows],
+        'transition_next': transition_next,
+        'actual': [entry['page'].lower() for entry in next_entries],
+        'next_cache_hit': [count_cache_hits(entry['assets']) > 0 for entry in next_entries],
+        'next_load_time': [entry['loadTime'] for entry in next_entries],
+        'entry_page': [entry['navPath'][0].lower() if entry['navPath'] else 'none' for entry in rows],
+        'ts': [timestamp_key(entry['timestamp']) for entry in rows],
+    })
+
+def build_feature_matrix(columns, transition_freq, ohe, scaler, feature_names):
+    """Build the feature matrix for every prediction row in one vectorized pass.
+
+    Models trained with a sparse encoding get a CSR matrix, built without a dense intermediate.
+    """
+    import pandas as pd
+
+    numeric_data = pd.DataFrame({
+        'screenWidth': columns['screenWidth'],
+        'loadTime': columns['loadTime'],
+        'transition_frequency': [transition_freq.get(f"{page}_{next_page}", 0)
+                                 for page, next_page in zip(columns['page'], columns['transition_next'])],
+    })
+    if is_sparse_encoder(ohe):
+        return sparse_feature_matrix(numeric_data, columns, ohe, scaler, feature_names)
+
+    column_index = {name: idx for idx, name in enumerate(feature_names)}
+    X = np.zeros((len(columns), len(feature_names)), dtype=np.float64)
+    blocks = [
+        (NUMERIC_COLS, scaler.transform(numeric_data)),
+        (ohe.get_feature_names_out(CATEGORICAL_COLS), ohe.transform(columns[CATEGORICAL_COLS])),
+    ]
+    for names, values in blocks:
+        values = np.asarray(values.toarray() if hasattr(values, 'toarray') else values)
+        src = [i for i, name in enumerate(names) if name in column_index]
+        dst = [column_index[names[i]] for i in src]
+        X[:, dst] = values[:, src]
+    return X
+
+def compute_metrics(y_true, y_pred, n_classes):
+    """Accuracy, confusion matrix and weighted precision/recall/F1 from label arrays."""
+    y_true = np.asarray(y_true, dtype=np.int64)
+    y_pred = np.asarray(y_pred, dtype=np.int64)
+    cm = np.bincount(y_true * n_classes + y_pred, minlength=n_classes * n_classes).reshape(n_classes, n_classes)
+    tp = np.diag(cm).astype(np.float64)
+    support = cm.sum(axis=1).astype(np.float64)
+    predicted = cm.sum(axis=0).astype(np.float64)
+    total = support.sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predicted > 0, tp / predicted, 0.0)
+        recall = np.where(support > 0, tp / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    weights = support / total if total > 0 else support
+    return {
+        'accuracy': float(tp.sum() / total) if total > 0 else 0.0,
+        'confusion_matrix': cm,
+        'precision': float((precision * weights).sum()),
+        'recall': float((recall * weights).sum()),
+        'f1_score': float((f1 * weights).sum()),
+    }
+
+def evaluate_batch(columns, clf, ohe, scaler, feature_names, transition_freq, page_encoder, page_map):
+    """Predict every row with a single ``predict_proba`` call and score with NumPy.
+
+    The class probabilities are returned under ``probabilities`` for the lookahead metrics and
+    the class codes under ``y_true``/``y_pred`` for the cohort metrics.
+    """
+    import pandas as pd
+
+    start = time.perf_counter()
+    X = build_feature_matrix(columns, transition_freq, ohe, scaler, feature_names)
+    proba = clf.predict_proba(X)
+    pred_idx = proba.argmax(axis=1)
+    predicted_pages = page_encoder.classes_[pred_idx]
+
+    y_true = columns['actual'].map(page_map).to_numpy()
+    y_pred = pd.Series(predicted_pages).map(page_map).to_numpy()
+    metrics = compute_metrics(y_true, y_pred, len(page_map))
+    elapsed = time.perf_counter() - start
+
+    rows = len(y_true)
+    metrics['rows_per_sec'] = rows / elapsed if elapsed > 0 else float('inf')
+    metrics['probabilities'] = proba
+    metrics['y_true'] = y_true
+    metrics['y_pred'] = y_pred
+    logger.info(f"Batch evaluated {rows} rows in {elapsed:.3f}s ({metrics['rows_per_sec']:.0f} rows/sec)")
+    logger.info(f"Confusion matrix:\n{metrics['confusion_matrix']}")
+    return metrics
+
+def evaluate_lookahead(columns, proba, page_encoder, page_map, transition_freq, horizons, ks):
+    """hit@k of the page ``h`` navigations ahead, for every horizon ``h``, over the whole test set.
+
+    Row ``i`` targets ``columns['actual'][i + h - 1]``. The model's next-page distribution is
+    carried ``h - 1`` more steps along the transition matrix built from ``transition_freq``;
+    the Markov baseline is the ``h``-step matrix row of the current page alone.
+    """
+    from transition_matrix import TransitionMatrix, hits_at_k
+
+    start = time.perf_counter()
+    chain = TransitionMatrix.from_counts(transition_freq, list(page_map))
+    # predict_proba columns follow page_encoder.classes_, the matrix follows page_map
+    model_probs = np.zeros((len(proba), len(page_map)))
+    known = [i for i, page in enumerate(page_encoder.classes_) if page in page_map]
+    model_probs[:, [page_map[page_encoder.classes_[i]] for i in known]] = np.asarray(proba)[:, known]
+    targets = columns['actual'].map(page_map).to_numpy()
+    results = {}
+    for h in horizons:
+        rows = len(targets) - h + 1
+        if rows <= 0:
+            logger.warning(f"Too few rows for a {h}-step horizon")
+            continue
+        target = targets[h - 1:]
+        model_h = chain.propagate(model_probs[:rows], h - 1)
+        markov_h = chain.step_probs(columns['page'][:rows], h)
+        results[f"h{h}"] = {'rows': rows}
+        for k in ks:
+            results[f"h{h}"][f"model_hit@{k}"] = float(hits_at_k(model_h, target, k).mean())
+            results[f"h{h}"][f"markov_hit@{k}"] = float(hits_at_k(markov_h, target, k).mean())
+        logger.info(f"{h}-step horizon over {rows} rows: " + ', '.join(
+            f"hit@{k} model {results[f'h{h}'][f'model_hit@{k}']:.3f} / markov {results[f'h{h}'][f'markov_hit@{k}']:.3f}"
+            for k in ks))
+    logger.info(f"Lookahead metrics for horizons {list(horizons)} in {time.perf_counter() - start:.3f}s")
+    return results
+
 def count_cache_hits(assets):
     return sum(1 for asset in assets if asset.get('fromCache', False))
 
-def main():
-    clf, ohe, encoders, page_encoder, scaler, feature_names, transition_freq = load_model_and_encoders()
-    full_data = load_and_validate_data('predictpulse_mockdata.json')
+def load_cv_results():
+    try:
+        with open('train_results.json', 'r') as f:
+            train_results = json.load(f)
+        return train_results.get('cross_validation_accuracy', 0.0), train_results.get('cross_validation_std', 0.0)
+    except Exception as e:
+        logger.warning(f"Failed to load train results: {e}")
+        return 0.0, 0.0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Evaluate the trained next-page model on mock data.')
+    parser.add_argument('--data', default='predictpulse_mockdata.json', help='Input log: JSON array, NDJSON or .gz/.zst compressed NDJSON')
+    parser.add_argument('--batch', action='store_true',
+                        help='Vectorized evaluation: one predict_proba pass over the whole feature matrix')
+    parser.add_argument('--predictor', choices=['model', 'ngram'], default='model',
+                        help='Score model.joblib or the session n-gram model from ngram_model.py')
+    parser.add_argument('--ngram-model', default='ngram_model.json', help='N-gram model file (--predictor ngram)')
+    parser.add_argument('--gap-minutes', type=float, default=30, help='Session idle gap (--predictor ngram)')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='Feature cache directory (batch mode)')
+    parser.add_argument('--no-cache', action='store_true', help='Always re-extract features from the log')
+    parser.add_argument('--bundle-dir', default=DEFAULT_BUNDLE_DIR,
+                        help='Model bundle, used instead of the joblib files when present')
+    parser.add_argument('--scorer', choices=['xgboost', 'forest'], default='xgboost',
+                        help="Score with the XGBoost model or the bundle's memory-mapped compiled forest")
+    parser.add_argument('--horizons', type=int, nargs='+', default=[1, 2, 3],
+                        help='Navigations ahead scored with hit@k (batch mode); none to skip')
+    parser.add_argument('--hit-k', type=int, nargs='+', default=[1, 3], help='k values for hit@k')
+    cohort_eval.add_arguments(parser)
+    instrumentation.add_arguments(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    with instrumentation.from_args(args, 'evaluate') as run:
+        run_evaluation(args, run)
+
+def run_evaluation(args, run):
+    if args.predictor == 'ngram':
+        with open('public/encoders.json', 'r') as f:
+            page_map = {page: idx for idx, page in enumerate(json.load(f)['page'])}
+        main_ngram(args, page_map)
+        return
+
+    with run.stage('load_model'):
+        clf, ohe, encoders, page_encoder, scaler, feature_names, transition_freq = load_model_and_encoders(args.bundle_dir, args.scorer)
     page_map = {page: idx for idx, page in enumerate(encoders['page'])}
+    if not args.batch and is_sparse_encoder(ohe):
+        logger.info("Model was trained on sparse features; using batch evaluation")
+        args.batch = True
+    if args.cohorts is not None and not args.batch:
+        logger.info("Cohort metrics use batch evaluation")
+        args.batch = True
+    if args.batch:
+        main_batch(args, clf, ohe, page_encoder, scaler, feature_names, transition_freq, page_map)
+        return
+
+    import pandas as pd
+    from sklearn.metrics import precision_score, recall_score, f1_score, confusion_matrix
+
+    full_data = load_and_validate_data(args.data)
     valid_data = filter_data_by_model_vocabulary(full_data, page_map)
-    valid_data.sort(key=lambda x: pd.to_datetime(x['timestamp']))
+    with run.stage('sort', rows=len(valid_data)):
+        valid_data.sort(key=lambda x: pd.to_datetime(x['timestamp']))
 
     actual_pages = []
     predicted_pages = []
@@ -131,30 +393,37 @@ def main():
     load_times = []
     error_probs = []
 
-    for i in range(len(valid_data) - 1):
-        current = valid_data[i]
-        next_entry = valid_data[i + 1]
-        next_actual = next_entry['page'].lower()
-        actual_pages.append(next_actual)
-
-        features_dict = extract_features(current, full_data, i, transition_freq)
-        try:
-            features = prepare_features_for_prediction(features_dict, ohe, scaler, feature_names)
-            pred_idx = clf.predict(features)[0]
-            pred_proba = clf.predict_proba(features)[0]
-            logger.info(f"Raw prediction: {pred_idx}, probabilities: {pred_proba}")
-            next_pred = page_encoder.inverse_transform([int(pred_idx)])[0]
-            logger.info(f"Predicted page: {next_pred}")
-            predicted_pages.append(next_pred)
-            if next_actual != next_pred:
-                logger.warning(f"Incorrect prediction: actual={next_actual}, predicted={next_pred}, features={features_dict}, probs={pred_proba}")
-                error_probs.append((next_actual, next_pred, pred_proba))
-        except Exception as e:
-            logger.error(f"Prediction failed: {e}, input features: {features_dict}")
-            predicted_pages.append(features_dict['page'])
-
-        cache_hits.append(count_cache_hits(next_entry['assets']) > 0)
-        load_times.append(next_entry['loadTime'])
+    with run.stage('predict', rows=len(valid_data) - 1):
+        for i in range(len(valid_data) - 1):
+            current = valid_data[i]
+            next_entry = valid_data[i + 1]
+            next_actual = next_entry['page'].lower()
+            actual_pages.append(next_actual)
+
+            features_dict = extract_features(current, full_data, i, transition_freq)
+            try:
+                features = prepare_features_for_prediction(features_dict, ohe, scaler, feature_names)
+                pred_idx = clf.predict(features)[0]
+                pred_proba = clf.predict_proba(features)[0]
+                if instrumentation.sampled(logger, logging.INFO, 'raw_prediction'):
+                    logger.info(f"Raw prediction: {pred_idx}, probabilities: {pred_proba}")
+                next_pred = page_encoder.inverse_transform([int(pred_idx)])[0]
+                if instrumentation.sampled(logger, logging.INFO, 'predicted_page'):
+                    logger.info(f"Predicted page: {next_pred}")
+                predicted_pages.append(next_pred)
+                if next_actual != next_pred:
+                    run.count('prediction_errors')
+                    if instrumentation.sampled(logger, logging.WARNING, 'incorrect_prediction'):
+                        logger.warning(f"Incorrect prediction: actual={next_actual}, predicted={next_pred}, features={features_dict}, probs={pred_proba}")
+                    error_probs.append((next_actual, next_pred, pred_proba))
+            except Exception as e:
+                run.count('prediction_failures')
+                if instrumentation.sampled(logger, logging.ERROR, 'prediction_failed'):
+                    logger.error(f"Prediction failed: {e}, input features: {features_dict}")
+                predicted_pages.append(features_dict['page'])
+
+            cache_hits.append(count_cache_hits(next_entry['assets']) > 0)
+            load_times.append(next_entry['loadTime'])
 
     if not actual_pages:
         logger.error("No valid predictions made.")
@@ -186,16 +455,9 @@ def main():
     avg_load_time = sum(load_times) / len(load_times) if load_times else 0.0
 
     # Load cross-validation results from training
-    try:
-        with open('train_results.json', 'r') as f:
-            train_results = json.load(f)
-        cv_accuracy = train_results.get('cross_validation_accuracy', 0.0)
-        cv_std = train_results.get('cross_validation_std', 0.0)
-    except Exception as e:
-        logger.warning(f"Failed to load train results: {e}")
-        cv_accuracy, cv_std = 0.0, 0.0
+    cv_accuracy, cv_std = load_cv_results()
 
-    results = {
+    save_results({
         'accuracy': accuracy,
         'load_time_avg': avg_load_time,
         'resource_efficiency': resource_efficiency,
@@ -204,20 +466,131 @@ def main():
         'f1_score': f1,
         'cross_validation_accuracy': cv_accuracy,
         'cross_validation_std': cv_std
-    }
+    })
+
+def load_prediction_columns(args, page_map):
+    """Load prediction columns from the feature cache, or parse the log and populate the cache."""
+    cache = None if args.no_cache else FeatureCache(args.cache_dir)
+    key = cache.key(args.data, 'evaluate', extra=','.join(page_map)) if cache else None
+    run = instrumentation.current()
+    columns = None
+    if cache:
+        with run.stage('feature_cache'):
+            columns = cache.load_frame(key)
+    if columns is None:
+        visits = load_visit_table(args.data)
+        # Vocabulary filter, timestamp sort and column extraction on the interned table
+        with run.stage('extract_features', rows=len(visits)):
+            columns = visits.prediction_columns(page_map)
+        if columns is None:
+            logger.error("No valid predictions made.")
+            sys.exit(1)
+        if cache:
+            cache.store_frame(key, columns)
+    if cache:
+        cache.report()
+    return columns
+
+def main_batch(args, clf, ohe, page_encoder, scaler, feature_names, transition_freq, page_map):
+    run = instrumentation.current()
+    columns = load_prediction_columns(args, page_map)
+    with run.stage('predict', rows=len(columns)):
+        metrics = evaluate_batch(columns, clf, ohe, scaler, feature_names, transition_freq, page_encoder, page_map)
+    proba = metrics.pop('probabilities')
+    y_true, y_pred = metrics.pop('y_true'), metrics.pop('y_pred')
+    lookahead = None
+    if args.horizons:
+        with run.stage('lookahead', rows=len(columns)):
+            lookahead = evaluate_lookahead(columns, proba, page_encoder, page_map, transition_freq, args.horizons,
+                                           args.hit_k)
+    if args.cohorts is not None:
+        with run.stage('cohorts', rows=len(columns)):
+            cohorts = cohort_eval.evaluate_cohorts(
+                columns, y_true, y_pred, len(page_map), args.cohorts or cohort_eval.DEFAULT_DIMENSIONS,
+                args.bootstrap, args.ci, args.min_cohort_rows, args.width_bands, args.window_hours,
+                args.cohort_workers, args.seed)
+        cohort_eval.log_cohorts(cohorts)
+        with open(args.cohort_output, 'w') as f:
+            json.dump(cohorts, f, indent=2)
+        logger.info(f"Cohort results saved to {args.cohort_output}")
+
+    cache_hit_rate = float(columns['next_cache_hit'].sum()) / len(columns)
+    avg_load_time = float(columns['next_load_time'].sum()) / len(columns)
+    cv_accuracy, cv_std = load_cv_results()
+
+    save_results({
+        'accuracy': metrics['accuracy'],
+        'load_time_avg': avg_load_time,
+        'resource_efficiency': cache_hit_rate * 100,
+        'precision': metrics['precision'],
+        'recall': metrics['recall'],
+        'f1_score': metrics['f1_score'],
+        'cross_validation_accuracy': cv_accuracy,
+        'cross_validation_std': cv_std,
+        'rows_per_sec': metrics['rows_per_sec'],
+        **({'lookahead': lookahead} if lookahead else {})
+    })
+
+def main_ngram(args, page_map):
+    """Evaluate the session n-gram model on the same targets as the tree model."""
+    import pandas as pd
+
+    model = NGramModel.load(args.ngram_model)
+    full_data = load_and_validate_data(args.data)
+    valid_data = filter_data_by_model_vocabulary(full_data, page_map)
+    run = instrumentation.current()
+    with run.stage('sort', rows=len(valid_data)):
+        valid_data.sort(key=lambda x: pd.to_datetime(x['timestamp']))
+    if len(valid_data) < 2:
+        logger.error("No valid predictions made.")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    tracker = SessionTracker(model.order, args.gap_minutes * 60)
+    predicted_pages = []
+    with run.stage('predict', rows=len(valid_data) - 1):
+        for entry in valid_data[:-1]:
+            context, page = tracker.advance(entry)
+            predicted_pages.append(model.predict(context + (page,)) or page)
+    next_entries = valid_data[1:]
+    y_true = pd.Series([entry['page'].lower() for entry in next_entries]).map(page_map).to_numpy()
+    # Pages outside the model vocabulary get an extra zero-support class: always wrong, never weighted
+    y_pred = pd.Series(predicted_pages).map(page_map).fillna(len(page_map)).to_numpy().astype(np.int64)
+    metrics = compute_metrics(y_true, y_pred, len(page_map) + 1)
+    elapsed = time.perf_counter() - start
+    rows_per_sec = len(y_true) / elapsed if elapsed > 0 else float('inf')
+    logger.info(f"N-gram evaluated {len(y_true)} rows in {elapsed:.3f}s ({rows_per_sec:.0f} rows/sec)")
+    logger.info(f"Confusion matrix:\n{metrics['confusion_matrix']}")
+
+    cv_accuracy, cv_std = load_cv_results()
+    save_results({
+        'accuracy': metrics['accuracy'],
+        'load_time_avg': sum(entry['loadTime'] for entry in next_entries) / len(next_entries),
+        'resource_efficiency': sum(count_cache_hits(e['assets']) > 0 for e in next_entries) / len(next_entries) * 100,
+        'precision': metrics['precision'],
+        'recall': metrics['recall'],
+        'f1_score': metrics['f1_score'],
+        'cross_validation_accuracy': cv_accuracy,
+        'cross_validation_std': cv_std,
+        'rows_per_sec': rows_per_sec,
+        'predictor': 'ngram'
+    })
 
+def save_results(results):
     os.makedirs('results', exist_ok=True)
     with open('evaluation_results.json', 'w') as f:
         json.dump(results, f, indent=2)
 
     logger.info(f"Evaluation complete. Results saved to results/evaluation_results.json")
-    logger.info(f"Accuracy: {accuracy:.4f}")
-    logger.info(f"Precision: {precision:.4f}")
-    logger.info(f"Recall: {recall:.4f}")
-    logger.info(f"F1 Score: {f1:.4f}")
-    logger.info(f"Resource Efficiency: {resource_efficiency:.2f}%")
-    logger.info(f"Average Load Time: {avg_load_time:.2f}ms")
-    logger.info(f"Cross-validation accuracy: {cv_accuracy:.4f} ± {cv_std:.4f}")
+    logger.info(f"Accuracy: {results['accuracy']:.4f}")
+    logger.info(f"Precision: {results['precision']:.4f}")
+    logger.info(f"Recall: {results['recall']:.4f}")
+    logger.info(f"F1 Score: {results['f1_score']:.4f}")
+    logger.info(f"Resource Efficiency: {results['resource_efficiency']:.2f}%")
+    logger.info(f"Average Load Time: {results['load_time_avg']:.2f}ms")
+    logger.info(f"Cross-validation accuracy: {results['cross_validation_accuracy']:.4f} ± {results['cross_validation_std']:.4f}")
+    if 'rows_per_sec' in results:
+        logger.info(f"Throughput: {results['rows_per_sec']:.0f} rows/sec")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,12 +1,13 @@
-import pandas as pd
 import json
 import numpy as np
-from sklearn.metrics import precision_score, recall_score, f1_score
-from ua_parser import user_agent_parser
-import joblib
 from collections import Counter
+import argparse
+import functools
 import logging
 import sys
+import time
+import instrumentation
+from log_stream import iter_records, peak_rss_mb
 
 # Set up logging
 logging.basicConfig(
@@ -16,8 +17,72 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+UA_CACHE_SIZE = 4096
+
+class UserAgentCache:
+    """Bounded LRU cache in front of ua-parser's regex cascade.
+
+    Real traffic carries few distinct user agents per visit, so most lookups are hits. Parsed
+    ``(device, browser, os)`` tuples are interned: every visit from the same client family
+    shares one tuple and its strings, however many raw UA variants map to it.
+    """
+
+    def __init__(self, maxsize=UA_CACHE_SIZE):
+        self._interned = {}
+        self.parse = functools.lru_cache(maxsize=maxsize)(self._parse)
+
+    def _parse(self, user_agent):
+        from ua_parser import user_agent_parser
+
+        ua = user_agent_parser.Parse(user_agent)
+        parsed = (sys.intern(ua['device']['family'] or 'Unknown'), sys.intern(ua['user_agent']['family'] or 'Other'),
+                  sys.intern(ua['os']['family'] or 'Other'))
+        return self._interned.setdefault(parsed, parsed)
+
+    def stats(self):
+        info = self.parse.cache_info()
+        lookups = info.hits + info.misses
+        return {'hits': info.hits, 'misses': info.misses, 'hit_rate': info.hits / lookups if lookups else 0.0,
+                'cached': info.currsize, 'maxsize': info.maxsize, 'distinct_tuples': len(self._interned)}
+
+    def report(self):
+        stats = self.stats()
+        logger.info(f"User-agent cache: {stats['hits']} hits, {stats['misses']} misses "
+                    f"(hit rate {stats['hit_rate']:.1%}), {stats['cached']}/{stats['maxsize']} cached, "
+                    f"{stats['distinct_tuples']} distinct (device, browser, os) tuples")
+
+def parse_timestamps(entries):
+    """Parse every entry's ISO-8601 timestamp: the instants to sort on and each entry's hour of day.
+
+    The hour is the wall-clock hour in the entry's own UTC offset, as
+    ``pd.to_datetime(entry['timestamp']).hour`` gives it.
+    """
+    import pandas as pd
+
+    raw = pd.Series([entry['timestamp'] for entry in entries])
+    # The time part's trailing 'Z' or [+-]HH[:MM] offset; a date-only or naive entry has none
+    offsets = raw.str.extract(r'[T ]\S*?(?:(Z)|([+-])(\d{2}):?(\d{2})?)$')
+    minutes = (offsets[2].astype(float).fillna(0) * 60 + offsets[3].astype(float).fillna(0)) \
+        * np.where(offsets[1] == '-', -1, 1)
+    aware = offsets[0].notna() | offsets[1].notna()
+    if minutes.nunique() <= 1 and aware.nunique() <= 1:
+        timestamps = pd.to_datetime(raw, format='ISO8601')
+        return timestamps, timestamps.dt.hour.to_numpy()
+    # Mixed UTC offsets cannot share one tz-aware dtype: sort on the UTC instants, and shift each
+    # one by its own offset to read the local hour
+    timestamps = pd.to_datetime(raw, format='ISO8601', utc=True)
+    return timestamps, (timestamps + pd.to_timedelta(minutes.to_numpy(), unit='min')).dt.hour.to_numpy()
+
+def sort_by_timestamp(entries):
+    """Entries in timestamp order (stable, like ``list.sort``) and their hour of day, in that order."""
+    timestamps, hours = parse_timestamps(entries)
+    order = np.argsort(timestamps.values.view(np.int64), kind='stable')
+    return [entries[i] for i in order], hours[order].tolist()
+
 def load_model_and_encoders():
     """Load the trained model and encoders."""
+    import joblib
+
     try:
         clf = joblib.load('model.joblib')
         ohe = joblib.load('ohe_encoder.joblib')
@@ -29,16 +94,16 @@ def load_model_and_encoders():
         sys.exit(1)
 
 def load_and_validate_data(file_path):
-    """Load and perform basic validation on the data."""
+    """Stream the log and keep the entries carrying the required keys; all of them are held (O(N)) for the sort."""
     try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-
-        # Basic validation
-        valid_data = [
-            entry for entry in data
-            if all(key in entry for key in ['page', 'assets', 'navPath', 'loadTime', 'timestamp', 'userAgent', 'screenWidth'])
-        ]
+        required_keys = ['page', 'assets', 'navPath', 'loadTime', 'timestamp', 'userAgent', 'screenWidth']
+        stats = {}
+        with instrumentation.current().stage('load') as stage:
+            valid_data = list(iter_records(file_path, required_keys, stats))
+            stage['rows'] = stats['total']
+        instrumentation.current().count('records_invalid', stats['total'] - len(valid_data))
+        logger.info(f"Loaded {len(valid_data)} valid entries from {stats['total']} total entries. "
+                    f"Peak RSS: {peak_rss_mb():.1f} MB")
 
         if len(valid_data) < 2:
             logger.error("Insufficient valid data points (need at least 2)")
@@ -57,10 +122,16 @@ def filter_data_by_model_vocabulary(data, page_map):
         sys.exit(1)
     return valid_data
 
-def extract_features(entry, prev_entry=None):
-    """Extract features from a data entry."""
-    timestamp = pd.to_datetime(entry['timestamp'])
-    hour = timestamp.hour
+def extract_features(entry, prev_entry=None, hour=None, ua_cache=None):
+    """Extract features from a data entry.
+
+    ``hour`` comes from ``sort_by_timestamp`` when the caller has parsed the batch already, and
+    ``ua_cache`` memoizes user-agent parsing across calls.
+    """
+    if hour is None:
+        import pandas as pd
+
+        hour = pd.to_datetime(entry['timestamp']).hour
 
     current_page = entry['page'].lower()  # Convert to lowercase
 
@@ -71,8 +142,12 @@ def extract_features(entry, prev_entry=None):
         prev_page = prev_entry['page'].lower()  # Convert to lowercase
 
     # Parse user agent
-    ua = user_agent_parser.Parse(entry['userAgent'])
-    device = ua['device']['family'] or 'Unknown'
+    if ua_cache is None:
+        from ua_parser import user_agent_parser
+
+        device = user_agent_parser.Parse(entry['userAgent'])['device']['family'] or 'Unknown'
+    else:
+        device = ua_cache.parse(entry['userAgent'])[0]
 
     # Extract other features
     screen_width = entry['screenWidth']
@@ -91,6 +166,8 @@ def extract_features(entry, prev_entry=None):
 
 def prepare_features_for_prediction(features_dict, ohe, feature_names):
     """Prepare features for model prediction."""
+    import pandas as pd
+
     # Split into categorical and numeric
     categorical_data = pd.DataFrame(
         [[features_dict['page'], features_dict['prev_page'], features_dict['device_type']]],
@@ -104,7 +181,8 @@ def prepare_features_for_prediction(features_dict, ohe, feature_names):
             columns=ohe.get_feature_names_out(['page', 'prev_page', 'device_type'])
         )
     except Exception as e:
-        logger.warning(f"One-hot encoding failed: {e}. Using empty DataFrame.")
+        if instrumentation.sampled(logger, logging.WARNING, 'one_hot_failed'):
+            logger.warning(f"One-hot encoding failed: {e}. Using empty DataFrame.")
         # Create empty DataFrame with expected columns
         encoded_cols = pd.DataFrame(
             [[0] * len(ohe.get_feature_names_out(['page', 'prev_page', 'device_type']))],
@@ -137,12 +215,97 @@ def count_cache_hits(assets):
     """Count cache hits in assets."""
     return sum(1 for asset in assets if asset.get('fromCache', False))
 
-def main():
+# Browser/OS templates; {major} and {minor} vary to produce the long tail of real UA strings
+UA_TEMPLATES = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{major}.0.{minor}.0 Safari/537.36',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_{minor} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.{minor} Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.{minor} Safari/605.1.15',
+    'Mozilla/5.0 (Linux; Android 14; SM-S91{minor}B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{major}.0.0.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:{major}.0) Gecko/20100101 Firefox/{major}.0',
+    'Mozilla/5.0 (iPad; CPU OS 16_{minor} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.{minor} Mobile/15E148 Safari/604.1',
+]
+
+def skewed_user_agents(rows, distinct, seed=0, zipf_s=1.1):
+    """``rows`` UA strings drawn from ``distinct`` variants with Zipf(``zipf_s``) popularity."""
+    rng = np.random.default_rng(seed)
+    variants = [UA_TEMPLATES[k % len(UA_TEMPLATES)].format(major=100 + k // len(UA_TEMPLATES) % 30,
+                                                           minor=k // (30 * len(UA_TEMPLATES)))
+                for k in range(distinct)]
+    weights = 1.0 / np.arange(1, distinct + 1) ** zipf_s
+    return [variants[i] for i in rng.choice(distinct, rows, p=weights / weights.sum())]
+
+def ua_report(rows, distinct):
+    """Log per-entry vs cached UA parsing and per-entry vs vectorized timestamp parsing throughput."""
+    import pandas as pd
+    from ua_parser import user_agent_parser
+
+    user_agents = skewed_user_agents(rows, distinct)
+    base = pd.Timestamp('2025-05-10T00:00:00Z')
+    timestamps = [(base + pd.Timedelta(seconds=int(s))).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+                  for s in np.random.default_rng(1).integers(0, 30 * 86400, rows)]
+    entries = [{'timestamp': ts} for ts in timestamps]
+
+    start = time.perf_counter()
+    before = [user_agent_parser.Parse(ua)['device']['family'] or 'Unknown' for ua in user_agents]
+    ua_before = time.perf_counter() - start
+    cache = UserAgentCache()
+    start = time.perf_counter()
+    after = [cache.parse(ua)[0] for ua in user_agents]
+    ua_after = time.perf_counter() - start
+    if before != after:
+        logger.error("Cached user-agent parsing disagrees with ua-parser")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    sorted_before = sorted(entries, key=lambda x: pd.to_datetime(x['timestamp']))
+    hours_before = [pd.to_datetime(entry['timestamp']).hour for entry in sorted_before]
+    ts_before = time.perf_counter() - start
+    start = time.perf_counter()
+    sorted_after, hours_after = sort_by_timestamp(entries)
+    ts_after = time.perf_counter() - start
+    if hours_before != hours_after or sorted_before != sorted_after:
+        logger.error("Vectorized timestamp parsing disagrees with per-entry parsing")
+        sys.exit(1)
+
+    logger.info(f"{rows} visits over {distinct} distinct user agents (Zipf), "
+                f"{len(set(user_agents))} seen")
+    logger.info(f"UA parsing: {rows / ua_before:.0f} rows/sec per entry -> {rows / ua_after:.0f} rows/sec cached "
+                f"({ua_before / ua_after:.1f}x)")
+    cache.report()
+    logger.info(f"Timestamps (sort + hour): {rows / ts_before:.0f} rows/sec per entry -> "
+                f"{rows / ts_after:.0f} rows/sec vectorized ({ts_before / ts_after:.1f}x)")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Evaluate the trained model on real-world logs.')
+    parser.add_argument('--data', default='predictpulse_realdata.json',
+                        help='Input log: JSON array, NDJSON or .gz/.zst compressed NDJSON')
+    parser.add_argument('--ua-cache-size', type=int, default=UA_CACHE_SIZE,
+                        help='Distinct user agents kept in the parse cache')
+    parser.add_argument('--ua-report', action='store_true',
+                        help='Compare UA and timestamp parsing throughput, uncached vs cached, and exit')
+    parser.add_argument('--ua-report-rows', type=int, default=50000)
+    parser.add_argument('--ua-report-distinct', type=int, default=2000,
+                        help='Distinct user-agent strings in the Zipf-distributed report traffic')
+    instrumentation.add_arguments(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.ua_report:
+        ua_report(args.ua_report_rows, args.ua_report_distinct)
+        return
+    with instrumentation.from_args(args, 'evaluate-real') as run:
+        run_evaluation(args, run)
+
+def run_evaluation(args, run):
+    from sklearn.metrics import precision_score, recall_score, f1_score
+
     # Load model and encoders
-    clf, ohe, encoders = load_model_and_encoders()
+    with run.stage('load_model'):
+        clf, ohe, encoders = load_model_and_encoders()
 
     # Load and validate data
-    data = load_and_validate_data('predictpulse_realdata.json')
+    data = load_and_validate_data(args.data)
 
     # Create page mapping
     page_map = {page: idx for idx, page in enumerate(encoders['page'])}
@@ -150,8 +313,10 @@ def main():
     # Filter data to only include pages in model vocabulary
     valid_data = filter_data_by_model_vocabulary(data, page_map)
 
-    # Sort data by timestamp to ensure correct sequence
-    valid_data.sort(key=lambda x: pd.to_datetime(x['timestamp']))
+    # Sort data by timestamp to ensure correct sequence, parsing every timestamp once
+    with run.stage('sort', rows=len(valid_data)):
+        valid_data, hours = sort_by_timestamp(valid_data)
+    ua_cache = UserAgentCache(args.ua_cache_size)
 
     # Initialize lists to store results
     actual_pages = []
@@ -160,32 +325,35 @@ def main():
     load_times = []
 
     # Process each data point
-    for i in range(len(valid_data) - 1):
-        current = valid_data[i]
-        next_entry = valid_data[i + 1]
-
-        # Record actual next page
-        next_actual = next_entry['page']
-        actual_pages.append(next_actual)
-
-        # Extract features
-        features_dict = extract_features(current)
-
-        # Prepare features for prediction
-        features = prepare_features_for_prediction(features_dict, ohe, clf.feature_names_in_)
-
-        # Predict next page
-        try:
-            pred_idx = clf.predict(features)[0]
-            next_pred = encoders['page'][pred_idx]
-            predicted_pages.append(next_pred)
-        except Exception as e:
-            logger.warning(f"Prediction failed: {e}. Using current page as prediction.")
-            predicted_pages.append(current['page'])
-
-        # Count cached assets and record load time
-        cache_hits.append(count_cache_hits(next_entry['assets']) > 0)
-        load_times.append(next_entry['loadTime'])
+    with run.stage('predict', rows=len(valid_data) - 1):
+        for i in range(len(valid_data) - 1):
+            current = valid_data[i]
+            next_entry = valid_data[i + 1]
+
+            # Record actual next page
+            next_actual = next_entry['page']
+            actual_pages.append(next_actual)
+
+            # Extract features
+            features_dict = extract_features(current, hour=hours[i], ua_cache=ua_cache)
+
+            # Prepare features for prediction
+            features = prepare_features_for_prediction(features_dict, ohe, clf.feature_names_in_)
+
+            # Predict next page
+            try:
+                pred_idx = clf.predict(features)[0]
+                next_pred = encoders['page'][pred_idx]
+                predicted_pages.append(next_pred)
+            except Exception as e:
+                run.count('prediction_failures')
+                if instrumentation.sampled(logger, logging.WARNING, 'prediction_failed'):
+                    logger.warning(f"Prediction failed: {e}. Using current page as prediction.")
+                predicted_pages.append(current['page'])
+
+            # Count cached assets and record load time
+            cache_hits.append(count_cache_hits(next_entry['assets']) > 0)
+            load_times.append(next_entry['loadTime'])
 
     # Calculate accuracy
     correct_predictions = sum(1 for a, p in zip(actual_pages, predicted_pages) if a == p)
@@ -239,6 +407,10 @@ def main():
     logger.info(f"Accuracy: {accuracy:.4f}")
     logger.info(f"Resource Efficiency: {resource_efficiency:.2f}%")
     logger.info(f"Average Load Time: {avg_load_time:.2f}ms")
+    ua_cache.report()
+    ua_stats = ua_cache.stats()
+    run.count('ua_cache_hits', ua_stats['hits'])
+    run.count('ua_cache_misses', ua_stats['misses'])
 
 if __name__ == "__main__":
     main()
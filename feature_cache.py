@@ -0,0 +1,252 @@
+# feature_cache.py
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever extract_features changes what it produces, so stale tables are never reused
+FEATURE_SCHEMA_VERSION = 2
+DEFAULT_CACHE_DIR = '.feature_cache'
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+DEFAULT_MAX_AGE_DAYS = 30
+
+def file_digest(file_path, block_size=1 << 20):
+    """SHA-256 of the file contents."""
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def source_digest(file_path):
+    """Content hash of a log file, or the fingerprint of a log store directory."""
+    if os.path.isdir(file_path):
+        from log_store import LogReader
+        return LogReader(file_path).fingerprint()
+    return file_digest(file_path)
+
+class FeatureCache:
+    """On-disk columnar cache of extracted feature tables.
+
+    Each entry is a directory of ``.npy`` columns plus ``meta.json``. Columns are opened
+    with ``mmap_mode='r'``, so a hit costs a few page faults instead of a JSON parse.
+    Entries are keyed by the input content hash and ``FEATURE_SCHEMA_VERSION``.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _digest(self, file_path):
+        if os.path.isdir(file_path):
+            return source_digest(file_path)
+        # Rehashing a multi-GB log on every run defeats the cache, so remember the digest per (size, mtime)
+        index_path = os.path.join(self.cache_dir, 'digests.json')
+        try:
+            with open(index_path, 'r') as f:
+                index = json.load(f)
+        except (FileNotFoundError, ValueError):
+            index = {}
+        st = os.stat(file_path)
+        path_key = os.path.abspath(file_path)
+        stamp = [st.st_size, st.st_mtime_ns]
+        cached = index.get(path_key)
+        if cached and cached['stamp'] == stamp:
+            return cached['sha256']
+        digest = file_digest(file_path)
+        index[path_key] = {'stamp': stamp, 'sha256': digest}
+        _atomic_write_json(index_path, index)
+        return digest
+
+    def key(self, file_path, kind, extra=''):
+        """Cache key for ``kind`` features of ``file_path``; ``extra`` covers other inputs such as a vocabulary."""
+        parts = f"{self._digest(file_path)}:{kind}:{extra}:v{FEATURE_SCHEMA_VERSION}"
+        return f"{kind}-{hashlib.sha256(parts.encode()).hexdigest()[:24]}"
+
+    def load(self, key):
+        """Return ``(columns, meta)`` with memory-mapped columns, or ``None`` on a miss."""
+        entry_dir = os.path.join(self.cache_dir, key)
+        meta_path = os.path.join(entry_dir, 'meta.json')
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            columns = {name: np.load(os.path.join(entry_dir, f"{name}.npy"), mmap_mode='r')
+                       for name in meta['columns']}
+        except (FileNotFoundError, ValueError, KeyError) as e:
+            self.misses += 1
+            logger.info(f"Feature cache miss: {key}" + ('' if isinstance(e, FileNotFoundError) else f" ({e})"))
+            return None
+        os.utime(meta_path)  # last-use time drives eviction
+        self.hits += 1
+        logger.info(f"Feature cache hit: {key} ({meta['rows']} rows)")
+        return columns, meta
+
+    def store(self, key, columns, meta):
+        """Write an entry atomically, then evict stale entries."""
+        entry_dir = os.path.join(self.cache_dir, key)
+        tmp_dir = f"{entry_dir}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for name, values in columns.items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.asarray(values))
+        meta = dict(meta, columns=list(columns), schema_version=FEATURE_SCHEMA_VERSION, created=time.time())
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+        logger.info(f"Feature cache stored: {key} ({_dir_size(entry_dir) / 1024 ** 2:.1f} MB)")
+        self.evict(keep=key)
+
+    def entries(self):
+        """List ``(key, last_used, size_bytes)`` for every complete entry, oldest first."""
+        result = []
+        for name in os.listdir(self.cache_dir):
+            meta_path = os.path.join(self.cache_dir, name, 'meta.json')
+            if os.path.isfile(meta_path):
+                result.append((name, os.path.getmtime(meta_path), _dir_size(os.path.join(self.cache_dir, name))))
+        return sorted(result, key=lambda e: e[1])
+
+    def evict(self, keep=None):
+        """Drop entries older than ``max_age_days``, then least recently used ones beyond ``max_bytes``."""
+        now = time.time()
+        kept = []
+        for name, last_used, size in self.entries():
+            if name == keep:
+                continue
+            if self.max_age_days is not None and now - last_used > self.max_age_days * 86400:
+                self._remove(name, 'age')
+            else:
+                kept.append((name, size))
+        total = sum(size for _, size in kept) + (_dir_size(os.path.join(self.cache_dir, keep)) if keep else 0)
+        for name, size in kept:
+            if self.max_bytes is None or total <= self.max_bytes:
+                break
+            self._remove(name, 'size')
+            total -= size
+
+    def _remove(self, name, reason):
+        shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+        logger.info(f"Feature cache evicted ({reason}): {name}")
+
+    def report(self):
+        logger.info(f"Feature cache: {self.hits} hits, {self.misses} misses")
+
+    def store_table(self, key, df, targets, transition_freq, categorical_cols, numeric_cols):
+        """Cache a training feature table, its targets and the transition counts."""
+        columns, vocab = {}, {}
+        for col in categorical_cols:
+            codes, vocab[col] = _encode(df[col].to_numpy())
+            columns[f"cat_{col}"] = codes
+        for col in numeric_cols:
+            columns[f"num_{col}"] = df[col].to_numpy(dtype=np.float64)
+        columns['targets'], vocab['targets'] = _encode(np.asarray(targets, dtype=object))
+
+        pairs = list(transition_freq.items())
+        pages = sorted({p for (src, dst), _ in pairs for p in (src, dst)})
+        page_idx = {p: i for i, p in enumerate(pages)}
+        columns['transition_src'] = np.array([page_idx[src] for (src, _), _ in pairs], dtype=np.int32)
+        columns['transition_dst'] = np.array([page_idx[dst] for (_, dst), _ in pairs], dtype=np.int32)
+        columns['transition_count'] = np.array([count for _, count in pairs], dtype=np.int64)
+        vocab['transition_pages'] = pages
+
+        meta = {'rows': len(df), 'categorical': categorical_cols, 'numeric': numeric_cols, 'vocab': vocab}
+        self.store(key, columns, meta)
+
+    def load_table(self, key):
+        """Return ``(df, targets, transition_freq)`` from the cache, or ``None`` on a miss."""
+        import pandas as pd
+
+        entry = self.load(key)
+        if entry is None:
+            return None
+        columns, meta = entry
+        vocab = meta['vocab']
+        data = {}
+        for col in meta['categorical']:
+            data[col] = np.asarray(vocab[col], dtype=object)[columns[f"cat_{col}"]]
+        for col in meta['numeric']:
+            data[col] = columns[f"num_{col}"]
+        df = pd.DataFrame(data, columns=meta['categorical'] + meta['numeric'])
+        targets = np.asarray(vocab['targets'], dtype=object)[columns['targets']].tolist()
+        pages = vocab['transition_pages']
+        transition_freq = Counter({
+            (pages[src], pages[dst]): int(count)
+            for src, dst, count in zip(columns['transition_src'], columns['transition_dst'], columns['transition_count'])
+        })
+        return df, targets, transition_freq
+
+    def store_frame(self, key, df):
+        """Cache an arbitrary DataFrame; string columns are stored as integer codes."""
+        columns, vocab = {}, {}
+        for col in df.columns:
+            values = df[col].to_numpy()
+            if values.dtype == object:
+                columns[col], vocab[col] = _encode(values)
+            else:
+                columns[col] = values
+        self.store(key, columns, {'rows': len(df), 'vocab': vocab})
+
+    def load_frame(self, key):
+        """Return a DataFrame stored with ``store_frame``, or ``None`` on a miss."""
+        import pandas as pd
+
+        entry = self.load(key)
+        if entry is None:
+            return None
+        columns, meta = entry
+        vocab = meta['vocab']
+        return pd.DataFrame({
+            col: np.asarray(vocab[col], dtype=object)[values] if col in vocab else values
+            for col, values in columns.items()
+        })
+
+def _encode(values):
+    vocab, codes = np.unique(values.astype(str), return_inverse=True)
+    return codes.astype(np.int32), vocab.tolist()
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+def _atomic_write_json(path, obj):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(obj, f)
+    os.replace(tmp_path, path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Inspect or prune the PredictPulse feature cache.')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--max-mb', type=float, default=DEFAULT_MAX_BYTES / 1024 ** 2)
+    parser.add_argument('--max-age-days', type=float, default=DEFAULT_MAX_AGE_DAYS)
+    parser.add_argument('--clear', action='store_true', help='Remove every entry')
+    args = parser.parse_args(argv)
+
+    cache = FeatureCache(args.cache_dir, int(args.max_mb * 1024 ** 2), args.max_age_days)
+    if args.clear:
+        for name, _, _ in cache.entries():
+            cache._remove(name, 'clear')
+        return
+    cache.evict()
+    for name, last_used, size in cache.entries():
+        logger.info(f"{name}: {size / 1024 ** 2:.1f} MB, last used {time.ctime(last_used)}")
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()
@@ -0,0 +1,242 @@
+# forest_export.py
+import base64
+import json
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from tree_export import js_feature_encoder, measure_js_latency
+
+logger = logging.getLogger(__name__)
+
+THRESHOLD_DTYPES = {'float32': np.float32, 'float16': np.float16}
+LEAF_DTYPES = {'float32': np.float32, 'float16': np.float16, 'int16': np.int16, 'int8': np.int8}
+# (rounds, depth, threshold dtype, leaf dtype); None keeps everything
+DEFAULT_BUDGETS = [
+    (None, None, 'float32', 'float32'),
+    (None, None, 'float16', 'int16'),
+    (150, 4, 'float16', 'int8'),
+    (100, 3, 'float16', 'int8'),
+    (50, 3, 'float16', 'int8'),
+    (25, 2, 'float16', 'int8'),
+]
+PREDICT_CHUNK = 1024
+
+def booster_trees(model):
+    """Trees, per-tree class ids and per-class base margins from a fitted XGBClassifier."""
+    learner = json.loads(model.get_booster().save_raw('json'))['learner']
+    booster = learner['gradient_booster']['model']
+    base_score = learner['learner_model_param']['base_score']
+    n_classes = int(learner['learner_model_param']['num_class']) or 1
+    base = np.asarray(json.loads(base_score) if base_score.startswith('[') else [float(base_score)] * n_classes,
+                      dtype=np.float64)
+    return booster['trees'], np.asarray(booster['tree_info'], dtype=np.int32), base
+
+def _subtree_value(tree, node):
+    """Hessian-weighted mean leaf value below ``node``: its value once the subtree is cut away."""
+    left, right = tree['left_children'][node], tree['right_children'][node]
+    if left == -1:
+        return tree['split_conditions'][node], tree['sum_hessian'][node]
+    lv, lh = _subtree_value(tree, left)
+    rv, rh = _subtree_value(tree, right)
+    total = lh + rh
+    return ((lv * lh + rv * rh) / total if total > 0 else (lv + rv) / 2), total
+
+def _tree_depth(tree, node=0):
+    if tree['left_children'][node] == -1:
+        return 0
+    return 1 + max(_tree_depth(tree, tree['left_children'][node]), _tree_depth(tree, tree['right_children'][node]))
+
+def compile_forest(model, rounds=None, max_depth=None, threshold_dtype='float32', leaf_dtype='float32'):
+    """Flatten the boosted trees into padded complete-tree arrays.
+
+    Every tree is padded to the same depth ``D``, so evaluation is exactly ``D`` steps of
+    ``idx = 2 * idx + 1 + (x[feature[idx]] >= threshold[idx])`` with no data-dependent
+    branches. Keeping only the first ``rounds`` boosting rounds and cutting trees at
+    ``max_depth`` (a cut subtree becomes a leaf with its hessian-weighted mean value)
+    trades accuracy for bytes.
+    """
+    trees, tree_class, base = booster_trees(model)
+    n_classes = len(base)
+    if rounds is not None:
+        trees, tree_class = trees[:rounds * n_classes], tree_class[:rounds * n_classes]
+    depth = max(_tree_depth(t) for t in trees)
+    if max_depth is not None:
+        depth = min(depth, max_depth)
+    depth = max(depth, 1)
+    n_internal, n_leaves = 2 ** depth - 1, 2 ** depth
+
+    feature = np.zeros((len(trees), n_internal), dtype=np.int32)
+    threshold = np.full((len(trees), n_internal), np.inf, dtype=np.float32)
+    leaf = np.zeros((len(trees), n_leaves), dtype=np.float64)
+    for t, tree in enumerate(trees):
+        stack = [(0, 0, 0)]  # (source node, heap slot, level)
+        while stack:
+            node, slot, level = stack.pop()
+            is_leaf = tree['left_children'][node] == -1
+            if is_leaf or level == depth:
+                value = tree['split_conditions'][node] if is_leaf else _subtree_value(tree, node)[0]
+                # Padding: every heap leaf under this slot carries the same value
+                span = 2 ** (depth - level)
+                first = (slot + 1) * span - 1 - n_internal
+                leaf[t, first:first + span] = value
+                continue
+            feature[t, slot] = tree['split_indices'][node]
+            threshold[t, slot] = tree['split_conditions'][node]
+            stack.append((tree['left_children'][node], 2 * slot + 1, level + 1))
+            stack.append((tree['right_children'][node], 2 * slot + 2, level + 1))
+
+    leaf_scale = 1.0
+    if np.issubdtype(LEAF_DTYPES[leaf_dtype], np.integer):
+        limit = np.iinfo(LEAF_DTYPES[leaf_dtype]).max
+        leaf_scale = float(np.abs(leaf).max() / limit) or 1.0
+        leaf = np.round(leaf / leaf_scale)
+    n_features = int(feature.max()) + 1
+    return {
+        'depth': depth,
+        'feature': feature.astype(np.uint8 if n_features <= 256 else np.uint16),
+        'threshold': threshold.astype(THRESHOLD_DTYPES[threshold_dtype]),
+        'leaf': leaf.astype(LEAF_DTYPES[leaf_dtype]),
+        'leaf_scale': leaf_scale,
+        'tree_class': tree_class.astype(np.uint8 if n_classes <= 256 else np.uint16),
+        'base': base,
+    }
+
+def forest_nbytes(forest):
+    return sum(forest[k].nbytes for k in ('feature', 'threshold', 'leaf', 'tree_class', 'base'))
+
+def forest_margins(forest, X):
+    """Class margins for every row, vectorized across all trees at once."""
+    X = np.asarray(X, dtype=np.float32)
+    # Index the arrays as stored (no widened copies), so memory-mapped forests stay shared
+    feature = forest['feature']
+    threshold = forest['threshold']
+    leaf = forest['leaf']
+    n_trees = feature.shape[0]
+    n_internal = feature.shape[1]
+    trees = np.arange(n_trees)[None, :]
+    onehot_class = np.zeros((n_trees, len(forest['base'])))
+    onehot_class[np.arange(n_trees), forest['tree_class']] = 1.0
+
+    margins = np.empty((X.shape[0], len(forest['base'])))
+    for start in range(0, X.shape[0], PREDICT_CHUNK):
+        chunk = X[start:start + PREDICT_CHUNK]
+        rows = np.arange(chunk.shape[0])[:, None]
+        idx = np.zeros((chunk.shape[0], n_trees), dtype=np.intp)
+        for _ in range(forest['depth']):
+            idx = 2 * idx + 1 + (chunk[rows, feature[trees, idx]] >= threshold[trees, idx])
+        leaves = leaf[trees, idx - n_internal].astype(np.float64) * forest['leaf_scale']
+        margins[start:start + len(chunk)] = leaves @ onehot_class + forest['base']
+    return margins
+
+def predict_forest(forest, X):
+    return forest_margins(forest, X).argmax(axis=1)
+
+def verify_forest_parity(model, forest, X):
+    """Compare the reference evaluator with ``model.predict``; exact for an unpruned float32 export."""
+    expected = np.asarray(model.predict(X))
+    actual = predict_forest(forest, X)
+    mismatches = int((expected != actual).sum())
+    log = logger.error if mismatches else logger.info
+    log(f"Forest parity check: {mismatches} of {len(expected)} predictions differ from model.predict")
+    return mismatches == 0
+
+def _b64(array):
+    return base64.b64encode(np.ascontiguousarray(array).tobytes()).decode()
+
+_JS_TYPES = {np.dtype(np.uint8): 'Uint8Array', np.dtype(np.uint16): 'Uint16Array', np.dtype(np.int8): 'Int8Array',
+             np.dtype(np.int16): 'Int16Array', np.dtype(np.float32): 'Float32Array'}
+
+def _js_array(name, array):
+    if array.dtype == np.float16:
+        # No Float16Array everywhere yet: ship half-float bits and widen once at load time
+        return f"const {name} = decodeHalf(decode('{_b64(array.view(np.uint16))}', Uint16Array));"
+    return f"const {name} = decode('{_b64(array)}', {_JS_TYPES[array.dtype]});"
+
+def export_forest_js(forest, feature_names, page_encoder, scaler, ohe, transition_freq,
+                     output_path='src/utils/predictNextPageForest.js'):
+    """Write a browser module evaluating the flattened forest with a branch-free inner loop."""
+    n_trees, n_internal = forest['feature'].shape
+    lines = [
+        "// Generated by train_model.py (--export-forest)",
+        "function decode(b64, Type) {",
+        "  const bytes = Uint8Array.from(atob(b64), c => c.charCodeAt(0));",
+        "  return new Type(bytes.buffer);",
+        "}",
+        "function decodeHalf(bits) {",
+        "  const out = new Float32Array(bits.length);",
+        "  for (let i = 0; i < bits.length; i++) {",
+        "    const h = bits[i], sign = h & 0x8000 ? -1 : 1, exp = (h >> 10) & 0x1f, frac = h & 0x3ff;",
+        "    out[i] = exp === 0 ? sign * 2 ** -14 * (frac / 1024)",
+        "      : exp === 31 ? (frac ? NaN : sign * Infinity)",
+        "      : sign * 2 ** (exp - 15) * (1 + frac / 1024);",
+        "  }",
+        "  return out;",
+        "}",
+        f"const PAGES = {json.dumps([str(p) for p in page_encoder.classes_])};",
+        f"const DEPTH = {forest['depth']};",
+        f"const N_TREES = {n_trees};",
+        f"const INTERNAL = {n_internal};",
+        f"const LEAVES = {n_internal + 1};",
+        f"const LEAF_SCALE = {forest['leaf_scale']!r};",
+        f"const BASE = {json.dumps(forest['base'].tolist())};",
+        _js_array('FEATURE', forest['feature']),
+        _js_array('THRESHOLD', forest['threshold']),
+        _js_array('LEAF', forest['leaf']),
+        _js_array('TREE_CLASS', forest['tree_class']),
+        *js_feature_encoder(feature_names, scaler, ohe, transition_freq),
+        "const MARGINS = new Float64Array(BASE.length);",
+        "",
+        "export function predictNextPage(data) {",
+        "  const features = encodeFeatures(data);",
+        "  MARGINS.set(BASE);",
+        "  for (let t = 0; t < N_TREES; t++) {",
+        "    const base = t * INTERNAL;",
+        "    let idx = 0;",
+        "    for (let d = 0; d < DEPTH; d++) {",
+        "      idx = 2 * idx + 1 + (features[FEATURE[base + idx]] >= THRESHOLD[base + idx]);",
+        "    }",
+        "    MARGINS[TREE_CLASS[t]] += LEAF[t * LEAVES + idx - INTERNAL] * LEAF_SCALE;",
+        "  }",
+        "  let best = 0;",
+        "  for (let k = 1; k < MARGINS.length; k++) if (MARGINS[k] > MARGINS[best]) best = k;",
+        "  return PAGES[best];",
+        "}",
+    ]
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'w') as f:
+        f.write('\n'.join(lines))
+    logger.info(f"Generated {output_path} ({n_trees} trees, depth {forest['depth']}, {forest_nbytes(forest)} bytes of arrays)")
+
+def budget_report(model, X_test, y_test, encoder_args, js_inputs=None, budgets=DEFAULT_BUDGETS):
+    """Log accuracy, exported bytes and latency of the forest export at several budgets."""
+    X_test = np.asarray(X_test, dtype=np.float32)
+    y_test = np.asarray(y_test)
+    report = []
+    for rounds, depth, thr_dtype, leaf_dtype in budgets:
+        forest = compile_forest(model, rounds, depth, thr_dtype, leaf_dtype)
+        start = time.perf_counter()
+        accuracy = float((predict_forest(forest, X_test) == y_test).mean())
+        us_per_row = (time.perf_counter() - start) / max(len(X_test), 1) * 1e6
+        js_ns = None
+        js_bytes = None
+        if js_inputs is not None:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'forest.js')
+                export_forest_js(forest, *encoder_args, output_path=path)
+                js_bytes = os.path.getsize(path)
+                js_ns = measure_js_latency(path, js_inputs, iterations=20000)
+        entry = {
+            'rounds': rounds or 'all', 'depth': forest['depth'], 'thresholds': thr_dtype, 'leaves': leaf_dtype,
+            'trees': int(forest['feature'].shape[0]), 'accuracy': accuracy, 'array_bytes': forest_nbytes(forest),
+            'js_bytes': js_bytes, 'python_us_per_row': us_per_row, 'js_ns_per_call': js_ns,
+        }
+        report.append(entry)
+        js_text = f", JS {js_bytes} bytes {js_ns:.0f} ns/call" if js_ns is not None else ''
+        logger.info(f"Forest budget rounds={entry['rounds']} depth={entry['depth']} {thr_dtype}/{leaf_dtype}: "
+                    f"accuracy {accuracy:.4f}, {entry['array_bytes']} array bytes, "
+                    f"{us_per_row:.2f} us/row (NumPy){js_text}")
+    return report
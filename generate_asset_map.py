@@ -1,58 +1,197 @@
 # generate_asset_map.py
+import argparse
+import hashlib
 import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+from log_stream import read_appended
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOURCES = ['predictpulse_mockdata.json', 'predictpulse_realdata.json']
+DEFAULT_STATE = 'asset_map_state.json'
+DEFAULT_OUTPUT = 'public/asset_map.json'
+STATE_VERSION = 1
+HEAD_BYTES = 4096
+
+def timestamp_key(timestamp):
+    """Seconds since the epoch for ordering; entries without a usable timestamp sort first."""
+    if not timestamp or not isinstance(timestamp, str):
+        return float('-inf')
+    try:
+        parsed = datetime.fromisoformat(timestamp)
+    except ValueError:
+        return float('-inf')
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def dedupe_assets(assets):
+    seen = set()
+    deduped_assets = []
+    for asset in assets:
+        key = (asset['url'], asset['type'])
+        if key not in seen:
+            seen.add(key)
+            deduped_assets.append({
+                'url': asset['url'],
+                'type': asset['type'],
+                'fromCache': asset['fromCache']
+            })
+    return deduped_assets
+
+class AssetMapState:
+    """Latest log entry per page plus, per source file, how far it has been read.
+
+    Keeping the latest entry per page is an idempotent merge, so records that are read twice
+    (after a source is rewritten) never change the result.
+    """
+
+    def __init__(self, sources=None, pages=None):
+        self.sources = sources or {}
+        self.pages = pages or {}
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            state = json.load(f)
+        if state.get('version') != STATE_VERSION:
+            logger.warning(f"Ignoring {path}: state version {state.get('version')} is not {STATE_VERSION}")
+            return cls()
+        return cls(state['sources'], state['pages'])
+
+    def save(self, path):
+        write_atomic(path, json.dumps({'version': STATE_VERSION, 'sources': self.sources, 'pages': self.pages}))
+
+    def merge(self, entries):
+        """Fold ``entries`` in and return how many pages got a newer entry."""
+        # Pick each page's winner in the batch first, so assets are deduplicated once per page
+        winners = {}
+        for entry in entries:
+            page = entry.get('page') if isinstance(entry, dict) else None
+            if not page or not isinstance(page, str):
+                continue
+            key = timestamp_key(entry.get('timestamp'))
+            if page not in winners or key > winners[page][0]:
+                winners[page] = (key, entry)
+        updated = 0
+        for page, (key, entry) in winners.items():
+            current = self.pages.get(page)
+            if current is None or key > current['ts']:
+                self.pages[page] = {'timestamp': entry.get('timestamp', ''), 'ts': key,
+                                    'assets': dedupe_assets(entry.get('assets', []))}
+                updated += 1
+        return updated
+
+    def asset_map(self):
+        return {page: record['assets'] for page, record in self.pages.items()}
+
+def _head_digest(path, length):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read(length)).hexdigest()
+
+def read_new_records(path, source):
+    """Records added to ``path`` since ``source`` (its saved read position) and the updated position.
+
+    An unchanged size and mtime skips the file without opening it. A changed first block or a
+    shrunken file means the file was rewritten, and it is read again from the start. A log store
+    directory is append-only, so it resumes from the saved record count.
+    """
+    if os.path.isdir(path):
+        from log_store import LogReader
+        fingerprint = LogReader(path).fingerprint()
+        if source and source.get('fingerprint') == fingerprint:
+            return [], source
+        records, position = read_appended(path, {'offset': None, 'count': source['count'] if source else 0})
+        return records, dict(position, fingerprint=fingerprint)
+    stat = os.stat(path)
+    if source and source['size'] == stat.st_size and source['mtime_ns'] == stat.st_mtime_ns:
+        return [], source
+    position = {'offset': 0, 'count': 0}
+    if source and stat.st_size >= source['size'] and _head_digest(path, source['head_len']) == source['head']:
+        position = {'offset': source['offset'], 'count': source['count']}
+    records, position = read_appended(path, position)
+    head_len = min(HEAD_BYTES, stat.st_size)
+    return records, dict(position, size=stat.st_size, mtime_ns=stat.st_mtime_ns, head_len=head_len,
+                         head=_head_digest(path, head_len))
+
+def write_atomic(path, text):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def write_if_changed(path, asset_map):
+    """Atomically rewrite ``path`` only when its content changes; True when written."""
+    text = json.dumps(asset_map, indent=2)
+    try:
+        with open(path, 'r') as f:
+            if f.read() == text:
+                return False
+    except FileNotFoundError:
+        pass
+    write_atomic(path, text)
+    return True
 
 def generate_asset_map(data, output_path):
-    asset_map = {
-        'Home': [],
-        'ProductList': [],
-        'ProductDetails': [],
-        'About': [],
-        'Contact': []
-    }
-
-    # Keep only the most recent log per page
-    latest_logs = {}
-    for entry in data:
-        page = entry.get('page')
-        if page not in asset_map:
-            continue
-        timestamp = entry.get('timestamp', '')
-        timestamp_val = timestamp if timestamp else '0'
-        if page not in latest_logs or timestamp_val > latest_logs[page]['timestamp']:
-            latest_logs[page] = entry
-
-    # Process assets from the latest logs
-    for page in asset_map:
-        if page not in latest_logs:
+    """Build the asset map from ``data`` (entries or a ``VisitTable``) in one pass, without any state."""
+    state = AssetMapState()
+    # A table hands over only each page's latest entry, so the merge touches one entry per page
+    state.merge(data.latest_entries() if hasattr(data, 'latest_entries') else data)
+    return write_if_changed(output_path, state.asset_map())
+
+def update_asset_map(sources, state_path=DEFAULT_STATE, output_path=DEFAULT_OUTPUT, rebuild=False):
+    """Fold records added to ``sources`` since the last run into the state and refresh ``output_path``.
+
+    Only plain NDJSON and log store sources cost time proportional to the new records. A JSON
+    array or compressed log that changed is re-parsed from the start, which is logged.
+    """
+    state = AssetMapState.load(state_path) if os.path.exists(state_path) and not rebuild else AssetMapState()
+    new_records = updated = 0
+    for path in sources:
+        if not os.path.exists(path):
+            logger.info(f"Skipping missing source {path}")
             continue
-        entry = latest_logs[page]
-        seen = set()
-        deduped_assets = []
-        for asset in entry.get('assets', []):
-            key = (asset['url'], asset['type'])
-            if key not in seen:
-                seen.add(key)
-                deduped_assets.append({
-                    'url': asset['url'],
-                    'type': asset['type'],
-                    'fromCache': asset['fromCache']
-                })
-        asset_map[page] = deduped_assets
-
-    with open(output_path, 'w') as f:
-        json.dump(asset_map, f, indent=2)
+        previous = state.sources.get(path)
+        records, state.sources[path] = read_new_records(path, previous)
+        position = state.sources[path]
+        if previous is not None and position is not previous and not os.path.isdir(path) and position['offset'] is None:
+            logger.info(f"Re-parsed all {position['count']} records of {path} for {len(records)} new ones; "
+                        "NDJSON or a log store (python log_store.py --import) resumes with a seek instead")
+        new_records += len(records)
+        updated += state.merge(records)
+    written = write_if_changed(output_path, state.asset_map())
+    state.save(state_path)
+    return new_records, updated, written, len(state.pages)
 
-if __name__ == '__main__':
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Incrementally update the latest asset list per page.')
+    parser.add_argument('--data', nargs='+', default=DEFAULT_SOURCES,
+                        help='Logs to fold in (JSON array, NDJSON or log store directory); missing files are skipped. '
+                             'Only NDJSON and stores resume where they left off')
+    parser.add_argument('--state', default=DEFAULT_STATE, help='Latest entry per page and per-source read positions')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--rebuild', action='store_true', help='Ignore the saved state and read every source again')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
     try:
-        with open('predictpulse_mockdata.json', 'r') as f:
-            mock_data = json.load(f)
-        real_data = []
-        try:
-            with open('predictpulse_realdata.json', 'r') as f:
-                real_data = json.load(f)
-        except FileNotFoundError:
-            pass
-        data = mock_data + real_data
-        generate_asset_map(data, 'public/asset_map.json')
+        new_records, updated, written, pages = update_asset_map(args.data, args.state, args.output, args.rebuild)
     except Exception as e:
-        print(f"Error generating asset map: {e}")
+        logger.error(f"Error generating asset map: {e}")
+        sys.exit(1)
+    logger.info(f"Read {new_records} new records, {updated} page updates, {pages} pages; "
+                f"{args.output} {'rewritten' if written else 'unchanged'} ({time.perf_counter() - start:.3f}s)")
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()
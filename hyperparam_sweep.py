@@ -0,0 +1,231 @@
+# hyperparam_sweep.py
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SWEEP_DIR = '.sweep'
+DEFAULT_DEPTHS = [3, 5, 7]
+DEFAULT_ESTIMATORS = [100, 300, 600]
+DEFAULT_LEARNING_RATES = [0.05, 0.1, 0.2]
+DEFAULT_EXPONENTS = [0.0, 1.0, 1.5, 2.0]
+N_SPLITS = 5
+
+def candidate_grid(depths, estimators, learning_rates, exponents):
+    return [{'max_depth': d, 'n_estimators': n, 'learning_rate': lr, 'class_weight_exponent': w}
+            for d, n, lr, w in itertools.product(depths, estimators, learning_rates, exponents)]
+
+def candidate_key(candidate):
+    return (f"d{candidate['max_depth']}-n{candidate['n_estimators']}-lr{candidate['learning_rate']}"
+            f"-w{candidate['class_weight_exponent']}")
+
+def rung_folds(n_splits, n_rungs):
+    """Folds scored at each rung: the most recent fold first, all folds at the last rung."""
+    sizes = np.unique(np.linspace(1, n_splits, n_rungs).round().astype(int))
+    return [list(range(n_splits - size, n_splits)) for size in sizes]
+
+def prepare_folds(X, y, fold_dir, n_splits=N_SPLITS):
+    """Write X/y once as ``.npy`` and return the ``TimeSeriesSplit`` fold bounds.
+
+    Every time-series fold is a contiguous prefix for training followed by a contiguous
+    test block, so workers take zero-copy slices of the memory-mapped matrix.
+    """
+    from sklearn.model_selection import TimeSeriesSplit
+
+    os.makedirs(fold_dir, exist_ok=True)
+    bounds = [(int(train[-1]) + 1, int(test[-1]) + 1) for train, test in TimeSeriesSplit(n_splits=n_splits).split(X)]
+    x_path = os.path.join(fold_dir, 'X.npy')
+    if not os.path.exists(x_path):
+        np.save(os.path.join(fold_dir, 'y.npy'), np.asarray(y, dtype=np.int32))
+        np.save(x_path + '.tmp.npy', np.ascontiguousarray(X, dtype=np.float32))
+        os.replace(x_path + '.tmp.npy', x_path)
+    return bounds
+
+# Opened once per worker by _init_worker; the OS page cache shares the pages between processes
+_fold_data = {}
+
+def _init_worker(fold_dir, bounds):
+    _fold_data['X'] = np.load(os.path.join(fold_dir, 'X.npy'), mmap_mode='r')
+    _fold_data['y'] = np.load(os.path.join(fold_dir, 'y.npy'), mmap_mode='r')
+    _fold_data['bounds'] = bounds
+
+def fit_candidate(candidate, X, y):
+    """Fit the boosted model for ``candidate`` with ``train_model``'s fixed settings."""
+    from xgboost import XGBClassifier
+    from train_model import XGB_PARAMS, class_weights
+
+    params = dict(XGB_PARAMS, n_jobs=1, **{k: v for k, v in candidate.items() if k != 'class_weight_exponent'})
+    weights = class_weights(Counter(np.asarray(y).tolist()), candidate['class_weight_exponent'])
+    clf = XGBClassifier(**params)
+    clf.fit(X, y, sample_weight=np.array([weights[c] for c in np.asarray(y).tolist()]))
+    return clf
+
+def _score_task(task):
+    candidate, fold = task
+    X, y = _fold_data['X'], _fold_data['y']
+    train_end, test_end = _fold_data['bounds'][fold]
+    start = time.perf_counter()
+    clf = fit_candidate(candidate, X[:train_end], y[:train_end])
+    accuracy = float((clf.predict(X[train_end:test_end]) == y[train_end:test_end]).mean())
+    return {'key': candidate_key(candidate), 'fold': fold, 'accuracy': accuracy,
+            'seconds': time.perf_counter() - start}
+
+def load_ledger(path, data_key):
+    """Completed ``(candidate key, fold) -> result`` entries recorded for this data."""
+    done = {}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by an interrupted run is simply redone
+                    continue
+                if entry.get('data') == data_key:
+                    done[(entry['key'], entry['fold'])] = entry
+    return done
+
+def successive_halving(candidates, n_splits, pool, ledger, ledger_path, data_key, eta=3, n_rungs=3):
+    """Score candidates on growing sets of folds, keeping the best ``1/eta`` after each rung.
+
+    Results are appended to the ledger as they arrive, and pairs already in it are not
+    refit, so an interrupted sweep resumes where it stopped.
+    """
+    alive = list(candidates)
+    scores = {}
+    with open(ledger_path, 'a') as ledger_file:
+        for rung, folds in enumerate(rung_folds(n_splits, n_rungs)):
+            tasks = [(c, fold) for c in alive for fold in folds if (candidate_key(c), fold) not in ledger]
+            start = time.perf_counter()
+            for result in pool.imap_unordered(_score_task, tasks):
+                result['data'] = data_key
+                ledger[(result['key'], result['fold'])] = result
+                ledger_file.write(json.dumps(result) + '\n')
+                ledger_file.flush()
+            for c in alive:
+                scores[candidate_key(c)] = float(np.mean([ledger[(candidate_key(c), f)]['accuracy'] for f in folds]))
+            alive.sort(key=lambda c: -scores[candidate_key(c)])
+            logger.info(f"Rung {rung}: {len(alive)} candidates on folds {folds}, {len(tasks)} fits in "
+                        f"{time.perf_counter() - start:.1f}s ({len(alive) * len(folds) - len(tasks)} reused); "
+                        f"best {candidate_key(alive[0])} {scores[candidate_key(alive[0])]:.4f}")
+            if rung < n_rungs - 1:
+                alive = alive[:max(1, math.ceil(len(alive) / eta))]
+    return alive, scores
+
+def export_cost(candidate, X, y, train_end):
+    """Array bytes and NumPy microseconds per row of the candidate's compiled forest export."""
+    from forest_export import compile_forest, forest_nbytes, predict_forest
+
+    forest = compile_forest(fit_candidate(candidate, X[:train_end], y[:train_end]))
+    X_test = np.asarray(X[train_end:], dtype=np.float32)
+    start = time.perf_counter()
+    predict_forest(forest, X_test)
+    return forest_nbytes(forest), (time.perf_counter() - start) / max(len(X_test), 1) * 1e6
+
+def select_winner(finalists, scores, costs, max_bytes=None, max_us=None, tolerance=0.0):
+    """Best accuracy within the size/latency budget; within ``tolerance`` of it, the smallest export."""
+    fits = [c for c in finalists
+            if (max_bytes is None or costs[candidate_key(c)][0] <= max_bytes)
+            and (max_us is None or costs[candidate_key(c)][1] <= max_us)]
+    if not fits:
+        logger.warning("No finalist fits the export budget; choosing on accuracy alone")
+        fits = finalists
+    best = max(scores[candidate_key(c)] for c in fits)
+    close = [c for c in fits if scores[candidate_key(c)] >= best - tolerance]
+    return min(close, key=lambda c: (costs[candidate_key(c)][0], -scores[candidate_key(c)]))
+
+def parse_args(argv=None):
+    from feature_cache import DEFAULT_CACHE_DIR
+
+    parser = argparse.ArgumentParser(description='Successive-halving hyperparameter sweep for the XGBoost model.')
+    parser.add_argument('--data', default='predictpulse_mockdata.json')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='Feature cache directory')
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Processes scoring candidates')
+    parser.add_argument('--extract-workers', type=int, default=1,
+                        help='Processes extracting features when the feature cache misses')
+    parser.add_argument('--depths', type=int, nargs='+', default=DEFAULT_DEPTHS)
+    parser.add_argument('--estimators', type=int, nargs='+', default=DEFAULT_ESTIMATORS)
+    parser.add_argument('--learning-rates', type=float, nargs='+', default=DEFAULT_LEARNING_RATES)
+    parser.add_argument('--exponents', type=float, nargs='+', default=DEFAULT_EXPONENTS,
+                        help='Class-weight exponents (train_model.py uses 1.5)')
+    parser.add_argument('--eta', type=int, default=3, help='Keep the best 1/eta candidates per rung')
+    parser.add_argument('--rungs', type=int, default=3)
+    parser.add_argument('--max-bytes', type=int, help='Largest acceptable forest export in array bytes')
+    parser.add_argument('--max-us', type=float, help='Slowest acceptable forest export in microseconds per row')
+    parser.add_argument('--tolerance', type=float, default=0.002,
+                        help='Prefer a smaller export when its accuracy is within this of the best')
+    parser.add_argument('--sweep-dir', default=DEFAULT_SWEEP_DIR, help='Fold matrices and the resumable ledger')
+    parser.add_argument('--output', default='sweep_results.json')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    import multiprocessing
+
+    from feature_cache import FeatureCache, source_digest
+    from train_model import encode_features, load_feature_table
+
+    args = parse_args(argv)
+    # --workers sizes the sweep pool; feature extraction on a cache miss has its own process count
+    extract_args = argparse.Namespace(**vars(args))
+    extract_args.workers = args.extract_workers
+    df, next_pages, _ = load_feature_table(extract_args)
+    X, _, _, y, _, _ = encode_features(df, next_pages)
+    data_key = FeatureCache(args.cache_dir).key(args.data, 'sweep') if not args.no_cache else \
+        f"sweep-{source_digest(args.data)[:24]}"
+    fold_dir = os.path.join(args.sweep_dir, data_key)
+    bounds = prepare_folds(X, y, fold_dir)
+    ledger_path = os.path.join(args.sweep_dir, 'ledger.jsonl')
+    ledger = load_ledger(ledger_path, data_key)
+
+    candidates = candidate_grid(args.depths, args.estimators, args.learning_rates, args.exponents)
+    logger.info(f"Sweeping {len(candidates)} candidates over {len(bounds)} folds with {args.workers} workers "
+                f"({len(ledger)} results already in {ledger_path})")
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.workers, initializer=_init_worker, initargs=(fold_dir, bounds)) as pool:
+        finalists, scores = successive_halving(candidates, len(bounds), pool, ledger, ledger_path, data_key,
+                                               args.eta, args.rungs)
+
+    X_mm = np.load(os.path.join(fold_dir, 'X.npy'), mmap_mode='r')
+    y_mm = np.load(os.path.join(fold_dir, 'y.npy'), mmap_mode='r')
+    costs = {candidate_key(c): export_cost(c, X_mm, y_mm, bounds[-1][0]) for c in finalists}
+    for c in finalists:
+        key = candidate_key(c)
+        logger.info(f"Finalist {key}: accuracy {scores[key]:.4f}, {costs[key][0]} array bytes, "
+                    f"{costs[key][1]:.2f} us/row")
+    winner = select_winner(finalists, scores, costs, args.max_bytes, args.max_us, args.tolerance)
+    key = candidate_key(winner)
+    logger.info(f"Winner {key}: accuracy {scores[key]:.4f}, {costs[key][0]} array bytes "
+                f"(sweep took {time.perf_counter() - start:.1f}s)")
+
+    results = {
+        'winner': {
+            'xgb_params': {k: v for k, v in winner.items() if k != 'class_weight_exponent'},
+            'class_weight_exponent': winner['class_weight_exponent'],
+            'accuracy': scores[key], 'array_bytes': costs[key][0], 'us_per_row': costs[key][1],
+        },
+        'finalists': [{'key': candidate_key(c), 'accuracy': scores[candidate_key(c)],
+                       'array_bytes': costs[candidate_key(c)][0], 'us_per_row': costs[candidate_key(c)][1]}
+                      for c in finalists],
+        'scores': scores,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Sweep results saved to {args.output}; train with `python train_model.py --params {args.output}`")
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()
@@ -0,0 +1,356 @@
+# incremental_train.py
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+import train_model
+from forest_export import compile_forest
+from log_stream import REQUIRED_KEYS, is_plain_ndjson, iter_raw_records, read_appended
+from model_bundle import DEFAULT_BUNDLE_DIR, write_bundle
+from sparse_features import DEFAULT_HASH_FEATURES, HashedCategoricalEncoder, is_sparse_encoder, sparse_feature_matrix
+from train_model import CATEGORICAL_COLS, NUMERIC_COLS, class_weights, export_decision_tree, extract_feature_table
+from tree_export import export_tree_arrays_js
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATE = 'training_state.joblib'
+DEFAULT_FULL_EVERY = 24
+DEFAULT_DELTA_ROUNDS = 10
+DEFAULT_RESERVOIR = 20000
+
+def log_position(path):
+    """High-water mark covering everything currently in the log, plus its last valid record."""
+    count, tail = 0, None
+    for entry in iter_raw_records(path):
+        count += 1
+        if isinstance(entry, dict) and all(k in entry for k in REQUIRED_KEYS):
+            tail = entry
+    offset = None
+    if is_plain_ndjson(path):
+        with open(path, 'rb') as f:
+            data_end = f.seek(0, os.SEEK_END)
+            # A half-written last line is left for the next update
+            f.seek(max(data_end - 1, 0))
+            offset = data_end if data_end == 0 or f.read(1) == b'\n' else None
+        if offset is None:
+            with open(path, 'rb') as f:
+                offset = f.read().rfind(b'\n') + 1
+    return {'offset': offset, 'count': count}, tail
+
+def read_delta(path, position):
+    """Valid records appended after ``position`` and the new position (see ``log_stream.read_appended``).
+
+    Only the new records are featurized, whatever the log format.
+    """
+    records, new_position = read_appended(path, position)
+    valid = [e for e in records if isinstance(e, dict) and all(k in e for k in REQUIRED_KEYS)]
+    return valid, new_position
+
+def encode_rows(df, ohe, scaler, feature_names):
+    """Encode a raw feature table into ``feature_names`` column order, as CSR for a sparse-trained model."""
+    import pandas as pd
+
+    if is_sparse_encoder(ohe):
+        return sparse_feature_matrix(df, df, ohe, scaler, feature_names)
+    encoded = pd.DataFrame(ohe.transform(df[CATEGORICAL_COLS]),
+                           columns=ohe.get_feature_names_out(CATEGORICAL_COLS), index=df.index)
+    numeric = pd.DataFrame(scaler.transform(df[NUMERIC_COLS]), columns=NUMERIC_COLS, index=df.index)
+    return pd.concat([numeric, encoded], axis=1).reindex(columns=feature_names, fill_value=0.0)
+
+def encoding_of(ohe):
+    """The ``train_model.py --encoding`` and ``--hash-features`` a fitted encoder came from."""
+    if isinstance(ohe, HashedCategoricalEncoder):
+        return 'hashed', ohe.n_features
+    return ('sparse' if is_sparse_encoder(ohe) else 'dense'), DEFAULT_HASH_FEATURES
+
+def class_sample_weights(label_counts, y):
+    """Per-row weights from cumulative class counts, as in ``train_model.main``."""
+    weights = class_weights(label_counts)
+    return np.array([weights[c] for c in y])
+
+def patch_booster(booster, feature_names, numeric_shift):
+    """Resize a booster to ``feature_names`` and re-express numeric splits in the new scaling.
+
+    Appended columns never appear in old splits, so the existing trees predict exactly as
+    before on every row. ``numeric_shift`` maps feature index -> (old mean, old scale,
+    new mean, new scale); each threshold keeps cutting at the same raw value.
+    """
+    import xgboost as xgb
+
+    model = json.loads(booster.save_raw('json'))
+    learner = model['learner']
+    learner['learner_model_param']['num_feature'] = str(len(feature_names))
+    learner['feature_names'] = list(feature_names)
+    learner['feature_types'] = ['float'] * len(feature_names)
+    for tree in learner['gradient_booster']['model']['trees']:
+        conditions = tree['split_conditions']
+        for node, (feature, left) in enumerate(zip(tree['split_indices'], tree['left_children'])):
+            if left != -1 and feature in numeric_shift:
+                old_mean, old_scale, new_mean, new_scale = numeric_shift[feature]
+                conditions[node] = float(np.float32((conditions[node] * old_scale + old_mean - new_mean) / new_scale))
+    patched = xgb.Booster()
+    patched.load_model(bytearray(json.dumps(model).encode()))
+    return patched
+
+class TrainingState:
+    """Sufficient statistics for folding new log records into the trained models.
+
+    Holds cumulative transition and label counts, the scaler's running mean/variance,
+    append-only category vocabularies (new values become new columns at the end),
+    a uniform reservoir of raw rows for refitting the exported decision tree, and the
+    high-water mark of the log.
+    """
+
+    def __init__(self, clf, clf_dt, ohe, scaler, page_encoder, feature_names, transition_freq,
+                 label_counts, reservoir, seen, position, tail):
+        self.clf = clf
+        self.clf_dt = clf_dt
+        self.ohe = ohe
+        self.scaler = scaler
+        self.page_encoder = page_encoder
+        self.feature_names = list(feature_names)
+        self.transition_freq = transition_freq
+        self.label_counts = label_counts
+        self.reservoir = reservoir
+        self.seen = seen
+        self.position = position
+        self.tail = tail
+        self.updates_since_full = 0
+        self.history_rows = seen
+
+    def save(self, path):
+        import joblib
+
+        # Plain attributes, so the file loads whether this module ran as a script or was imported
+        joblib.dump(vars(self), path)
+
+    @classmethod
+    def load(cls, path):
+        import joblib
+
+        state = cls.__new__(cls)
+        state.__dict__.update(joblib.load(path))
+        return state
+
+    @property
+    def vocab(self):
+        return {col: list(cats) for col, cats in zip(CATEGORICAL_COLS, self.ohe.categories_)}
+
+    def _grow_vocabulary(self, df):
+        import pandas as pd
+        from sklearn.preprocessing import OneHotEncoder
+
+        # Hashed columns cover every value already, so the schema never grows
+        if isinstance(self.ohe, HashedCategoricalEncoder):
+            return []
+        vocab = self.vocab
+        added = []
+        for col in CATEGORICAL_COLS:
+            for value in pd.unique(df[col]):
+                if value not in vocab[col]:
+                    vocab[col].append(value)
+                    added.append(f"{col}_{value}")
+        if added:
+            self.ohe = OneHotEncoder(categories=[vocab[col] for col in CATEGORICAL_COLS],
+                                     sparse_output=is_sparse_encoder(self.ohe),
+                                     handle_unknown='ignore').fit(df[CATEGORICAL_COLS])
+            self.feature_names += added
+            logger.info(f"Vocabulary grew by {len(added)} columns: {added}")
+        return added
+
+    def _sample_reservoir(self, df, next_pages, size, rng):
+        """Vectorized reservoir sampling (algorithm R) of the delta rows into ``self.reservoir``."""
+        import pandas as pd
+
+        rows = df.assign(target=next_pages).reset_index(drop=True)
+        fill = max(min(size - len(self.reservoir), len(rows)), 0)
+        rest = np.arange(fill, len(rows))
+        # Row t of the stream replaces slot j ~ U[0, t) when j < size; later rows win ties
+        slots = (rng.random(len(rest)) * (self.seen + rest + 1)).astype(np.int64)
+        replace = pd.Series(rest[slots < size], index=slots[slots < size]).groupby(level=0).last()
+        kept = self.reservoir.drop(index=self.reservoir.index[replace.index.to_numpy()])
+        self.reservoir = pd.concat([kept, rows.iloc[:fill], rows.iloc[replace.to_numpy()]], ignore_index=True)
+        self.seen += len(rows)
+
+    def update(self, records, rounds=DEFAULT_DELTA_ROUNDS, reservoir_size=DEFAULT_RESERVOIR, seed=42):
+        """Fold ``records`` (the log delta) into the statistics and both models.
+
+        Returns ``False`` without changing anything when the delta introduces a next page
+        the boosted model has no class for; only a full retrain can add classes.
+        """
+        import xgboost as xgb
+
+        rows = ([self.tail] if self.tail is not None else []) + records
+        if len(rows) < 2:
+            self.tail = rows[-1] if rows else self.tail
+            return True
+        df, next_pages, delta_freq = extract_feature_table(rows)
+        unknown = set(next_pages) - set(self.page_encoder.classes_)
+        if unknown:
+            logger.warning(f"New target pages {sorted(unknown)} need a full retrain")
+            return False
+
+        old_mean, old_scale = self.scaler.mean_.copy(), self.scaler.scale_.copy()
+        self.scaler.partial_fit(df[NUMERIC_COLS])
+        self._grow_vocabulary(df)
+        self.transition_freq.update(delta_freq)
+        y = self.page_encoder.transform(next_pages)
+        self.label_counts.update(y.tolist())
+
+        numeric_shift = {self.feature_names.index(col): (old_mean[k], old_scale[k], self.scaler.mean_[k],
+                                                        self.scaler.scale_[k])
+                         for k, col in enumerate(NUMERIC_COLS)}
+        booster = patch_booster(self.clf.get_booster(), self.feature_names, numeric_shift)
+        X = encode_rows(df, self.ohe, self.scaler, self.feature_names)
+        params = {k: v for k, v in self.clf.get_xgb_params().items() if v is not None}
+        params['num_class'] = len(self.page_encoder.classes_)
+        dtrain = xgb.DMatrix(X, label=y, weight=class_sample_weights(self.label_counts, y),
+                             feature_names=self.feature_names)
+        booster = xgb.train(params, dtrain, num_boost_round=rounds, xgb_model=booster)
+        self.clf.load_model(bytearray(booster.save_raw('ubj')))
+
+        # The exported tree cannot grow trees, so refit it on a bounded uniform sample
+        rng = np.random.default_rng(seed + self.seen)
+        self._sample_reservoir(df, next_pages, reservoir_size, rng)
+        X_res = encode_rows(self.reservoir, self.ohe, self.scaler, self.feature_names)
+        y_res = self.page_encoder.transform(self.reservoir['target'])
+        self.clf_dt.fit(X_res, y_res, sample_weight=class_sample_weights(self.label_counts, y_res))
+
+        self.tail = rows[-1]
+        self.updates_since_full += 1
+        self.history_rows += len(df)
+        return True
+
+    def save_artifacts(self, tree_format='nested', bundle_dir=DEFAULT_BUNDLE_DIR):
+        """Write the same model files and bundle ``train_model.py`` writes."""
+        import joblib
+
+        if isinstance(self.ohe, HashedCategoricalEncoder):
+            logger.warning("Hashed features have no browser-side encoder; skipping the JavaScript exports")
+        elif tree_format == 'arrays':
+            export_tree_arrays_js(self.clf_dt, self.feature_names, self.page_encoder, self.scaler, self.ohe,
+                                  self.transition_freq)
+        else:
+            export_decision_tree(self.clf_dt, self.feature_names, self.page_encoder, self.scaler, self.ohe,
+                                 self.transition_freq)
+        joblib.dump(self.clf, 'model.joblib')
+        joblib.dump(self.ohe, 'ohe_encoder.joblib')
+        joblib.dump(self.page_encoder, 'page_encoder.joblib')
+        joblib.dump(self.scaler, 'scaler.joblib')
+        joblib.dump(self.feature_names, 'feature_names.joblib')
+        joblib.dump(self.transition_freq, 'transition_freq.joblib')
+        with open('public/encoders.json', 'r') as f:
+            encoders = json.load(f)
+        forest = None if is_sparse_encoder(self.ohe) else compile_forest(self.clf)
+        write_bundle(bundle_dir, self.clf, self.ohe, self.page_encoder, self.scaler, self.feature_names,
+                     self.transition_freq, encoders, forest)
+
+def train_argv(args, previous_ohe=None):
+    """``train_model.py`` options for a full retrain.
+
+    Without ``--encoding``, a retrain keeps the encoding the previous state was trained
+    with, so a scheduled retrain never turns a sparse or hashed model dense.
+    """
+    encoding, hash_features = ('dense', DEFAULT_HASH_FEATURES) if previous_ohe is None else encoding_of(previous_ohe)
+    argv = ['--data', args.data, '--tree-format', args.tree_format, '--cache-dir', args.cache_dir,
+            '--encoding', args.encoding or encoding, '--hash-features', str(args.hash_features or hash_features),
+            '--workers', str(args.workers), '--bundle-dir', args.bundle_dir]
+    if args.params:
+        argv += ['--params', args.params]
+    if args.no_cache:
+        argv.append('--no-cache')
+    return argv
+
+def full_retrain(args, previous_ohe=None):
+    """Retrain from the whole log with ``train_model.py`` and rebuild the state from its outputs."""
+    import joblib
+    from sklearn.tree import DecisionTreeClassifier
+
+    position, tail = log_position(args.data)
+    argv = train_argv(args, previous_ohe)
+    train_model.main(argv)
+
+    df, next_pages, transition_freq = train_model.load_feature_table(train_model.parse_args(argv))
+    page_encoder = joblib.load('page_encoder.joblib')
+    y = page_encoder.transform(next_pages)
+    rng = np.random.default_rng(42)
+    keep = np.sort(rng.choice(len(df), min(args.reservoir, len(df)), replace=False))
+    reservoir = df.iloc[keep].assign(target=np.asarray(next_pages, dtype=object)[keep]).reset_index(drop=True)
+    # train_model keeps its tree local, so refit one with the same settings on the reservoir
+    clf_dt = DecisionTreeClassifier(random_state=42, max_depth=5, min_samples_split=10, min_samples_leaf=5,
+                                    criterion='gini')
+    state = TrainingState(joblib.load('model.joblib'), clf_dt, joblib.load('ohe_encoder.joblib'),
+                          joblib.load('scaler.joblib'), page_encoder, joblib.load('feature_names.joblib'),
+                          Counter(transition_freq), Counter(y.tolist()), reservoir, len(df), position, tail)
+    return state
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Fold newly appended log records into the trained models.')
+    parser.add_argument('--data', default='predictpulse_mockdata.json', help='Growing visit log')
+    parser.add_argument('--state', default=DEFAULT_STATE, help='Persisted sufficient statistics')
+    parser.add_argument('--delta-rounds', type=int, default=DEFAULT_DELTA_ROUNDS,
+                        help='Boosting rounds added per update')
+    parser.add_argument('--full-every', type=int, default=DEFAULT_FULL_EVERY,
+                        help='Retrain from scratch after this many incremental updates')
+    parser.add_argument('--full', action='store_true', help='Force a full retrain now')
+    parser.add_argument('--reservoir', type=int, default=DEFAULT_RESERVOIR,
+                        help='Rows kept for refitting the exported decision tree')
+    parser.add_argument('--tree-format', choices=['nested', 'arrays'], default='nested')
+    parser.add_argument('--cache-dir', default=train_model.DEFAULT_CACHE_DIR)
+    parser.add_argument('--no-cache', action='store_true')
+    # Passed through to train_model.py on a full retrain
+    parser.add_argument('--encoding', choices=['dense', 'sparse', 'hashed'],
+                        help="Feature matrix for a full retrain (default: the current state's, else dense)")
+    parser.add_argument('--hash-features', type=int, help='Hashed categorical columns (--encoding hashed)')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--params', help='Sweep results file whose winner a full retrain trains')
+    parser.add_argument('--bundle-dir', default=DEFAULT_BUNDLE_DIR)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    start = time.perf_counter()
+    state = previous_ohe = None
+    if os.path.exists(args.state):
+        state = TrainingState.load(args.state)
+        previous_ohe = state.ohe
+        if args.full:
+            state = None
+        elif state.updates_since_full >= args.full_every:
+            logger.info(f"{state.updates_since_full} incremental updates since the last full retrain; retraining")
+            state = None
+
+    if state is not None:
+        records, position = read_delta(args.data, state.position)
+        if not records:
+            logger.info("No new records since the last update")
+            return
+        if state.update(records, args.delta_rounds, args.reservoir):
+            state.position = position
+            state.save_artifacts(args.tree_format, args.bundle_dir)
+            elapsed = time.perf_counter() - start
+            logger.info(f"Folded {len(records)} new records into a model trained on {state.history_rows} rows "
+                        f"in {elapsed:.2f}s ({state.clf.get_booster().num_boosted_rounds()} rounds, "
+                        f"{len(state.feature_names)} features, update {state.updates_since_full}/{args.full_every})")
+        else:
+            state = None
+
+    if state is None:
+        # train_model.py has already written every artifact
+        state = full_retrain(args, previous_ohe)
+        logger.info(f"Full retrain on {state.history_rows} rows in {time.perf_counter() - start:.2f}s")
+    state.save(args.state)
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()
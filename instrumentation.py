@@ -0,0 +1,291 @@
+# instrumentation.py
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from generate_asset_map import write_atomic
+from log_stream import peak_rss_mb
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ['memory', 'cpu', 'all']
+DEFAULT_LOG_EVERY = 1000
+DEFAULT_LOG_FIRST = 3
+DEFAULT_REPORT_DIR = 'run_reports'
+DEFAULT_TOP = 15
+RSS_SAMPLE_INTERVAL = 0.02
+METRIC_PREFIX = 'predictpulse'
+
+def current_rss_mb():
+    """Resident set size of this process now, in MB (the peak so far where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+class RssSampler:
+    """Peak RSS while the ``with`` block runs, polled from a background thread."""
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss_mb())
+
+    def __enter__(self):
+        self.start = self.peak = current_rss_mb()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.end = current_rss_mb()
+        self.peak = max(self.peak, self.end)
+
+class RunMetrics:
+    """Stage timers, counters and sampled per-row logging for one pipeline run.
+
+    Used as a context manager, the run becomes ``current()`` so library functions can time
+    stages and sample their logs without being handed the run. On exit it logs a per-stage
+    summary and writes the JSON report and Prometheus textfile, also when the run fails.
+    ``profile`` adds tracemalloc ('memory'), cProfile ('cpu') or both ('all').
+    """
+
+    def __init__(self, job, profile=None, log_every=DEFAULT_LOG_EVERY, log_first=DEFAULT_LOG_FIRST,
+                 report_path=None, textfile_path=None, top=DEFAULT_TOP):
+        self.job = job
+        self.profile = profile
+        self.log_every = log_every
+        self.log_first = log_first
+        self.report_path = report_path
+        self.textfile_path = textfile_path
+        self.top = top
+        self.stages = {}
+        self.counters = Counter()
+        self.log_seen = Counter()
+        self.log_emitted = Counter()
+        self._previous = None
+        self._profiler = None
+        self._hotspots = {}
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """Time the ``with`` block as stage ``name``; set ``stage['rows']`` inside it if not known up front.
+
+        A stage entered again accumulates its time, CPU and rows.
+        """
+        import tracemalloc
+
+        stage = {'rows': rows}
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        cpu = time.process_time()
+        start = time.perf_counter()
+        try:
+            with RssSampler() as rss:
+                yield stage
+        finally:
+            seconds = time.perf_counter() - start
+            totals = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'cpu_seconds': 0.0, 'rows': None,
+                                                   'rss_start_mb': round(rss.start, 1), 'rss_peak_mb': 0.0})
+            totals['calls'] += 1
+            totals['seconds'] += seconds
+            totals['cpu_seconds'] += time.process_time() - cpu
+            if stage['rows'] is not None:
+                totals['rows'] = (totals['rows'] or 0) + stage['rows']
+            totals['rss_peak_mb'] = round(max(totals['rss_peak_mb'], rss.peak), 1)
+            totals['rss_end_mb'] = round(rss.end, 1)
+            if tracing:
+                traced_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+                totals['traced_peak_mb'] = round(max(totals.get('traced_peak_mb', 0.0), traced_peak), 2)
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def sample(self, key):
+        """True when the per-row log ``key`` should be emitted: its first ``log_first`` and every
+        ``log_every``-th occurrence (every one with ``log_every`` of 1). Build the message only then.
+        """
+        self.log_seen[key] += 1
+        seen = self.log_seen[key]
+        if seen <= self.log_first or self.log_every <= 1 or seen % self.log_every == 0:
+            self.log_emitted[key] += 1
+            return True
+        return False
+
+    def __enter__(self):
+        global _current
+        self._previous, _current = _current, self
+        self.started = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self._cpu = time.process_time()
+        if self.profile in ('memory', 'all'):
+            import tracemalloc
+
+            tracemalloc.start()
+        if self.profile in ('cpu', 'all'):
+            import cProfile
+
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _current
+        if self._profiler is not None:
+            self._profiler.disable()
+        self.seconds = time.perf_counter() - self._start
+        self.cpu_seconds = time.process_time() - self._cpu
+        self.succeeded = exc_type is None or (exc_type is SystemExit and exc.code in (None, 0))
+        self._hotspots = self._collect_hotspots()
+        _current = self._previous
+        self.log_summary()
+        if self.report_path:
+            self.write_report(self.report_path)
+        if self.textfile_path:
+            self.write_textfile(self.textfile_path)
+        return False
+
+    def _collect_hotspots(self):
+        hotspots = {}
+        if self.profile in ('memory', 'all'):
+            import tracemalloc
+
+            if tracemalloc.is_tracing():
+                stats = tracemalloc.take_snapshot().statistics('lineno')[:self.top]
+                hotspots['allocations'] = [{'site': str(stat.traceback[0]), 'size_mb': round(stat.size / (1024 * 1024), 3),
+                                            'count': stat.count} for stat in stats]
+                tracemalloc.stop()
+        if self._profiler is not None:
+            import pstats
+
+            stats = pstats.Stats(self._profiler)
+            # Ranked by time spent in the function itself, where the bottlenecks show
+            rows = sorted(stats.stats.items(), key=lambda item: -item[1][2])[:self.top]
+            hotspots['functions'] = [
+                {'function': f"{os.path.basename(filename)}:{line}({name})", 'calls': calls,
+                 'tottime': round(tottime, 4), 'cumtime': round(cumtime, 4)}
+                for (filename, line, name), (_, calls, tottime, cumtime, _) in rows]
+            if self.report_path:
+                profile_path = f"{os.path.splitext(self.report_path)[0]}.prof"
+                os.makedirs(os.path.dirname(profile_path) or '.', exist_ok=True)
+                stats.dump_stats(profile_path)
+                hotspots['profile_path'] = profile_path
+        return hotspots
+
+    def report(self):
+        stages = {}
+        for name, totals in self.stages.items():
+            stage = dict(totals, seconds=round(totals['seconds'], 4), cpu_seconds=round(totals['cpu_seconds'], 4))
+            if totals['rows'] and totals['seconds'] > 0:
+                stage['rows_per_sec'] = round(totals['rows'] / totals['seconds'], 1)
+            stages[name] = stage
+        return {
+            'job': self.job, 'started': self.started.isoformat(), 'succeeded': self.succeeded,
+            'seconds': round(self.seconds, 4), 'cpu_seconds': round(self.cpu_seconds, 4),
+            'peak_rss_mb': round(peak_rss_mb(), 1), 'profile': self.profile, 'argv': sys.argv[1:],
+            'stages': stages, 'counters': dict(self.counters),
+            'sampled_logs': {key: {'seen': seen, 'emitted': self.log_emitted[key]}
+                             for key, seen in self.log_seen.items()},
+            **self._hotspots,
+        }
+
+    def log_summary(self):
+        for name, totals in self.stages.items():
+            throughput = f", {totals['rows'] / totals['seconds']:.0f} rows/sec" if totals['rows'] and totals['seconds'] > 0 else ''
+            traced = f", traced peak {totals['traced_peak_mb']:.1f} MB" if 'traced_peak_mb' in totals else ''
+            logger.info(f"Stage {name}: {totals['seconds']:.3f}s (CPU {totals['cpu_seconds']:.3f}s{throughput}), "
+                        f"RSS {totals['rss_start_mb']:.0f} -> peak {totals['rss_peak_mb']:.0f} MB{traced}")
+        suppressed = {key: seen - self.log_emitted[key] for key, seen in self.log_seen.items()
+                      if seen > self.log_emitted[key]}
+        if suppressed:
+            logger.info(f"Sampled per-row logs (suppressed): {suppressed}")
+        for site in self._hotspots.get('allocations', [])[:5]:
+            logger.info(f"Allocated {site['size_mb']:.2f} MB in {site['count']} blocks at {site['site']}")
+        for function in self._hotspots.get('functions', [])[:5]:
+            logger.info(f"{function['tottime']:.3f}s ({function['cumtime']:.3f}s cumulative) in {function['calls']} calls "
+                        f"of {function['function']}")
+        logger.info(f"Run {self.job} {'succeeded' if self.succeeded else 'failed'} in {self.seconds:.2f}s, "
+                    f"peak RSS {peak_rss_mb():.1f} MB")
+
+    def write_report(self, path):
+        write_atomic(path, json.dumps(self.report(), indent=2))
+        logger.info(f"Run report saved to {path}")
+
+    def write_textfile(self, path):
+        """Prometheus textfile-collector format, replaced atomically so node_exporter never reads half a file."""
+        report = self.report()
+        job = {'job': self.job}
+        metrics = [
+            ('run_success', 'Whether the last run finished without error.', [(job, int(self.succeeded))]),
+            ('run_duration_seconds', 'Wall time of the last run.', [(job, report['seconds'])]),
+            ('run_peak_rss_bytes', 'Peak resident set size of the last run.',
+             [(job, int(report['peak_rss_mb'] * 1024 * 1024))]),
+            ('run_last_timestamp_seconds', 'Unix time the last run started.', [(job, int(self.started.timestamp()))]),
+            ('stage_duration_seconds', 'Wall time per pipeline stage.',
+             [(dict(job, stage=name), stage['seconds']) for name, stage in report['stages'].items()]),
+            ('stage_cpu_seconds', 'Process CPU time per pipeline stage.',
+             [(dict(job, stage=name), stage['cpu_seconds']) for name, stage in report['stages'].items()]),
+            ('stage_rows', 'Rows processed per pipeline stage.',
+             [(dict(job, stage=name), stage['rows']) for name, stage in report['stages'].items() if stage['rows']]),
+            ('stage_rows_per_second', 'Throughput per pipeline stage.',
+             [(dict(job, stage=name), stage['rows_per_sec']) for name, stage in report['stages'].items()
+              if 'rows_per_sec' in stage]),
+            ('stage_peak_rss_bytes', 'Peak resident set size during each pipeline stage.',
+             [(dict(job, stage=name), int(stage['rss_peak_mb'] * 1024 * 1024))
+              for name, stage in report['stages'].items()]),
+            ('events', 'Pipeline event counters of the last run.',
+             [(dict(job, event=name), value) for name, value in report['counters'].items()]),
+        ]
+        lines = []
+        for name, help_text, samples in metrics:
+            if not samples:
+                continue
+            metric = f"{METRIC_PREFIX}_{name}"
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{_escape_label(value)}"' for key, value in labels.items())
+                lines.append(f"{metric}{{{label_text}}} {value}")
+        write_atomic(path, '\n'.join(lines) + '\n')
+        logger.info(f"Prometheus metrics saved to {path}")
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# Library code reports to the active run; outside one, stages and counters go to this unreported default
+_current = RunMetrics(None)
+
+def current():
+    return _current
+
+def sampled(log, level, key):
+    """Whether to emit per-row log ``key`` on ``log`` at ``level``: enabled there and picked by the run's sampling."""
+    return log.isEnabledFor(level) and _current.sample(key)
+
+def add_arguments(parser):
+    """The instrumentation options shared by the pipeline scripts."""
+    group = parser.add_argument_group('instrumentation')
+    group.add_argument('--profile', choices=PROFILE_MODES,
+                       help='Also capture tracemalloc allocation sites (memory), cProfile hotspots (cpu) or both')
+    group.add_argument('--log-every', type=int, default=DEFAULT_LOG_EVERY,
+                       help='Emit per-row log lines only for the first few rows and then every N-th (1 logs all)')
+    group.add_argument('--run-report', help=f"JSON run report (default: {DEFAULT_REPORT_DIR}/<job>.json)")
+    group.add_argument('--metrics-textfile',
+                       help=f"Prometheus textfile with the run metrics (default: {DEFAULT_REPORT_DIR}/<job>.prom)")
+
+def from_args(args, job):
+    return RunMetrics(job, args.profile, args.log_every,
+                      report_path=args.run_report or os.path.join(DEFAULT_REPORT_DIR, f"{job}.json"),
+                      textfile_path=args.metrics_textfile or os.path.join(DEFAULT_REPORT_DIR, f"{job}.prom"))
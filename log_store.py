@@ -0,0 +1,683 @@
+# log_store.py
+import argparse
+import bisect
+import fcntl
+import gzip
+import hashlib
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from generate_asset_map import timestamp_key
+from log_stream import iter_raw_records
+from ngram_model import session_id
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_DIR = 'log_store'
+MANIFEST = 'index.json'
+LOCK_FILE = '.writer.lock'
+STORE_VERSION = 1
+DEFAULT_SEGMENT_RECORDS = 50_000
+DEFAULT_SEGMENT_BYTES = 32 << 20
+DEFAULT_BLOCK_RECORDS = 1000
+DEFAULT_COMPRESSION = 'gz'
+SNAPSHOT_RETRIES = 20
+UPLOAD_PATH = '/api/upload-logs'
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8787
+MAX_BODY_BYTES = 16 << 20
+# Same headers as server/api/upload-logs.js, so the client can point VITE_SERVER_URL at the stand-in
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'POST, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type',
+    'Access-Control-Max-Age': '86400',
+}
+
+_ENCODER = json.JSONEncoder(separators=(',', ':'))
+
+def _codec(name):
+    """``(compress, decompress)`` for one segment block."""
+    if name == 'gz':
+        return (lambda data: gzip.compress(data, compresslevel=6, mtime=0)), gzip.decompress
+    if name == 'zst':
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("Writing .zst segments requires the 'zstandard' package (pip install zstandard)") from e
+        return zstandard.ZstdCompressor(level=3).compress, zstandard.ZstdDecompressor().decompress
+    raise ValueError(f"Unknown compression {name!r}; use 'gz' or 'zst'")
+
+def _active_name(seg_id):
+    return f"active-{seg_id:06d}.ndjson"
+
+def _segment_name(seg_id, compression):
+    return f"seg-{seg_id:06d}.ndjson.{compression}"
+
+def _sidecar_name(seg_id):
+    return f"seg-{seg_id:06d}.idx.json"
+
+def _write_json_atomic(path, value):
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(value, f, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def read_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST), 'r') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    if manifest.get('version') != STORE_VERSION:
+        raise ValueError(f"{root}: store version {manifest.get('version')} is not {STORE_VERSION}")
+    return manifest
+
+def is_store(path):
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+def record_key(entry):
+    """``(seconds since the epoch or None, session id or None)`` used by the index."""
+    ts = timestamp_key(entry.get('timestamp'))
+    visit_id = entry.get('visitId')
+    return (None if math.isinf(ts) else ts), (session_id(visit_id) if isinstance(visit_id, str) else None)
+
+def _time_bound(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    bound = timestamp_key(value)
+    if math.isinf(bound):
+        raise ValueError(f"Invalid time bound {value!r}; use an ISO 8601 timestamp")
+    return bound
+
+class _Span:
+    """Record count, time range and sessions of a block or segment."""
+
+    def __init__(self):
+        self.records = 0
+        self.t_min = self.t_max = None
+        self.sessions = set()
+
+    def add(self, ts, session):
+        self.records += 1
+        if ts is not None:
+            self.t_min = ts if self.t_min is None else min(self.t_min, ts)
+            self.t_max = ts if self.t_max is None else max(self.t_max, ts)
+        if session is not None:
+            self.sessions.add(session)
+
+class LogWriter:
+    """Appends records to the active NDJSON segment and seals it into a compressed segment when full.
+
+    A sealed segment is a series of independently compressed blocks (a valid multi-member
+    .gz file), described by a sidecar index of per-block time ranges and the blocks holding
+    each session. The manifest lists the sealed segments, so readers skip whole segments
+    and blocks outside a time window. One writer per store is enforced with a lock file.
+    """
+
+    def __init__(self, root, segment_records=DEFAULT_SEGMENT_RECORDS, segment_bytes=DEFAULT_SEGMENT_BYTES,
+                 block_records=DEFAULT_BLOCK_RECORDS, compression=DEFAULT_COMPRESSION, fsync=False):
+        self.root = root
+        self.segment_records = segment_records
+        self.segment_bytes = segment_bytes
+        self.block_records = block_records
+        self.compression = compression
+        self.compress = _codec(compression)[0]
+        self.fsync = fsync
+        os.makedirs(root, exist_ok=True)
+        self._lock = open(os.path.join(root, LOCK_FILE), 'w')
+        try:
+            fcntl.flock(self._lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock.close()
+            raise RuntimeError(f"{root} is already open by another writer")
+        self.manifest = read_manifest(root)
+        if self.manifest is None:
+            self.manifest = {'version': STORE_VERSION, 'generation': 0, 'active': 1, 'sealing': [], 'segments': []}
+            open(os.path.join(root, _active_name(1)), 'ab').close()
+            self._write_manifest()
+        # A crash between starting a rotation and finishing it leaves segments to seal
+        for seg_id in list(self.manifest['sealing']):
+            self._seal(seg_id)
+        self._open_active()
+
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    def _write_manifest(self):
+        self.manifest['generation'] += 1
+        _write_json_atomic(self._path(MANIFEST), self.manifest)
+
+    def _open_active(self):
+        path = self._path(_active_name(self.manifest['active']))
+        self.active_meta = []
+        size = 0
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    size += len(line)
+                    if line.strip():
+                        self.active_meta.append(record_key(json.loads(line)))
+            # Drop a half-written last line so the next append starts on a fresh line
+            if size != os.path.getsize(path):
+                logger.warning(f"Truncating a partial record at the end of {path}")
+                os.truncate(path, size)
+        self.active = open(path, 'ab')
+        self.active_bytes = size
+
+    @property
+    def records(self):
+        """Records in the store, sealed and active."""
+        return sum(seg['records'] for seg in self.manifest['segments']) + len(self.active_meta)
+
+    def append(self, records):
+        """Append a batch of record dicts; returns how many were written.
+
+        A batch that crosses a segment limit is split there, so a segment never holds more
+        than ``segment_records`` records, and passes ``segment_bytes`` by at most one record.
+        """
+        records = list(records)
+        for entry in records:
+            if not isinstance(entry, dict):
+                raise ValueError(f"Log records must be JSON objects, got {type(entry).__name__}")
+        lines = [_ENCODER.encode(entry).encode('utf-8') + b'\n' for entry in records]
+        ends = [0, *itertools.accumulate(len(line) for line in lines)]
+        start = 0
+        while start < len(lines):
+            room = self.segment_records - len(self.active_meta)
+            # The first line that brings the segment to its byte limit closes the piece
+            full = bisect.bisect_left(ends, ends[start] + self.segment_bytes - self.active_bytes, start + 1)
+            end = min(start + max(room, 1), full, len(lines))
+            self.active_meta.extend(record_key(entry) for entry in records[start:end])
+            self.active.write(b''.join(lines[start:end]))
+            self.active.flush()
+            if self.fsync:
+                os.fsync(self.active.fileno())
+            self.active_bytes += ends[end] - ends[start]
+            if len(self.active_meta) >= self.segment_records or self.active_bytes >= self.segment_bytes:
+                self.rotate()
+            start = end
+        return len(lines)
+
+    def rotate(self):
+        """Seal the active segment and start a new one."""
+        if not self.active_meta:
+            return
+        seg_id = self.manifest['active']
+        meta = self.active_meta
+        self.active.close()
+        # Create the next active file before publishing it, then seal the old one
+        open(self._path(_active_name(seg_id + 1)), 'ab').close()
+        self.manifest['sealing'].append(seg_id)
+        self.manifest['active'] = seg_id + 1
+        self._write_manifest()
+        self._open_active()
+        self._seal(seg_id, meta)
+
+    def _seal(self, seg_id, meta=None):
+        source = self._path(_active_name(seg_id))
+        with open(source, 'rb') as f:
+            lines = [line for line in f if line.endswith(b'\n') and line.strip()]
+        if meta is None:
+            meta = [record_key(json.loads(line)) for line in lines]
+        segment, blocks, sessions = _Span(), [], {}
+        name = _segment_name(seg_id, self.compression)
+        tmp_path = self._path(f"{name}.tmp")
+        with open(tmp_path, 'wb') as out:
+            for start in range(0, len(lines), self.block_records):
+                block = _Span()
+                for ts, session in meta[start:start + self.block_records]:
+                    block.add(ts, session)
+                    segment.add(ts, session)
+                for session in block.sessions:
+                    sessions.setdefault(session, []).append(len(blocks))
+                payload = self.compress(b''.join(lines[start:start + self.block_records]))
+                blocks.append({'offset': out.tell(), 'length': len(payload), 'records': block.records,
+                               't_min': block.t_min, 't_max': block.t_max})
+                out.write(payload)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, self._path(name))
+        _write_json_atomic(self._path(_sidecar_name(seg_id)), {'blocks': blocks, 'sessions': sessions})
+        self.manifest['segments'].append({
+            'id': seg_id, 'file': name, 'records': segment.records, 'bytes': os.path.getsize(self._path(name)),
+            'raw_bytes': sum(len(line) for line in lines), 't_min': segment.t_min, 't_max': segment.t_max,
+        })
+        self.manifest['sealing'].remove(seg_id)
+        self._write_manifest()
+        os.unlink(source)
+        logger.info(f"Sealed segment {seg_id}: {segment.records} records in {len(blocks)} blocks")
+
+    def close(self):
+        self.active.close()
+        self._lock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class LogReader:
+    """Reads a consistent snapshot of a store, optionally limited to a time window or a session.
+
+    Sealed segments are immutable. The uncompressed (sealing and active) segments are opened
+    together with a manifest generation check, so a concurrent rotation is never seen twice
+    or missed.
+    """
+
+    def __init__(self, root):
+        if not is_store(root):
+            raise FileNotFoundError(f"{root} is not a log store (no {MANIFEST})")
+        self.root = root
+        self._sidecars = {}
+        self.last_read = {}
+
+    def _snapshot(self):
+        for _ in range(SNAPSHOT_RETRIES):
+            manifest = read_manifest(self.root)
+            handles = []
+            try:
+                for seg_id in manifest['sealing'] + [manifest['active']]:
+                    handles.append(open(os.path.join(self.root, _active_name(seg_id)), 'rb'))
+            except FileNotFoundError:
+                pass
+            else:
+                if read_manifest(self.root)['generation'] == manifest['generation']:
+                    return manifest, handles
+            for handle in handles:
+                handle.close()
+            time.sleep(0.01)
+        raise RuntimeError(f"{self.root} kept rotating while being read")
+
+    def _sidecar(self, seg_id):
+        if seg_id not in self._sidecars:
+            with open(os.path.join(self.root, _sidecar_name(seg_id)), 'r') as f:
+                self._sidecars[seg_id] = json.load(f)
+        return self._sidecars[seg_id]
+
+    def fingerprint(self):
+        """Changes whenever records are added; stands in for a content hash of the whole store."""
+        with open(os.path.join(self.root, MANIFEST), 'rb') as f:
+            text = f.read()
+        digest = hashlib.sha256(text)
+        manifest = json.loads(text)
+        try:
+            st = os.stat(os.path.join(self.root, _active_name(manifest['active'])))
+            digest.update(f"{st.st_size}:{st.st_mtime_ns}".encode())
+        except FileNotFoundError:
+            pass
+        return digest.hexdigest()
+
+    def iter_records(self, start=None, end=None, session=None):
+        """Yield records with ``start <= timestamp < end`` (ISO 8601 or epoch seconds) in append order.
+
+        A bounded window skips records without a usable timestamp. ``session`` keeps only one
+        session (the ``visitId`` prefix).
+        """
+        lo, hi = _time_bound(start), _time_bound(end)
+        windowed = lo is not None or hi is not None
+        stats = {'segments': 0, 'segments_read': 0, 'blocks_read': 0, 'records_scanned': 0}
+        self.last_read = stats
+
+        def matches(entry):
+            if session is not None and session_id(entry.get('visitId') or '') != session:
+                return False
+            if windowed:
+                ts, _ = record_key(entry)
+                return ts is not None and (lo is None or ts >= lo) and (hi is None or ts < hi)
+            return True
+
+        def in_window(span):
+            if not windowed:
+                return True
+            return span['t_min'] is not None and (hi is None or span['t_min'] < hi) and \
+                (lo is None or span['t_max'] >= lo)
+
+        manifest, handles = self._snapshot()
+        try:
+            for seg in manifest['segments']:
+                stats['segments'] += 1
+                if not in_window(seg):
+                    continue
+                sidecar = self._sidecar(seg['id'])
+                wanted = set(sidecar['sessions'].get(session, [])) if session is not None else None
+                blocks = [block for i, block in enumerate(sidecar['blocks'])
+                          if in_window(block) and (wanted is None or i in wanted)]
+                if not blocks:
+                    continue
+                stats['segments_read'] += 1
+                decompress = _codec(seg['file'].rsplit('.', 1)[-1])[1]
+                with open(os.path.join(self.root, seg['file']), 'rb') as f:
+                    for block in blocks:
+                        f.seek(block['offset'])
+                        stats['blocks_read'] += 1
+                        for line in decompress(f.read(block['length'])).splitlines():
+                            stats['records_scanned'] += 1
+                            entry = json.loads(line)
+                            if matches(entry):
+                                yield entry
+            for handle in handles:
+                for line in handle:
+                    # A line without its newline is still being written
+                    if not line.endswith(b'\n'):
+                        break
+                    if line.strip():
+                        stats['records_scanned'] += 1
+                        entry = json.loads(line)
+                        if matches(entry):
+                            yield entry
+        finally:
+            for handle in handles:
+                handle.close()
+
+    def read_appended(self, position):
+        """Records after the first ``position['count']``, skipping whole segments and blocks by their counts.
+
+        Same contract as ``log_stream.read_appended``.
+        """
+        skip = position['count']
+        count = 0
+        records = []
+        manifest, handles = self._snapshot()
+        try:
+            for seg in manifest['segments']:
+                if count + seg['records'] <= skip:
+                    count += seg['records']
+                    continue
+                decompress = _codec(seg['file'].rsplit('.', 1)[-1])[1]
+                with open(os.path.join(self.root, seg['file']), 'rb') as f:
+                    for block in self._sidecar(seg['id'])['blocks']:
+                        if count + block['records'] <= skip:
+                            count += block['records']
+                            continue
+                        f.seek(block['offset'])
+                        for line in decompress(f.read(block['length'])).splitlines():
+                            count += 1
+                            if count > skip:
+                                records.append(json.loads(line))
+            for handle in handles:
+                for line in handle:
+                    if not line.endswith(b'\n'):
+                        break
+                    if line.strip():
+                        count += 1
+                        if count > skip:
+                            records.append(json.loads(line))
+        finally:
+            for handle in handles:
+                handle.close()
+        return records, {'offset': None, 'count': count}
+
+    def summary(self):
+        manifest = read_manifest(self.root)
+        segments = manifest['segments']
+        active_path = os.path.join(self.root, _active_name(manifest['active']))
+        return {
+            'segments': len(segments),
+            'sealed_records': sum(seg['records'] for seg in segments),
+            'sealed_bytes': sum(seg['bytes'] for seg in segments),
+            'raw_bytes': sum(seg['raw_bytes'] for seg in segments),
+            'active_bytes': os.path.getsize(active_path) if os.path.exists(active_path) else 0,
+            't_min': min((seg['t_min'] for seg in segments if seg['t_min'] is not None), default=None),
+            't_max': max((seg['t_max'] for seg in segments if seg['t_max'] is not None), default=None),
+        }
+
+class IngestHandler(BaseHTTPRequestHandler):
+    """Local stand-in for ``server/api/upload-logs.js``: POSTed batches are appended to the store."""
+
+    server_version = 'PredictPulseIngest/1'
+
+    def _send(self, status, body=None):
+        payload = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        for header, value in CORS_HEADERS.items():
+            self.send_header(header, value)
+        if body is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_OPTIONS(self):
+        self._send(200)
+
+    def do_POST(self):
+        if self.path.split('?', 1)[0] != UPLOAD_PATH:
+            return self._send(404, {'error': 'Not found'})
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            return self._send(413, {'error': f'Body larger than {MAX_BODY_BYTES} bytes'})
+        try:
+            new_logs = json.loads(self.rfile.read(length))
+        except ValueError:
+            new_logs = None
+        if not isinstance(new_logs, list) or not new_logs or not all(isinstance(e, dict) for e in new_logs):
+            logger.error("Invalid input: newLogs is not a non-empty array of objects")
+            return self._send(400, {'error': 'Invalid or empty logs'})
+        try:
+            with self.server.lock:
+                appended = self.server.writer.append(new_logs)
+                total = self.server.writer.records
+        except Exception as e:
+            logger.error(f"Failed to process logs: {e}")
+            return self._send(500, {'error': f'Failed to process logs: {e}'})
+        return self._send(200, {'success': True, 'message': f'Appended {appended} logs', 'totalLogs': total})
+
+    def _method_not_allowed(self):
+        logger.error(f"Invalid method: {self.command}")
+        self._send(405, {'error': 'Method not allowed'})
+
+    do_GET = do_PUT = do_DELETE = do_PATCH = _method_not_allowed
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+def make_server(writer, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    server = ThreadingHTTPServer((host, port), IngestHandler)
+    server.writer = writer
+    server.lock = threading.Lock()
+    return server
+
+def _percentiles(samples_ms):
+    ordered = sorted(samples_ms)
+    return {'p50_ms': round(statistics.median(ordered), 3),
+            'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3)}
+
+def bench(args):
+    """Ingest ``--data`` in upload-sized batches, then time window and session reads against a full scan."""
+    import urllib.request
+
+    records = list(iter_raw_records(args.data))
+    if not records:
+        logger.error(f"No records in {args.data}")
+        sys.exit(1)
+    root = tempfile.mkdtemp(prefix='log_store_bench_')
+    rng = random.Random(args.seed)
+    results = {'records': len(records), 'batch_size': args.batch_size}
+    try:
+        batches = [records[i:i + args.batch_size] for i in range(0, len(records), args.batch_size)]
+        for fsync in (False, True):
+            store = os.path.join(root, f"fsync-{fsync}")
+            start = time.perf_counter()
+            with LogWriter(store, args.segment_records, block_records=args.block_records, fsync=fsync) as writer:
+                for batch in batches:
+                    writer.append(batch)
+            elapsed = time.perf_counter() - start
+            results[f"ingest{'_fsync' if fsync else ''}_records_per_sec"] = round(len(records) / elapsed)
+            logger.info(f"Ingested {len(records)} records in batches of {args.batch_size} "
+                        f"{'with' if fsync else 'without'} fsync: {len(records) / elapsed:.0f} records/sec")
+        summary = LogReader(os.path.join(root, 'fsync-False')).summary()
+        results['store'] = summary
+        logger.info(f"{summary['segments']} sealed segments, {summary['raw_bytes'] / 2**20:.1f} MB NDJSON "
+                    f"compressed to {summary['sealed_bytes'] / 2**20:.1f} MB")
+
+        # The stand-in server, one client posting sequentially as useUserLogger does
+        http_store = os.path.join(root, 'http')
+        http_batches = batches[:args.http_requests]
+        with LogWriter(http_store, args.segment_records, block_records=args.block_records) as writer:
+            server = make_server(writer, port=0)
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            url = f"http://{DEFAULT_HOST}:{server.server_address[1]}{UPLOAD_PATH}"
+            start = time.perf_counter()
+            for batch in http_batches:
+                request = urllib.request.Request(url, data=json.dumps(batch).encode('utf-8'),
+                                                 headers={'Content-Type': 'application/json'})
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+            elapsed = time.perf_counter() - start
+            server.shutdown()
+            server.server_close()
+        results['http_requests_per_sec'] = round(len(http_batches) / elapsed)
+        logger.info(f"HTTP ingestion: {len(http_batches)} uploads at {len(http_batches) / elapsed:.0f} requests/sec")
+
+        reader = LogReader(os.path.join(root, 'fsync-False'))
+        flat_path = os.path.join(root, 'flat.ndjson')
+        with open(flat_path, 'w') as f:
+            for entry in records:
+                f.write(json.dumps(entry) + '\n')
+        keys = [record_key(entry) for entry in records]
+        times = [ts for ts, _ in keys if ts is not None]
+        span = args.window_minutes * 60
+        windows = [rng.uniform(min(times), max(times) - span) for _ in range(args.windows)]
+        session_list = sorted({s for _, s in keys if s is not None})
+        sessions = rng.sample(session_list, min(args.windows, len(session_list)))
+
+        window_ms, scan_ms, blocks = [], [], []
+        for i, lo in enumerate(windows):
+            start = time.perf_counter()
+            found = sum(1 for _ in reader.iter_records(lo, lo + span))
+            window_ms.append((time.perf_counter() - start) * 1000)
+            blocks.append(reader.last_read['blocks_read'])
+            # A full scan takes seconds on a large log, so only the first few windows are compared
+            if i >= args.scan_windows:
+                continue
+            start = time.perf_counter()
+            scanned = sum(1 for entry in iter_raw_records(flat_path)
+                          if (ts := record_key(entry)[0]) is not None and lo <= ts < lo + span)
+            scan_ms.append((time.perf_counter() - start) * 1000)
+            if found != scanned:
+                raise RuntimeError(f"Window read returned {found} records, full scan {scanned}")
+        session_ms = []
+        for session in sessions:
+            start = time.perf_counter()
+            sum(1 for _ in reader.iter_records(session=session))
+            session_ms.append((time.perf_counter() - start) * 1000)
+        results['window_read'] = dict(_percentiles(window_ms), window_minutes=args.window_minutes,
+                                      median_blocks_read=statistics.median(blocks))
+        results['full_scan'] = _percentiles(scan_ms)
+        results['session_read'] = _percentiles(session_ms)
+        logger.info(f"{args.window_minutes}-minute window: p50 {results['window_read']['p50_ms']:.1f} ms, "
+                    f"p95 {results['window_read']['p95_ms']:.1f} ms ({statistics.median(blocks):.0f} blocks) vs "
+                    f"full NDJSON scan p50 {results['full_scan']['p50_ms']:.1f} ms; "
+                    f"session read p50 {results['session_read']['p50_ms']:.1f} ms")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Benchmark saved to {args.output}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Append-only segmented log store: ingest, serve, export, benchmark.')
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR)
+    parser.add_argument('--import', dest='import_paths', nargs='+', metavar='LOG',
+                        help='Append existing logs (JSON array or NDJSON, optionally .gz/.zst) to the store')
+    parser.add_argument('--serve', action='store_true', help=f'Accept POST {UPLOAD_PATH} uploads into the store')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--fsync', action='store_true', help='fsync the active segment after every batch')
+    parser.add_argument('--segment-records', type=int, default=DEFAULT_SEGMENT_RECORDS,
+                        help='Records per segment before it is sealed (also sealed at 32 MB)')
+    parser.add_argument('--block-records', type=int, default=DEFAULT_BLOCK_RECORDS,
+                        help='Records per compressed block, the unit of a window read')
+    parser.add_argument('--compression', choices=['gz', 'zst'], default=DEFAULT_COMPRESSION)
+    parser.add_argument('--export', metavar='PATH', help='Write the selected records to this NDJSON file')
+    parser.add_argument('--since', help='Export records at or after this ISO 8601 timestamp')
+    parser.add_argument('--until', help='Export records before this ISO 8601 timestamp')
+    parser.add_argument('--session', help='Export one session (visitId prefix)')
+    parser.add_argument('--bench', action='store_true', help='Benchmark ingestion and window reads on --data')
+    parser.add_argument('--data', default='predictpulse_mockdata.json', help='Log replayed by --bench')
+    parser.add_argument('--batch-size', type=int, default=10, help='Records per upload in the benchmark')
+    parser.add_argument('--http-requests', type=int, default=2000, help='Uploads sent to the server in the benchmark')
+    parser.add_argument('--windows', type=int, default=50, help='Random windows and sessions read in the benchmark')
+    parser.add_argument('--window-minutes', type=float, default=60)
+    parser.add_argument('--scan-windows', type=int, default=5,
+                        help='Windows also answered by a full NDJSON scan, for comparison and as a check')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='log_store_bench.json')
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        bench(args)
+        return
+    if args.import_paths or args.serve:
+        try:
+            writer = LogWriter(args.store, args.segment_records, block_records=args.block_records,
+                               compression=args.compression, fsync=args.fsync)
+        except (RuntimeError, ImportError, ValueError) as e:
+            logger.error(f"Cannot open {args.store}: {e}")
+            sys.exit(1)
+        with writer:
+            for path in args.import_paths or []:
+                start = time.perf_counter()
+                batch, imported = [], 0
+                for entry in iter_raw_records(path):
+                    batch.append(entry)
+                    if len(batch) >= 10000:
+                        imported += writer.append(batch)
+                        batch = []
+                imported += writer.append(batch)
+                logger.info(f"Imported {imported} records from {path} in {time.perf_counter() - start:.2f}s")
+            if args.serve:
+                server = make_server(writer, args.host, args.port)
+                logger.info(f"Accepting uploads on http://{args.host}:{args.port}{UPLOAD_PATH} into {args.store} "
+                            f"({writer.records} records)")
+                try:
+                    server.serve_forever()
+                except KeyboardInterrupt:
+                    logger.info("Stopping ingestion server")
+                finally:
+                    server.server_close()
+    if args.export:
+        try:
+            reader = LogReader(args.store)
+            exported = 0
+            with open(args.export, 'w') as out:
+                for entry in reader.iter_records(args.since, args.until, args.session):
+                    out.write(json.dumps(entry) + '\n')
+                    exported += 1
+        except (FileNotFoundError, ValueError) as e:
+            logger.error(f"Export failed: {e}")
+            sys.exit(1)
+        logger.info(f"Exported {exported} records ({reader.last_read['blocks_read']} blocks read) to {args.export}")
+    if not (args.import_paths or args.serve or args.export):
+        try:
+            summary = LogReader(args.store).summary()
+        except FileNotFoundError as e:
+            logger.error(str(e))
+            sys.exit(1)
+        logger.info(f"{args.store}: {summary}")
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()
@@ -0,0 +1,195 @@
+# log_stream.py
+import argparse
+import gzip
+import io
+import json
+import logging
+import os
+import sys
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_KEYS = ['page', 'navPath', 'userAgent', 'timestamp', 'loadTime', 'browser', 'device', 'screenWidth']
+READ_SIZE = 1 << 16
+# Longest array element the reader waits for; a longer unfinished one is reported as malformed
+MAX_RECORD_CHARS = 1 << 24
+# A literal or number cut off by the end of the buffer ("fals", "1e") fails this close to the end
+PARTIAL_TOKEN_CHARS = 5
+
+_WHITESPACE = ' \t\r\n'
+
+def open_log(file_path):
+    """Open a log file as text, transparently decompressing .gz and .zst files."""
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, 'rt', encoding='utf-8')
+    if file_path.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("Reading .zst logs requires the 'zstandard' package (pip install zstandard)") from e
+        reader = zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'), closefd=True)
+        return io.TextIOWrapper(reader, encoding='utf-8')
+    return open(file_path, 'r', encoding='utf-8')
+
+def _iter_json_array(f, first_chunk):
+    """Incrementally decode the elements of a top-level JSON array."""
+    decoder = json.JSONDecoder()
+    buf = first_chunk
+    pos = buf.index('[') + 1
+    eof = False
+    while True:
+        while pos < len(buf) and buf[pos] in _WHITESPACE + ',':
+            pos += 1
+        if pos < len(buf) and buf[pos] == ']':
+            return
+        need_more = pos >= len(buf)
+        if not need_more:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                # A scalar at the end of the buffer may continue in the next chunk
+                need_more = end == len(buf) and not eof and not isinstance(value, (dict, list))
+            except json.JSONDecodeError as e:
+                # Only an element cut off by the end of the buffer can be completed by reading on;
+                # waiting on anything else would buffer the rest of the file before failing
+                truncated = len(buf) - e.pos <= PARTIAL_TOKEN_CHARS or e.msg.startswith('Unterminated string')
+                if eof or not truncated:
+                    raise
+                if len(buf) - pos > MAX_RECORD_CHARS:
+                    raise ValueError(f"JSON array element longer than {MAX_RECORD_CHARS} characters") from e
+                need_more = True
+        if need_more:
+            if eof:
+                raise ValueError("Unterminated JSON array")
+            chunk = f.read(READ_SIZE)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        yield value
+        pos = end
+
+def _iter_ndjson(f, first_chunk):
+    lines = io.StringIO(first_chunk)
+    pending = ''
+    for line in lines:
+        if not line.endswith('\n'):
+            pending = line
+            break
+        if line.strip():
+            yield json.loads(line)
+    for line in f:
+        if pending:
+            line = pending + line
+            pending = ''
+        if line.strip():
+            yield json.loads(line)
+    if pending.strip():
+        yield json.loads(pending)
+
+def iter_raw_records(file_path):
+    """Yield every record of an NDJSON file or a legacy JSON array without loading it whole.
+
+    A directory is read as a ``log_store`` store, segment by segment in append order.
+    """
+    if os.path.isdir(file_path):
+        from log_store import LogReader
+        yield from LogReader(file_path).iter_records()
+        return
+    with open_log(file_path) as f:
+        first_chunk = f.read(READ_SIZE)
+        stripped = first_chunk.lstrip(_WHITESPACE)
+        if stripped.startswith('['):
+            yield from _iter_json_array(f, stripped)
+        else:
+            yield from _iter_ndjson(f, first_chunk)
+
+def iter_records(file_path, required_keys=REQUIRED_KEYS, stats=None):
+    """Yield records that carry all ``required_keys``, counting totals into ``stats``."""
+    if stats is None:
+        stats = {}
+    stats.setdefault('total', 0)
+    stats.setdefault('valid', 0)
+    for entry in iter_raw_records(file_path):
+        stats['total'] += 1
+        if isinstance(entry, dict) and all(k in entry for k in required_keys):
+            stats['valid'] += 1
+            yield entry
+
+def iter_chunks(file_path, chunk_size=10000, required_keys=REQUIRED_KEYS, stats=None):
+    """Yield lists of at most ``chunk_size`` valid records."""
+    chunk = []
+    for entry in iter_records(file_path, required_keys, stats):
+        chunk.append(entry)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def is_plain_ndjson(path):
+    """True when the log can be resumed from a byte offset (uncompressed NDJSON)."""
+    if os.path.isdir(path) or path.endswith(('.gz', '.zst')):
+        return False
+    with open(path, 'r', encoding='utf-8') as f:
+        return not f.read(4096).lstrip().startswith('[')
+
+def read_appended(path, position):
+    """Raw records appended after ``position`` (``{'offset', 'count'}``) and the new position.
+
+    Plain NDJSON is resumed with a seek, so the cost is proportional to the new data; a
+    half-written last line is left for the next read. Other formats (JSON arrays, compressed
+    logs) cannot be seeked and re-parse the prefix, skipping the first ``count`` records. A log
+    store skips whole sealed segments and blocks by their record counts.
+    """
+    if os.path.isdir(path):
+        from log_store import LogReader
+        return LogReader(path).read_appended(position)
+    records = []
+    if position.get('offset') is not None and is_plain_ndjson(path):
+        offset, count = position['offset'], position['count']
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                offset += len(line)
+                if line.strip():
+                    count += 1
+                    records.append(json.loads(line))
+        return records, {'offset': offset, 'count': count}
+    count = 0
+    for entry in iter_raw_records(path):
+        count += 1
+        if count > position['count']:
+            records.append(entry)
+    return records, {'offset': None, 'count': count}
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stream a PredictPulse log and report record counts and peak RSS.')
+    parser.add_argument('file', help='NDJSON, .gz/.zst NDJSON, legacy JSON array log or log store directory')
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    stats = {}
+    chunks = sum(1 for _ in iter_chunks(args.file, args.chunk_size, stats=stats))
+    if os.path.isdir(args.file):
+        size_mb = sum(os.path.getsize(os.path.join(args.file, name)) for name in os.listdir(args.file)) / (1024 * 1024)
+    else:
+        size_mb = os.path.getsize(args.file) / (1024 * 1024)
+    logger.info(f"Streamed {stats['valid']} valid of {stats['total']} entries in {chunks} chunks "
+                f"from {size_mb:.1f} MB input; peak RSS {peak_rss_mb():.1f} MB")
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()
@@ -0,0 +1,201 @@
+# lookup_table.py
+import base64
+import json
+import logging
+import os
+import pickle
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CATEGORICAL_COLS = ['page', 'prev_page', 'device', 'browser']
+NUMERIC_COLS = ['screenWidth', 'loadTime', 'transition_frequency']
+DEFAULT_MAX_CELLS = 2_000_000
+PREDICT_CHUNK = 200_000
+
+def numeric_split_thresholds(model, feature_names):
+    """Sorted split thresholds per numeric column, plus whether a split sends ``x == t`` left.
+
+    sklearn trees go left on ``x <= t``; XGBoost goes left on ``x < t``.
+    """
+    thresholds = {}
+    if hasattr(model, 'tree_'):
+        tree = model.tree_
+        internal = tree.children_left != -1
+        for col in NUMERIC_COLS:
+            idx = feature_names.index(col)
+            thresholds[col] = np.unique(tree.threshold[internal & (tree.feature == idx)])
+        return thresholds, True
+    # trees_to_dataframe rounds split values, so read the exact float32 conditions from the JSON dump
+    booster = model.get_booster()
+    trees = json.loads(booster.save_raw('json'))['learner']['gradient_booster']['model']['trees']
+    splits = {feature_names.index(col): [] for col in NUMERIC_COLS}
+    for tree in trees:
+        for feature, condition, left in zip(tree['split_indices'], tree['split_conditions'], tree['left_children']):
+            if left != -1 and feature in splits:
+                splits[feature].append(condition)
+    for col in NUMERIC_COLS:
+        values = np.asarray(splits[feature_names.index(col)], dtype=np.float32).astype(np.float64)
+        thresholds[col] = np.unique(values)
+    return thresholds, False
+
+def bucketize(values, thresholds, left_inclusive):
+    """Index of the threshold interval each (already scaled) value falls into."""
+    # Both model families compare float32 inputs, so bucket on the float32 value too
+    values = np.asarray(values, dtype=np.float32).astype(np.float64)
+    return np.searchsorted(thresholds, values, side='left' if left_inclusive else 'right')
+
+def bucket_representatives(thresholds, left_inclusive):
+    """One value inside every bucket, checked to land in its own bucket after the float32 cast."""
+    if len(thresholds) == 0:
+        return np.zeros(1)
+    edges = np.concatenate([[thresholds[0] - 1.0], (thresholds[:-1] + thresholds[1:]) / 2, [thresholds[-1] + 1.0]])
+    if not np.array_equal(bucketize(edges, thresholds, left_inclusive), np.arange(len(edges))):
+        raise ValueError("Thresholds too close to separate in float32")
+    return edges
+
+class LookupTable:
+    """Dense prediction table over category codes and numeric threshold buckets.
+
+    Every categorical column gets one extra code for values the encoder has never seen
+    (an all-zero one-hot block). A prediction is one flat array index.
+    """
+
+    def __init__(self, categories, thresholds, left_inclusive, scaler_mean, scaler_scale, classes, table):
+        self.categories = categories
+        self.thresholds = thresholds
+        self.left_inclusive = left_inclusive
+        self.scaler_mean = np.asarray(scaler_mean, dtype=np.float64)
+        self.scaler_scale = np.asarray(scaler_scale, dtype=np.float64)
+        self.classes = list(classes)
+        self.table = table
+        self.category_codes = {col: {str(c): i for i, c in enumerate(cats)} for col, cats in categories.items()}
+        self.shape = [len(categories[col]) + 1 for col in CATEGORICAL_COLS] + \
+                     [len(thresholds[col]) + 1 for col in NUMERIC_COLS]
+        self.strides = np.cumprod([1] + self.shape[::-1][:-1])[::-1]
+
+    def flat_index(self, df):
+        """Flat table index for each row of a raw feature table (unscaled numerics)."""
+        index = np.zeros(len(df), dtype=np.int64)
+        for dim, col in enumerate(CATEGORICAL_COLS):
+            unknown = len(self.categories[col])
+            codes = df[col].astype(str).map(self.category_codes[col]).fillna(unknown).to_numpy(dtype=np.int64)
+            index += codes * self.strides[dim]
+        for k, col in enumerate(NUMERIC_COLS):
+            scaled = (df[col].to_numpy(dtype=np.float64) - self.scaler_mean[k]) / self.scaler_scale[k]
+            index += bucketize(scaled, self.thresholds[col], self.left_inclusive) * self.strides[len(CATEGORICAL_COLS) + k]
+        return index
+
+    def predict(self, df):
+        """Encoded class per row, straight from the table."""
+        return self.table[self.flat_index(df)]
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+    def export_js(self, output_path='src/utils/predictNextPageTable.js'):
+        """Write a browser module that predicts with a single typed-array read."""
+        numeric = [
+            {'mean': float(self.scaler_mean[k]), 'scale': float(self.scaler_scale[k]),
+             'thresholds': self.thresholds[col].tolist(), 'stride': int(self.strides[len(CATEGORICAL_COLS) + k])}
+            for k, col in enumerate(NUMERIC_COLS)
+        ]
+        categorical = {col: {'codes': self.category_codes[col], 'unknown': len(self.categories[col]),
+                             'stride': int(self.strides[dim])} for dim, col in enumerate(CATEGORICAL_COLS)}
+        array_type = 'Uint8Array' if self.table.dtype == np.uint8 else 'Uint16Array'
+        lines = [
+            "// Generated by train_model.py (--lookup-table)",
+            f"const PAGES = {json.dumps([str(c) for c in self.classes])};",
+            f"const CATEGORICAL = {json.dumps(categorical)};",
+            f"const NUMERIC = {json.dumps(numeric)};",
+            f"const LEFT_INCLUSIVE = {'true' if self.left_inclusive else 'false'};",
+            f"const TABLE = new {array_type}(Uint8Array.from(atob('{base64.b64encode(self.table.tobytes()).decode()}'), c => c.charCodeAt(0)).buffer);",
+            "",
+            "function bucket(value, thresholds) {",
+            "  // Math.fround mirrors the float32 inputs the model was compiled against",
+            "  const x = Math.fround(value);",
+            "  let b = 0;",
+            "  while (b < thresholds.length && (LEFT_INCLUSIVE ? x > thresholds[b] : x >= thresholds[b])) b++;",
+            "  return b;",
+            "}",
+            "",
+            "export function predictNextPage(data) {",
+            "  const page = data.page?.toLowerCase() || 'home';",
+            "  const navPath = data.navPath || [page];",
+            "  const values = {",
+            "    page,",
+            "    prev_page: navPath.length >= 2 ? navPath[navPath.length - 2].toLowerCase() : 'none',",
+            "    device: data.device?.toLowerCase() || 'other',",
+            "    browser: data.browser?.toLowerCase() || 'chrome',",
+            "  };",
+            "  const numericValues = [data.screenWidth || 1920, data.loadTime || 100, 0];",
+            "  let index = 0;",
+            "  for (const col in CATEGORICAL) {",
+            "    const {codes, unknown, stride} = CATEGORICAL[col];",
+            "    index += (codes[values[col]] ?? unknown) * stride;",
+            "  }",
+            "  NUMERIC.forEach(({mean, scale, thresholds, stride}, k) => {",
+            "    index += bucket((numericValues[k] - mean) / scale, thresholds) * stride;",
+            "  });",
+            "  return PAGES[TABLE[index]];",
+            "}",
+        ]
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        with open(output_path, 'w') as f:
+            f.write('\n'.join(lines))
+        logger.info(f"Generated {output_path} (lookup table, {self.table.size} cells)")
+
+def compile_lookup_table(model, feature_names, ohe, scaler, classes, max_cells=DEFAULT_MAX_CELLS):
+    """Precompute ``model.predict`` over the whole categorical x numeric-bucket space.
+
+    Returns ``None`` when the cross product exceeds ``max_cells``; callers then keep the tree.
+    """
+    import pandas as pd
+
+    categories = {col: list(cats) for col, cats in zip(CATEGORICAL_COLS, ohe.categories_)}
+    thresholds, left_inclusive = numeric_split_thresholds(model, feature_names)
+    shape = [len(categories[col]) + 1 for col in CATEGORICAL_COLS] + [len(thresholds[col]) + 1 for col in NUMERIC_COLS]
+    cells = int(np.prod(shape))
+    if cells > max_cells:
+        logger.warning(f"Lookup table would need {cells} cells (limit {max_cells}); keeping the tree model")
+        return None
+
+    column_index = {name: i for i, name in enumerate(feature_names)}
+    one_hot_columns = {col: np.array([column_index.get(f"{col}_{c}", -1) for c in categories[col]] + [-1])
+                       for col in CATEGORICAL_COLS}
+    numeric_columns = [column_index[col] for col in NUMERIC_COLS]
+    reps = [bucket_representatives(thresholds[col], left_inclusive) for col in NUMERIC_COLS]
+
+    dtype = np.uint8 if len(classes) <= 256 else np.uint16
+    table = np.empty(cells, dtype=dtype)
+    for start in range(0, cells, PREDICT_CHUNK):
+        flat = np.arange(start, min(start + PREDICT_CHUNK, cells))
+        codes = np.unravel_index(flat, shape)
+        X = np.zeros((len(flat), len(feature_names)), dtype=np.float64)
+        rows = np.arange(len(flat))
+        for dim, col in enumerate(CATEGORICAL_COLS):
+            target = one_hot_columns[col][codes[dim]]
+            hit = target >= 0
+            X[rows[hit], target[hit]] = 1.0
+        for k, col in enumerate(NUMERIC_COLS):
+            X[:, numeric_columns[k]] = reps[k][codes[len(CATEGORICAL_COLS) + k]]
+        table[start:start + len(flat)] = model.predict(pd.DataFrame(X, columns=feature_names))
+
+    lookup = LookupTable(categories, thresholds, left_inclusive, scaler.mean_, scaler.scale_, classes, table)
+    model_bytes = len(pickle.dumps(model))
+    logger.info(f"Lookup table: {cells} cells, shape {shape}, {lookup.nbytes} bytes "
+                f"vs {model_bytes} bytes pickled model ({model_bytes / max(lookup.nbytes, 1):.1f}x)")
+    return lookup
+
+def verify_table_parity(lookup, model, df, X):
+    """Check the table against ``model.predict`` on the rows of a raw feature table."""
+    expected = np.asarray(model.predict(X))
+    actual = lookup.predict(df)
+    mismatches = int((expected != actual).sum())
+    if mismatches:
+        logger.error(f"Lookup table parity check failed: {mismatches} of {len(expected)} predictions differ")
+    else:
+        logger.info(f"Lookup table parity check passed on {len(expected)} rows")
+    return mismatches == 0
@@ -0,0 +1,381 @@
+# model_bundle.py
+import argparse
+import datetime
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_FORMAT_VERSION = 1
+DEFAULT_BUNDLE_DIR = 'model_bundle'
+MANIFEST = 'manifest.json'
+FOREST_ARRAYS = ['feature', 'threshold', 'leaf', 'tree_class', 'base']
+
+def _digest(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def _save_json(path, value):
+    with open(path, 'w') as f:
+        json.dump(value, f)
+
+def write_bundle(bundle_dir, clf, ohe, page_encoder, scaler, feature_names, transition_freq, encoders, forest=None):
+    """Write every model artifact into one versioned directory with a checksummed manifest.
+
+    Arrays are stored as ``.npy`` so readers can memory-map them. The bundle is written
+    next to ``bundle_dir`` and swapped in with a rename, so readers never see a half-written one.
+    """
+    from sparse_features import HashedCategoricalEncoder
+
+    tmp_dir = bundle_dir.rstrip('/') + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    components = {}
+
+    def add(name, files, meta=None):
+        entry = {'files': {}, 'meta': meta or {}}
+        for file_name in files:
+            path = os.path.join(tmp_dir, file_name)
+            entry['files'][file_name] = {'sha256': _digest(path), 'bytes': os.path.getsize(path)}
+        components[name] = entry
+
+    clf.save_model(os.path.join(tmp_dir, 'model.ubj'))
+    add('model', ['model.ubj'], {'kind': 'xgboost'})
+
+    if isinstance(ohe, HashedCategoricalEncoder):
+        _save_json(os.path.join(tmp_dir, 'ohe.json'), {'kind': 'hashed', 'n_features': ohe.n_features})
+    else:
+        _save_json(os.path.join(tmp_dir, 'ohe.json'), {
+            'kind': 'onehot', 'columns': list(ohe.feature_names_in_),
+            'categories': [[str(c) for c in cats] for cats in ohe.categories_],
+            'sparse_output': bool(ohe.sparse_output), 'handle_unknown': ohe.handle_unknown,
+        })
+    add('ohe', ['ohe.json'])
+
+    np.save(os.path.join(tmp_dir, 'page_classes.npy'), np.asarray(page_encoder.classes_, dtype=str))
+    add('page_encoder', ['page_classes.npy'])
+
+    for attr in ('mean_', 'scale_', 'var_'):
+        np.save(os.path.join(tmp_dir, f"scaler_{attr.rstrip('_')}.npy"), np.asarray(getattr(scaler, attr)))
+    add('scaler', ['scaler_mean.npy', 'scaler_scale.npy', 'scaler_var.npy'],
+        {'columns': list(scaler.feature_names_in_), 'n_samples_seen': int(scaler.n_samples_seen_)})
+
+    _save_json(os.path.join(tmp_dir, 'feature_names.json'), list(feature_names))
+    add('feature_names', ['feature_names.json'])
+
+    keys = list(transition_freq)
+    np.save(os.path.join(tmp_dir, 'transition_src.npy'), np.asarray([k[0] for k in keys], dtype=str))
+    np.save(os.path.join(tmp_dir, 'transition_dst.npy'), np.asarray([k[1] for k in keys], dtype=str))
+    np.save(os.path.join(tmp_dir, 'transition_count.npy'), np.asarray([transition_freq[k] for k in keys],
+                                                                       dtype=np.int64))
+    add('transition_freq', ['transition_src.npy', 'transition_dst.npy', 'transition_count.npy'])
+
+    _save_json(os.path.join(tmp_dir, 'encoders.json'), encoders)
+    add('encoders', ['encoders.json'])
+
+    if forest is not None:
+        for name in FOREST_ARRAYS:
+            np.save(os.path.join(tmp_dir, f"forest_{name}.npy"), np.ascontiguousarray(forest[name]))
+        add('forest', [f"forest_{name}.npy" for name in FOREST_ARRAYS],
+            {'depth': int(forest['depth']), 'leaf_scale': float(forest['leaf_scale'])})
+
+    # The version names the exact contents, so identical retrains produce identical versions
+    version = hashlib.sha256(json.dumps(components, sort_keys=True).encode()).hexdigest()[:16]
+    manifest = {
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'model_version': version,
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'components': components,
+    }
+    _save_json(os.path.join(tmp_dir, MANIFEST), manifest)
+
+    old_dir = bundle_dir.rstrip('/') + '.old'
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(bundle_dir):
+        os.replace(bundle_dir, old_dir)
+    os.replace(tmp_dir, bundle_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    size = sum(f['bytes'] for c in components.values() for f in c['files'].values())
+    logger.info(f"Wrote model bundle {bundle_dir} version {version} ({len(components)} components, {size} bytes)")
+    return manifest
+
+def bundle_exists(bundle_dir=DEFAULT_BUNDLE_DIR):
+    return os.path.exists(os.path.join(bundle_dir, MANIFEST))
+
+class ForestClassifier:
+    """``predict``/``predict_proba`` over the bundle's compiled forest arrays.
+
+    The arrays stay memory-mapped, so evaluator processes on one host share their pages.
+    """
+
+    def __init__(self, forest):
+        self.forest = forest
+
+    def predict_proba(self, X):
+        from forest_export import forest_margins
+
+        margins = forest_margins(self.forest, X.toarray() if hasattr(X, 'toarray') else X)
+        margins -= margins.max(axis=1, keepdims=True)
+        probs = np.exp(margins)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+    def predict(self, X):
+        return self.predict_proba(X).argmax(axis=1)
+
+class ModelBundle:
+    """Read side of a bundle: opening reads only the manifest; each component loads on first use.
+
+    Every file is checked against its manifest checksum the first time it is read.
+    """
+
+    def __init__(self, bundle_dir=DEFAULT_BUNDLE_DIR, verify=True, mmap_mode='r'):
+        self.bundle_dir = bundle_dir
+        self.verify = verify
+        self.mmap_mode = mmap_mode
+        with open(os.path.join(bundle_dir, MANIFEST), 'r') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format_version') != BUNDLE_FORMAT_VERSION:
+            logger.error(f"Unsupported bundle format {self.manifest.get('format_version')} in {bundle_dir}")
+            raise ValueError(f"Unsupported bundle format: {self.manifest.get('format_version')}")
+        self.version = self.manifest['model_version']
+        self._loaded = {}
+
+    def has(self, component):
+        return component in self.manifest['components']
+
+    def _path(self, component, file_name):
+        entry = self.manifest['components'][component]['files'][file_name]
+        path = os.path.join(self.bundle_dir, file_name)
+        if self.verify and _digest(path) != entry['sha256']:
+            logger.error(f"Checksum mismatch for {path} in bundle {self.version}")
+            raise ValueError(f"Checksum mismatch: {path}")
+        return path
+
+    def _array(self, component, file_name, mmap=True):
+        return np.load(self._path(component, file_name), mmap_mode=self.mmap_mode if mmap else None)
+
+    def _json(self, component, file_name):
+        with open(self._path(component, file_name), 'r') as f:
+            return json.load(f)
+
+    def _get(self, component):
+        if component not in self._loaded:
+            start = time.perf_counter()
+            self._loaded[component] = getattr(self, f"_load_{component}")()
+            logger.debug(f"Loaded bundle component {component} in {(time.perf_counter() - start) * 1e3:.1f} ms")
+        return self._loaded[component]
+
+    def _load_model(self):
+        from xgboost import XGBClassifier
+
+        clf = XGBClassifier()
+        clf.load_model(self._path('model', 'model.ubj'))
+        return clf
+
+    def _load_ohe(self):
+        import pandas as pd
+        from sklearn.preprocessing import OneHotEncoder
+        from sparse_features import HashedCategoricalEncoder
+
+        spec = self._json('ohe', 'ohe.json')
+        if spec['kind'] == 'hashed':
+            return HashedCategoricalEncoder(spec['n_features'])
+        cats = spec['categories']
+        # Fitting with explicit categories on a frame cycling through them restores the fitted state exactly
+        n = max(len(c) for c in cats)
+        frame = pd.DataFrame({col: [c[i % len(c)] for i in range(n)] for col, c in zip(spec['columns'], cats)})
+        ohe = OneHotEncoder(categories=[np.array(c, dtype=object) for c in cats],
+                            sparse_output=spec['sparse_output'], handle_unknown=spec['handle_unknown'])
+        return ohe.fit(frame)
+
+    def _load_page_encoder(self):
+        from sklearn.preprocessing import LabelEncoder
+
+        page_encoder = LabelEncoder()
+        page_encoder.classes_ = self._array('page_encoder', 'page_classes.npy', mmap=False).astype(object)
+        return page_encoder
+
+    def _load_scaler(self):
+        from sklearn.preprocessing import StandardScaler
+
+        meta = self.manifest['components']['scaler']['meta']
+        scaler = StandardScaler()
+        scaler.mean_ = np.array(self._array('scaler', 'scaler_mean.npy'))
+        scaler.scale_ = np.array(self._array('scaler', 'scaler_scale.npy'))
+        scaler.var_ = np.array(self._array('scaler', 'scaler_var.npy'))
+        scaler.n_samples_seen_ = meta['n_samples_seen']
+        scaler.n_features_in_ = len(meta['columns'])
+        scaler.feature_names_in_ = np.array(meta['columns'], dtype=object)
+        return scaler
+
+    def _load_feature_names(self):
+        return self._json('feature_names', 'feature_names.json')
+
+    def _load_transition_freq(self):
+        src = self._array('transition_freq', 'transition_src.npy', mmap=False).tolist()
+        dst = self._array('transition_freq', 'transition_dst.npy', mmap=False).tolist()
+        counts = self._array('transition_freq', 'transition_count.npy', mmap=False).tolist()
+        return Counter(dict(zip(zip(src, dst), counts)))
+
+    def _load_encoders(self):
+        return self._json('encoders', 'encoders.json')
+
+    def _load_forest(self):
+        if not self.has('forest'):
+            logger.error(f"Bundle {self.version} has no compiled forest (sparse-encoded models are not compiled)")
+            raise KeyError('forest')
+        forest = dict(self.manifest['components']['forest']['meta'])
+        for name in FOREST_ARRAYS:
+            forest[name] = self._array('forest', f"forest_{name}.npy")
+        return forest
+
+    clf = property(lambda self: self._get('model'))
+    ohe = property(lambda self: self._get('ohe'))
+    page_encoder = property(lambda self: self._get('page_encoder'))
+    scaler = property(lambda self: self._get('scaler'))
+    feature_names = property(lambda self: self._get('feature_names'))
+    transition_freq = property(lambda self: self._get('transition_freq'))
+    encoders = property(lambda self: self._get('encoders'))
+    forest = property(lambda self: self._get('forest'))
+
+    def forest_classifier(self):
+        return ForestClassifier(self.forest)
+
+def _pss_mb(pid):
+    """Proportional set size: shared pages are split between the processes mapping them."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", 'r') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+# Each benchmark child loads the artifacts, scores one batch, reports, then waits so the
+# parent can read the memory of all children while they are alive at the same time
+_BENCH_CHILD = r"""
+import json, resource, sys, time
+start = time.perf_counter()
+import numpy as np
+sys.path.insert(0, {root!r})
+mode = {mode!r}
+if mode == 'legacy':
+    import joblib
+    clf = joblib.load('model.joblib')
+    ohe, scaler = joblib.load('ohe_encoder.joblib'), joblib.load('scaler.joblib')
+    page_encoder, feature_names = joblib.load('page_encoder.joblib'), joblib.load('feature_names.joblib')
+    transition_freq = joblib.load('transition_freq.joblib')
+    loaded = time.perf_counter()
+    X = np.zeros((256, len(feature_names)), dtype=np.float32)
+    clf.predict_proba(X)
+else:
+    from model_bundle import ModelBundle
+    bundle = ModelBundle({bundle_dir!r})
+    if mode == 'bundle':
+        # Everything the joblib path loads; the forest mode touches only what scoring needs
+        scorer = bundle.clf
+        bundle.ohe, bundle.scaler, bundle.page_encoder, bundle.transition_freq
+    else:
+        scorer = bundle.forest_classifier()
+    X = np.zeros((256, len(bundle.feature_names)), dtype=np.float32)
+    loaded = time.perf_counter()
+    scorer.predict_proba(X)
+first = time.perf_counter()
+print(json.dumps({{'load_s': loaded - start, 'first_prediction_s': first - start,
+                  'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}), flush=True)
+sys.stdin.read()
+"""
+
+def bench_mode(mode, bundle_dir, processes):
+    """Start ``processes`` children at once; per-child timings plus their summed PSS while all are alive."""
+    code = _BENCH_CHILD.format(root=os.path.dirname(os.path.abspath(__file__)), mode=mode, bundle_dir=bundle_dir)
+    children = [subprocess.Popen([sys.executable, '-c', code], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                 text=True) for _ in range(processes)]
+    reports = [json.loads(child.stdout.readline()) for child in children]
+    pss = [_pss_mb(child.pid) for child in children]
+    for child in children:
+        child.stdin.close()
+        child.wait()
+    result = {
+        'mode': mode, 'processes': processes,
+        'load_s': float(np.median([r['load_s'] for r in reports])),
+        'first_prediction_s': float(np.median([r['first_prediction_s'] for r in reports])),
+        'max_rss_mb': float(np.median([r['max_rss_mb'] for r in reports])),
+        'total_pss_mb': sum(pss) if None not in pss else None,
+    }
+    pss_text = f"{result['total_pss_mb']:.1f} MB" if result['total_pss_mb'] is not None else 'n/a'
+    logger.info(f"{mode}: load {result['load_s'] * 1e3:.0f} ms, first prediction "
+                f"{result['first_prediction_s'] * 1e3:.0f} ms, RSS {result['max_rss_mb']:.1f} MB per process, "
+                f"PSS {pss_text} across {processes} processes")
+    return result
+
+def load_legacy_artifacts():
+    import joblib
+
+    with open('public/encoders.json', 'r') as f:
+        encoders = json.load(f)
+    return (joblib.load('model.joblib'), joblib.load('ohe_encoder.joblib'), joblib.load('page_encoder.joblib'),
+            joblib.load('scaler.joblib'), joblib.load('feature_names.joblib'), joblib.load('transition_freq.joblib'),
+            encoders)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build, verify or benchmark the memory-mapped model bundle.')
+    parser.add_argument('--bundle-dir', default=DEFAULT_BUNDLE_DIR)
+    parser.add_argument('--build', action='store_true', help='Build the bundle from the legacy joblib files')
+    parser.add_argument('--verify', action='store_true', help='Check every file against the manifest')
+    parser.add_argument('--bench', action='store_true', help='Compare cold start and memory with the joblib files')
+    parser.add_argument('--processes', type=int, default=4, help='Concurrent evaluators in the benchmark')
+    parser.add_argument('--output', default='bundle_bench.json')
+    args = parser.parse_args(argv)
+
+    if args.build:
+        from forest_export import compile_forest
+        from sparse_features import is_sparse_encoder
+
+        try:
+            clf, ohe, page_encoder, scaler, feature_names, transition_freq, encoders = load_legacy_artifacts()
+        except Exception as e:
+            logger.error(f"Failed to load model or encoders: {e}")
+            sys.exit(1)
+        forest = None if is_sparse_encoder(ohe) else compile_forest(clf)
+        write_bundle(args.bundle_dir, clf, ohe, page_encoder, scaler, feature_names, transition_freq, encoders,
+                     forest)
+    if args.verify:
+        bundle = ModelBundle(args.bundle_dir)
+        for component, entry in bundle.manifest['components'].items():
+            for file_name in entry['files']:
+                bundle._path(component, file_name)
+        logger.info(f"Bundle {bundle.version} verified ({len(bundle.manifest['components'])} components)")
+    if args.bench:
+        if not bundle_exists(args.bundle_dir):
+            logger.error(f"No bundle in {args.bundle_dir}; build one with --build")
+            sys.exit(1)
+        modes = ['legacy', 'bundle', 'bundle-forest'] if ModelBundle(args.bundle_dir).has('forest') \
+            else ['legacy', 'bundle']
+        results = []
+        for processes in sorted({1, args.processes}):
+            results += [bench_mode(mode, args.bundle_dir, processes) for mode in modes]
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Benchmark saved to {args.output}")
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()
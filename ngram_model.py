@@ -0,0 +1,192 @@
+# ngram_model.py
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from log_stream import iter_records
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ORDER = 3
+DEFAULT_GAP_MINUTES = 30
+CONTEXT_SEPARATOR = '>'
+
+def session_id(visit_id):
+    """Session prefix of a ``visitId`` (``<session uuid>-<visit uuid>``)."""
+    parts = visit_id.split('-')
+    return '-'.join(parts[:5]) if len(parts) >= 10 else visit_id
+
+def parse_timestamp(timestamp):
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+
+class SessionTracker:
+    """Tracks the last ``order`` pages of every open session.
+
+    A session is a ``visitId`` prefix; a gap longer than ``gap_seconds`` starts a new one.
+    Sessions idle for longer than the gap are dropped, so memory is bounded by the number
+    of concurrently active sessions, not by stream length.
+    """
+
+    def __init__(self, order=DEFAULT_ORDER, gap_seconds=DEFAULT_GAP_MINUTES * 60):
+        self.order = order
+        self.gap_seconds = gap_seconds
+        self.sessions = OrderedDict()
+
+    def advance(self, entry):
+        """Record ``entry`` and return ``(context, page)``: the session pages before it, and its page."""
+        key = session_id(entry.get('visitId', ''))
+        ts = parse_timestamp(entry['timestamp'])
+        page = entry['page'].lower()
+
+        state = self.sessions.pop(key, None)
+        context = state[0] if state and ts - state[1] <= self.gap_seconds else ()
+        self.sessions[key] = ((context + (page,))[-self.order:], ts)
+
+        # Sessions are kept in last-seen order, so the stale ones are at the front
+        while self.sessions:
+            oldest_key, (_, last_ts) = next(iter(self.sessions.items()))
+            if ts - last_ts <= self.gap_seconds:
+                break
+            del self.sessions[oldest_key]
+        return context, page
+
+class NGramModel:
+    """Order-k Markov next-page model with backoff to shorter contexts.
+
+    Counts live in a hashed prefix index keyed by context tuples of page codes.
+    ``finalize`` resolves the best next page per context, so ``predict`` does at
+    most ``order + 1`` dict lookups.
+    """
+
+    def __init__(self, order=DEFAULT_ORDER, min_count=1):
+        self.order = order
+        self.min_count = min_count
+        self.pages = []
+        self.page_index = {}
+        self.counts = {}
+        self.best = {}
+
+    def _code(self, page):
+        code = self.page_index.get(page)
+        if code is None:
+            code = self.page_index[page] = len(self.pages)
+            self.pages.append(page)
+        return code
+
+    def add(self, context, page):
+        """Count ``page`` after every suffix of ``context`` (including the empty one)."""
+        target = self._code(page)
+        codes = tuple(self._code(p) for p in context[-self.order:])
+        for n in range(len(codes) + 1):
+            nexts = self.counts.setdefault(codes[len(codes) - n:], {})
+            nexts[target] = nexts.get(target, 0) + 1
+
+    def finalize(self):
+        self.best = {}
+        for context, nexts in self.counts.items():
+            if sum(nexts.values()) >= self.min_count:
+                # Ties break on the lower page code so exports are deterministic
+                self.best[context] = max(nexts.items(), key=lambda item: (item[1], -item[0]))[0]
+        return self
+
+    def predict_code(self, context):
+        codes = []
+        for page in context[-self.order:]:
+            code = self.page_index.get(page)
+            codes.append(-1 if code is None else code)
+        codes = tuple(codes)
+        for n in range(len(codes), -1, -1):
+            best = self.best.get(codes[len(codes) - n:])
+            if best is not None:
+                return best
+        return None
+
+    def predict(self, context):
+        """Most likely next page after ``context`` (pages, oldest first), backing off as needed."""
+        code = self.predict_code(tuple(p.lower() for p in context))
+        return None if code is None else self.pages[code]
+
+    def fit_stream(self, records, gap_seconds=DEFAULT_GAP_MINUTES * 60):
+        """Train in one pass over time-ordered records."""
+        tracker = SessionTracker(self.order, gap_seconds)
+        for entry in records:
+            context, page = tracker.advance(entry)
+            self.add(context, page)
+        return self.finalize()
+
+    def _context_key(self, codes):
+        return CONTEXT_SEPARATOR.join(self.pages[c] for c in codes)
+
+    def save(self, path):
+        model = {
+            'order': self.order,
+            'min_count': self.min_count,
+            'pages': self.pages,
+            'counts': {self._context_key(ctx): {str(k): v for k, v in nexts.items()}
+                       for ctx, nexts in self.counts.items()},
+        }
+        with open(path, 'w') as f:
+            json.dump(model, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            model = json.load(f)
+        self = cls(model['order'], model['min_count'])
+        self.pages = model['pages']
+        self.page_index = {page: i for i, page in enumerate(self.pages)}
+        for key, nexts in model['counts'].items():
+            context = tuple(self.page_index[p] for p in key.split(CONTEXT_SEPARATOR)) if key else ()
+            self.counts[context] = {int(k): v for k, v in nexts.items()}
+        return self.finalize()
+
+    def export_table(self, path):
+        """Write the resolved ``context -> page index`` table for constant-time browser lookup.
+
+        Only entries that change the backed-off answer are kept, which keeps the table small.
+        """
+        table = {}
+        for context in sorted(self.best, key=len):
+            best = self.best[context]
+            if not context or self.predict_code(tuple(self.pages[c] for c in context[1:])) != best:
+                table[self._context_key(context)] = best
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'order': self.order, 'separator': CONTEXT_SEPARATOR, 'pages': self.pages, 'table': table},
+                      f, separators=(',', ':'))
+        logger.info(f"Exported {len(table)} of {len(self.best)} contexts to {path} ({os.path.getsize(path)} bytes)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train a session-aware n-gram next-page model.')
+    parser.add_argument('--data', default='predictpulse_mockdata.json', help='Time-ordered visit log')
+    parser.add_argument('--order', type=int, default=DEFAULT_ORDER)
+    parser.add_argument('--min-count', type=int, default=1, help='Minimum observations before a context is used')
+    parser.add_argument('--gap-minutes', type=float, default=DEFAULT_GAP_MINUTES, help='Idle gap that ends a session')
+    parser.add_argument('--output', default='ngram_model.json')
+    parser.add_argument('--export-table', nargs='?', const='public/ngram_table.json', metavar='PATH',
+                        help='Also write a compact context-to-page lookup table (default PATH: public/ngram_table.json)')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    stats = {}
+    model = NGramModel(args.order, args.min_count)
+    model.fit_stream(iter_records(args.data, ['page', 'timestamp'], stats), args.gap_minutes * 60)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Trained order-{args.order} model on {stats['valid']} visits in {elapsed:.2f}s "
+                f"({stats['valid'] / max(elapsed, 1e-9):.0f} visits/sec), {len(model.counts)} contexts")
+    model.save(args.output)
+    if args.export_table:
+        model.export_table(args.export_table)
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()
@@ -0,0 +1,144 @@
+# predictpulse.py
+import argparse
+import importlib
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# Subcommand -> module whose main(argv) it runs. Modules are imported only when their command
+# runs, and keep pandas, scikit-learn, XGBoost and joblib imports inside the functions using them.
+COMMANDS = {
+    'train': ('train_model', 'Train the next-page model and export predictNextPage.js'),
+    'evaluate': ('evaluate', 'Evaluate the trained model on mock data'),
+    'evaluate-real': ('evaluate_real', 'Evaluate the trained model on real-world logs'),
+    'asset-map': ('generate_asset_map', 'Write the latest asset list per page to public/asset_map.json'),
+    'asset-bundles': ('asset_mining', 'Mine per-page core asset sets and shared bundles from the logs'),
+    'log-store': ('log_store', 'Import, serve uploads into, export or benchmark the append-only log store'),
+    'transitions': ('transition_matrix', 'Export k-step page lookahead from the sparse transition matrix'),
+    'synthetic-logs': ('synthetic_logs', 'Generate synthetic visit logs in the mock-data schema'),
+    'stage-bench': ('stage_bench', 'Time and memory-profile each pipeline stage at several data sizes'),
+    'visit-table': ('visit_table', 'Load a log into the interned columnar visit table, or benchmark it against dicts'),
+    'cohort-bench': ('cohort_eval', 'Benchmark per-cohort metrics and bootstrap intervals on synthetic predictions'),
+    'drift-monitor': ('drift_monitor', 'Track windowed accuracy and feature drift over a log, and trigger retraining'),
+}
+# Milliseconds from process start to the first line of `predictpulse <command> --help`
+STARTUP_BUDGET_MS = {
+    'train': 800,
+    'evaluate': 800,
+    'evaluate-real': 800,
+    'asset-map': 300,
+    'asset-bundles': 300,
+    'log-store': 300,
+    'transitions': 500,
+    'synthetic-logs': 500,
+    'stage-bench': 300,
+    'visit-table': 500,
+    'cohort-bench': 300,
+    'drift-monitor': 500,
+}
+DEFAULT_BENCH_OUTPUT = 'startup_bench.json'
+
+def importtime_breakdown(module, top=8):
+    """Cumulative import time of ``module`` and of its slowest direct imports, from ``-X importtime``."""
+    root = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"], cwd=root,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        logger.error(f"Importing {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+        raise RuntimeError(f"Cannot import {module}")
+    children = {}
+    total_ms = 0.0
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Two spaces of indentation per nesting level; a module is reported after everything it imports
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        if level == 1:
+            children[name.strip()] = int(cumulative) / 1000
+        elif level == 0:
+            if name.strip() == module:
+                total_ms = int(cumulative) / 1000
+                break
+            children = {}
+    ranked = sorted(children.items(), key=lambda item: -item[1])[:top]
+    return {'module': module, 'total_ms': total_ms, 'slowest': dict(ranked)}
+
+def time_to_first_output(argv, repeat=5):
+    """Median milliseconds from spawning ``predictpulse`` with ``argv`` to its first byte of output."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), *argv], stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT)
+        proc.stdout.read(1)
+        samples.append((time.perf_counter() - start) * 1000)
+        proc.stdout.read()
+        proc.wait()
+    return statistics.median(samples)
+
+def bench(args):
+    """Report import-time breakdowns and check time to first output against the startup budgets."""
+    results = {'python': sys.version.split()[0], 'commands': {}}
+    over_budget = []
+    for command, (module, _) in COMMANDS.items():
+        breakdown = importtime_breakdown(module)
+        first_output = time_to_first_output([command, '--help'], args.repeat)
+        budget = args.budget_ms if args.budget_ms is not None else STARTUP_BUDGET_MS[command]
+        results['commands'][command] = dict(breakdown, first_output_ms=first_output, budget_ms=budget)
+        slowest = ', '.join(f"{name} {ms:.0f} ms" for name, ms in list(breakdown['slowest'].items())[:3])
+        logger.info(f"{command}: import {module} {breakdown['total_ms']:.0f} ms ({slowest or 'stdlib only'}); "
+                    f"first output {first_output:.0f} ms (budget {budget} ms)")
+        if first_output > budget:
+            over_budget.append(command)
+    for probe in args.probe or []:
+        probe_argv = probe.split()
+        first_output = time_to_first_output(probe_argv, args.repeat)
+        results.setdefault('probes', {})[probe] = {'first_output_ms': first_output}
+        logger.info(f"`predictpulse {probe}`: first output {first_output:.0f} ms")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Startup benchmark saved to {args.output}")
+    if over_budget:
+        logger.error(f"Time to first output over budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='predictpulse', description='PredictPulse model and asset tooling.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for command, (_, help_text) in COMMANDS.items():
+        # Arguments are parsed by the module itself, so `predictpulse train --help` shows train_model's options
+        subparsers.add_parser(command, help=help_text, add_help=False)
+    bench_parser = subparsers.add_parser('bench', help='Measure import time and time to first output')
+    bench_parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement (median reported)')
+    bench_parser.add_argument('--budget-ms', type=int, help='One budget for every command instead of the defaults')
+    bench_parser.add_argument('--probe', action='append',
+                              help="Extra command line to time, e.g. --probe 'evaluate --batch'")
+    bench_parser.add_argument('--output', default=DEFAULT_BENCH_OUTPUT)
+    return parser.parse_known_args(argv)
+
+def main(argv=None):
+    args, rest = parse_args(argv)
+    if args.command == 'bench':
+        if rest:
+            logger.error(f"Unrecognized arguments: {' '.join(rest)}")
+            sys.exit(2)
+        bench(args)
+        return
+    module = importlib.import_module(COMMANDS[args.command][0])
+    module.main(rest)
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()
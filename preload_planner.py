@@ -0,0 +1,191 @@
+# preload_planner.py
+import argparse
+import json
+import logging
+import os
+import sys
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Assets predictAssets.js treats as already loaded by the app shell
+ALWAYS_LOADED = {
+    '/predictpulse/assets/index-.*.js',
+    '/predictpulse/assets/index-.*.css',
+    '/predictpulse/assets/utils.js',
+    '/predictpulse/assets/fonts.css',
+    '/predictpulse/assets/font.woff2',
+    '/predictpulse/assets/page1.jpg',
+}
+# Fallback transfer sizes when neither the log nor the public/ tree knows an asset
+DEFAULT_SIZES = {'img': 120_000, 'script': 100_000, 'style': 20_000, 'font': 25_000}
+DEFAULT_SIZE = 50_000
+CONTEXT_COLS = ['page', 'prev_page', 'device', 'browser']
+
+def asset_size(asset, public_dir='public'):
+    """Byte size of one asset: a logged ``size``/``transferSize``, the file under ``public/``, or a per-type default."""
+    size = asset.get('size') or asset.get('transferSize')
+    if not size:
+        path = os.path.join(public_dir, asset['url'].split('/predictpulse/', 1)[-1].lstrip('/'))
+        size = os.path.getsize(path) if os.path.isfile(path) else DEFAULT_SIZES.get(asset.get('type'), DEFAULT_SIZE)
+    return int(size)
+
+def asset_sizes(asset_map, public_dir='public'):
+    """Byte size per asset URL in the asset map."""
+    sizes = {}
+    for assets in asset_map.values():
+        for asset in assets:
+            if asset['url'] not in sizes:
+                sizes[asset['url']] = asset_size(asset, public_dir)
+    return sizes
+
+def asset_types(asset_map):
+    """Asset type per asset URL in the asset map, which the client needs for the preload ``as``."""
+    types = {}
+    for assets in asset_map.values():
+        for asset in assets:
+            types.setdefault(asset['url'], asset.get('type'))
+    return types
+
+def page_asset_lists(asset_map, exclude=ALWAYS_LOADED):
+    """Lower-cased page -> de-duplicated asset URLs that still need fetching."""
+    pages = {}
+    for page, assets in asset_map.items():
+        urls = []
+        for asset in assets:
+            if asset['url'] not in exclude and asset['url'] not in urls:
+                urls.append(asset['url'])
+        pages[page.lower()] = urls
+    return pages
+
+def plan_preload(probs, classes, page_assets, sizes, byte_budget, request_budget):
+    """Pick the assets that maximize expected bytes saved within the byte and request budgets.
+
+    An asset is needed with probability equal to the total probability of the pages that
+    use it, so shared assets are counted once. Expected saving per byte spent is that
+    probability, so assets are taken greedily in order of it and skipped when they no
+    longer fit. Between equally likely assets the larger one saves more expected bytes for
+    the same request, so it goes first.
+    """
+    need = {}
+    for p, page in zip(probs, classes):
+        for url in page_assets.get(page, ()):
+            need[url] = need.get(url, 0.0) + float(p)
+    plan, spent = [], 0
+    for url in sorted(need, key=lambda u: (-need[u], -sizes[u], u)):
+        if len(plan) >= request_budget:
+            break
+        if need[url] > 0 and spent + sizes[url] <= byte_budget:
+            plan.append(url)
+            spent += sizes[url]
+    return plan
+
+def argmax_policy(probs, classes, page_assets, limit=6):
+    """The current client policy: assets of the single most likely page, first ``limit`` of them."""
+    return page_assets.get(classes[int(np.argmax(probs))], [])[:limit]
+
+def context_keys(columns):
+    return columns[CONTEXT_COLS].astype(str).agg('|'.join, axis=1).to_numpy()
+
+def build_plans(probs, columns, classes, page_assets, sizes, byte_budget, request_budget):
+    """Plans per context and per page, each from the mean predicted distribution over its logged visits."""
+    import pandas as pd
+
+    def plans_by(keys):
+        mean_probs = pd.DataFrame(probs).groupby(keys).mean()
+        return {key: plan_preload(row, classes, page_assets, sizes, byte_budget, request_budget)
+                for key, row in zip(mean_probs.index, mean_probs.to_numpy())}
+
+    return plans_by(context_keys(columns)), plans_by(columns['page'].to_numpy())
+
+def client_plan(plans, fallback, context, page, probs, classes, page_assets):
+    """What ``predictAssets.js`` preloads: the context's plan, else the page's, else the argmax page's assets."""
+    if context in plans:
+        return plans[context]
+    if page in fallback:
+        return fallback[page]
+    return argmax_policy(probs, classes, page_assets)
+
+def score_policy(plans, actual_pages, page_assets, sizes):
+    """Hit rates and wasted bytes of per-row preload sets against the pages actually visited."""
+    needed_bytes = hit_bytes = wasted_bytes = needed_requests = hit_requests = 0
+    for plan, actual in zip(plans, actual_pages):
+        needed = set(page_assets.get(actual, ()))
+        preloaded = set(plan)
+        needed_bytes += sum(sizes[u] for u in needed)
+        hit_bytes += sum(sizes[u] for u in preloaded & needed)
+        wasted_bytes += sum(sizes[u] for u in preloaded - needed)
+        needed_requests += len(needed)
+        hit_requests += len(preloaded & needed)
+    rows = max(len(actual_pages), 1)
+    return {
+        'byte_hit_rate': hit_bytes / needed_bytes if needed_bytes else 0.0,
+        'request_hit_rate': hit_requests / needed_requests if needed_requests else 0.0,
+        'wasted_bytes_per_navigation': wasted_bytes / rows,
+        'preloaded_bytes_per_navigation': (hit_bytes + wasted_bytes) / rows,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Precompute byte-budgeted preload plans from model probabilities.')
+    parser.add_argument('--data', default='predictpulse_mockdata.json', help='Visit log used to enumerate contexts')
+    parser.add_argument('--asset-map', default='public/asset_map.json')
+    parser.add_argument('--byte-budget', type=int, default=250_000)
+    parser.add_argument('--request-budget', type=int, default=6)
+    parser.add_argument('--output', default='public/preload_plan.json')
+    parser.add_argument('--holdout', type=float, default=0.2,
+                        help='Score on this trailing fraction of visits with plans built from the rest (0: in-sample)')
+    args = parser.parse_args(argv)
+
+    from evaluate import build_feature_matrix, load_model_and_encoders, load_visit_table
+
+    clf, ohe, encoders, page_encoder, scaler, feature_names, transition_freq = load_model_and_encoders()
+    with open(args.asset_map, 'r') as f:
+        asset_map = json.load(f)
+    sizes = asset_sizes(asset_map)
+    page_assets = page_asset_lists(asset_map)
+    classes = [str(c) for c in page_encoder.classes_]
+    page_map = {page: idx for idx, page in enumerate(encoders['page'])}
+
+    # As in evaluate --batch: pages outside the model vocabulary dropped, then sorted by parsed timestamp
+    columns = load_visit_table(args.data).prediction_columns(page_map)
+    if columns is None:
+        logger.error("Insufficient valid data points (need at least 2)")
+        sys.exit(1)
+    probs = clf.predict_proba(build_feature_matrix(columns, transition_freq, ohe, scaler, feature_names))
+
+    plans, fallback = build_plans(probs, columns, classes, page_assets, sizes, args.byte_budget, args.request_budget)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({'contextKey': CONTEXT_COLS, 'byteBudget': args.byte_budget, 'requestBudget': args.request_budget,
+                   'sizes': sizes, 'types': asset_types(asset_map), 'plans': plans, 'fallback': fallback}, f, indent=2)
+    logger.info(f"Wrote {len(plans)} context plans and {len(fallback)} page fallbacks to {args.output}")
+
+    # Plans scored on the visits they were built from look better than they are, so by default
+    # the last visits in time order are held out and scored against plans built from the rest
+    split = len(columns) - int(len(columns) * args.holdout)
+    if 0 < split < len(columns):
+        label = f"holdout: last {len(columns) - split} of {len(columns)} visits"
+        plans, fallback = build_plans(probs[:split], columns.iloc[:split], classes, page_assets, sizes,
+                                      args.byte_budget, args.request_budget)
+    else:
+        split, label = 0, 'in-sample'
+    held_out, held_probs = columns.iloc[split:], probs[split:]
+    actual = held_out['actual'].tolist()
+    planned = [client_plan(plans, fallback, key, page, row, classes, page_assets)
+               for key, page, row in zip(context_keys(held_out), held_out['page'], held_probs)]
+    current = [argmax_policy(row, classes, page_assets) for row in held_probs]
+    for name, policy_plans in [('planner', planned), ('argmax+6', current)]:
+        s = score_policy(policy_plans, actual, page_assets, sizes)
+        logger.info(f"{name} ({label}): byte hit rate {s['byte_hit_rate']:.3f}, "
+                    f"request hit rate {s['request_hit_rate']:.3f}, wasted {s['wasted_bytes_per_navigation']:.0f} "
+                    f"B/nav, preloaded {s['preloaded_bytes_per_navigation']:.0f} B/nav")
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()
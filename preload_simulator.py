@@ -0,0 +1,443 @@
+# preload_simulator.py
+import argparse
+import heapq
+import json
+import logging
+import sys
+import time
+
+import numpy as np
+
+from log_stream import REQUIRED_KEYS, iter_records, peak_rss_mb
+from ngram_model import DEFAULT_GAP_MINUTES, NGramModel, parse_timestamp, session_id
+from preload_planner import argmax_policy, asset_size, page_asset_lists, plan_preload
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 20000
+REORDER_VISITS = 100_000
+MISS, HIT, PRELOAD_HIT = 0, 1, 2
+
+class AssetIndex:
+    """Interns asset URLs to small integer codes with a parallel size list."""
+
+    def __init__(self, public_dir='public'):
+        self.public_dir = public_dir
+        self.codes = {}
+        self.sizes = []
+
+    def code(self, asset):
+        code = self.codes.get(asset['url'])
+        if code is None:
+            code = self.codes[asset['url']] = len(self.sizes)
+            self.sizes.append(asset_size(asset, self.public_dir))
+        return code
+
+class ClientCache:
+    """Byte-capacity HTTP cache of asset codes with LRU or LFU eviction.
+
+    ``entries`` maps code -> use count; its insertion order doubles as recency (LRU
+    re-inserts on every hit) or as the age tiebreak between equal counts (LFU).
+    ``pending`` holds preloaded codes that no navigation has used yet.
+    """
+
+    __slots__ = ('capacity', 'lfu', 'used', 'entries', 'pending')
+
+    def __init__(self, capacity, lfu=False):
+        self.capacity = capacity
+        self.lfu = lfu
+        self.used = 0
+        self.entries = {}
+        self.pending = set()
+
+    def access(self, code):
+        count = self.entries.get(code)
+        if count is None:
+            return MISS
+        if self.lfu:
+            self.entries[code] = count + 1
+        else:
+            del self.entries[code]
+            self.entries[code] = count + 1
+        if code in self.pending:
+            self.pending.discard(code)
+            return PRELOAD_HIT
+        return HIT
+
+    def insert(self, code, sizes, preload=False):
+        """Add ``code``; return the bytes of unused preloads evicted to make room."""
+        size = sizes[code]
+        if code in self.entries or size > self.capacity:
+            return 0
+        wasted = 0
+        while self.used + size > self.capacity:
+            if self.lfu:
+                victim = min(self.entries, key=self.entries.__getitem__)
+            else:
+                victim = next(iter(self.entries))
+            del self.entries[victim]
+            self.used -= sizes[victim]
+            if victim in self.pending:
+                self.pending.discard(victim)
+                wasted += sizes[victim]
+        self.entries[code] = 1
+        self.used += size
+        if preload:
+            self.pending.add(code)
+        return wasted
+
+    def unused_bytes(self, sizes):
+        return sum(sizes[code] for code in self.pending)
+
+class Client:
+    """Replay state of one client: a cache with preloading, a cache without, and the open preload."""
+
+    __slots__ = ('cache', 'baseline', 'context', 'plan', 'plan_ts', 'last_ts')
+
+    def __init__(self, capacity, lfu):
+        self.cache = ClientCache(capacity, lfu)
+        self.baseline = ClientCache(capacity, lfu)
+        self.context = ()
+        self.plan = ()
+        self.plan_ts = 0.0
+        self.last_ts = 0.0
+
+class NetworkModel:
+    """Load time of a navigation: one round trip plus the missed bytes over the link."""
+
+    def __init__(self, bandwidth_mbps, latency_ms):
+        self.bytes_per_ms = bandwidth_mbps * 1e6 / 8 / 1000
+        self.latency_ms = latency_ms
+
+    def load_ms(self, miss_bytes):
+        return self.latency_ms + miss_bytes / self.bytes_per_ms if miss_bytes else 0.0
+
+    def budget_bytes(self, elapsed_ms):
+        """Bytes a preload started ``elapsed_ms`` ago has had time to fetch."""
+        return max(elapsed_ms - self.latency_ms, 0.0) * self.bytes_per_ms
+
+def time_ordered_chunks(records, buffer_size=REORDER_VISITS, chunk_size=CHUNK_SIZE):
+    """Chunks of ``records`` in parsed-timestamp order, reordered through a heap of ``buffer_size`` visits.
+
+    A log whose visits are never more than ``buffer_size`` places out of order replays in exact
+    time order; a straggler beyond that is replayed late and counted as out of order.
+    """
+    heap = []
+    chunk = []
+    for seq, entry in enumerate(records):
+        heapq.heappush(heap, (parse_timestamp(entry['timestamp']), seq, entry))
+        if len(heap) > buffer_size:
+            chunk.append(heapq.heappop(heap)[2])
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    while heap:
+        chunk.append(heapq.heappop(heap)[2])
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def record_columns(records, next_record=None):
+    """Per-record prediction inputs, built as ``evaluate.extract_prediction_columns`` builds them.
+
+    As there, the transition target is the page of the following visit in the replayed log;
+    ``next_record`` is the visit after the chunk, or None at the end of the log.
+    """
+    import pandas as pd
+
+    transition_next = [entry['page'].lower() for entry in records[1:]]
+    transition_next.append(next_record['page'].lower() if next_record else 'none')
+    return pd.DataFrame({
+        'page': [entry['page'].lower() for entry in records],
+        'prev_page': [entry['navPath'][-2].lower() if len(entry['navPath']) >= 2 else 'none' for entry in records],
+        'device': [entry['device'].lower() for entry in records],
+        'browser': [entry['browser'].lower() for entry in records],
+        'screenWidth': [entry['screenWidth'] for entry in records],
+        'loadTime': [entry['loadTime'] for entry in records],
+        'transition_next': transition_next,
+    })
+
+class ModelPredictor:
+    """Next-page probabilities from the trained model, one ``predict_proba`` per chunk."""
+
+    def __init__(self):
+        from evaluate import load_model_and_encoders
+
+        self.clf, self.ohe, _, page_encoder, self.scaler, self.feature_names, self.transition_freq = \
+            load_model_and_encoders()
+        self.classes = [str(c) for c in page_encoder.classes_]
+
+    def chunk_probs(self, records, next_record=None):
+        from evaluate import build_feature_matrix
+
+        X = build_feature_matrix(record_columns(records, next_record), self.transition_freq, self.ohe, self.scaler,
+                                 self.feature_names)
+        return self.clf.predict_proba(X)
+
+    def probs(self, context, row_probs):
+        return row_probs
+
+class NGramPredictor:
+    """One-hot next-page distribution from the session n-gram model."""
+
+    def __init__(self, path):
+        self.model = NGramModel.load(path)
+        self.classes = list(self.model.pages)
+
+    def chunk_probs(self, records, next_record=None):
+        return None
+
+    def probs(self, context, row_probs):
+        probs = np.zeros(len(self.classes))
+        code = self.model.predict_code(context)
+        if code is not None:
+            probs[code] = 1.0
+        return probs
+
+class Simulator:
+    """Replays time-ordered visits through per-client caches with and without preloading.
+
+    A client is a ``visitId`` session prefix. After each visit the policy picks assets to
+    preload; by the next visit only as many of them as the link could fetch in the gap
+    have arrived. Clients idle longer than the session gap are retired, so memory is
+    bounded by concurrently active clients.
+    """
+
+    def __init__(self, predictor, policy, asset_map, network, capacity, lfu=False,
+                 byte_budget=250_000, request_budget=6, gap_seconds=DEFAULT_GAP_MINUTES * 60):
+        self.predictor = predictor
+        self.policy = policy
+        self.page_assets = page_asset_lists(asset_map)
+        self.assets = AssetIndex()
+        for page_list in asset_map.values():
+            for asset in page_list:
+                self.assets.code(asset)
+        self.url_sizes = {url: self.assets.sizes[code] for url, code in self.assets.codes.items()}
+        self.network = network
+        self.capacity = capacity
+        self.lfu = lfu
+        self.byte_budget = byte_budget
+        self.request_budget = request_budget
+        self.gap_seconds = gap_seconds
+        self.order = getattr(getattr(predictor, 'model', None), 'order', 1)
+        self.clients = {}
+        self.plan_codes = {}
+        self.pages = {}
+        self.totals = dict.fromkeys(['visits', 'needed_bytes', 'hit_bytes', 'baseline_hit_bytes',
+                                     'preload_hit_bytes', 'preload_bytes', 'wasted_bytes', 'truncated_bytes',
+                                     'load_ms', 'baseline_load_ms', 'out_of_order', 'peak_clients'], 0)
+        self.last_ts = float('-inf')
+
+    def _plan(self, probs):
+        classes = self.predictor.classes
+        if self.policy == 'planner':
+            urls = plan_preload(probs, classes, self.page_assets, self.url_sizes, self.byte_budget,
+                                self.request_budget)
+        else:
+            urls = argmax_policy(probs, classes, self.page_assets)
+        key = tuple(urls)
+        codes = self.plan_codes.get(key)
+        if codes is None:
+            codes = self.plan_codes[key] = tuple(self.assets.codes[url] for url in urls)
+        return codes
+
+    def _retire(self, client):
+        self.totals['wasted_bytes'] += client.cache.unused_bytes(self.assets.sizes)
+
+    def _expire(self, now):
+        while self.clients:
+            key, client = next(iter(self.clients.items()))
+            if now - client.last_ts <= self.gap_seconds:
+                break
+            del self.clients[key]
+            self._retire(client)
+
+    def _page_stats(self, page):
+        stats = self.pages.get(page)
+        if stats is None:
+            stats = self.pages[page] = [0, 0, 0, 0, 0.0, 0.0]
+        return stats
+
+    def visit(self, entry, row_probs=None):
+        sizes = self.assets.sizes
+        totals = self.totals
+        ts = parse_timestamp(entry['timestamp'])
+        if ts < self.last_ts:
+            totals['out_of_order'] += 1
+        self.last_ts = max(self.last_ts, ts)
+        self._expire(ts)
+
+        key = session_id(entry.get('visitId', ''))
+        client = self.clients.pop(key, None)
+        if client is None:
+            client = Client(self.capacity, self.lfu)
+        self.clients[key] = client
+        totals['peak_clients'] = max(totals['peak_clients'], len(self.clients))
+
+        # Land whatever part of the previous preload the link had time for
+        if client.plan:
+            allowance = self.network.budget_bytes((ts - client.plan_ts) * 1000)
+            for code in client.plan:
+                if code in client.cache.entries:
+                    continue
+                if sizes[code] > allowance:
+                    totals['truncated_bytes'] += sizes[code]
+                    continue
+                allowance -= sizes[code]
+                totals['preload_bytes'] += sizes[code]
+                totals['wasted_bytes'] += client.cache.insert(code, sizes, preload=True)
+            client.plan = ()
+
+        page = entry['page'].lower()
+        needed = {self.assets.code(asset) for asset in entry['assets']} or \
+            {self.assets.codes[url] for url in self.page_assets.get(page, ())}
+        needed_bytes = hit_bytes = baseline_hit_bytes = preload_hit_bytes = 0
+        for code in needed:
+            size = sizes[code]
+            needed_bytes += size
+            status = client.cache.access(code)
+            if status == MISS:
+                totals['wasted_bytes'] += client.cache.insert(code, sizes)
+            else:
+                hit_bytes += size
+                if status == PRELOAD_HIT:
+                    preload_hit_bytes += size
+            if client.baseline.access(code) == MISS:
+                client.baseline.insert(code, sizes)
+            else:
+                baseline_hit_bytes += size
+        load_ms = self.network.load_ms(needed_bytes - hit_bytes)
+        baseline_load_ms = self.network.load_ms(needed_bytes - baseline_hit_bytes)
+
+        stats = self._page_stats(page)
+        stats[0] += 1
+        stats[1] += needed_bytes
+        stats[2] += hit_bytes
+        stats[3] += baseline_hit_bytes
+        stats[4] += load_ms
+        stats[5] += baseline_load_ms
+        totals['visits'] += 1
+        totals['needed_bytes'] += needed_bytes
+        totals['hit_bytes'] += hit_bytes
+        totals['baseline_hit_bytes'] += baseline_hit_bytes
+        totals['preload_hit_bytes'] += preload_hit_bytes
+        totals['load_ms'] += load_ms
+        totals['baseline_load_ms'] += baseline_load_ms
+
+        client.context = (client.context + (page,))[-self.order:]
+        client.plan = self._plan(self.predictor.probs(client.context, row_probs))
+        client.plan_ts = ts
+        client.last_ts = ts
+
+    def run(self, chunks):
+        chunks = iter(chunks)
+        records = next(chunks, None)
+        while records is not None:
+            # One chunk of lookahead gives the last visit of each chunk its successor
+            following = next(chunks, None)
+            chunk_probs = self.predictor.chunk_probs(records, following[0] if following else None)
+            if chunk_probs is None:
+                for entry in records:
+                    self.visit(entry)
+            else:
+                for entry, probs in zip(records, chunk_probs):
+                    self.visit(entry, probs)
+            records = following
+        for client in self.clients.values():
+            self._retire(client)
+        self.clients.clear()
+        return self
+
+    def report(self):
+        t = self.totals
+        visits = max(t['visits'], 1)
+        per_page = {}
+        for page, (n, needed, hit, base_hit, load_ms, base_load_ms) in sorted(self.pages.items()):
+            per_page[page] = {
+                'visits': n,
+                'hit_rate': hit / needed if needed else 0.0,
+                'baseline_hit_rate': base_hit / needed if needed else 0.0,
+                'avg_load_ms': load_ms / n,
+                'avg_baseline_load_ms': base_load_ms / n,
+                'avg_load_ms_saved': (base_load_ms - load_ms) / n,
+            }
+        return {
+            'visits': t['visits'],
+            'byte_hit_rate': t['hit_bytes'] / t['needed_bytes'] if t['needed_bytes'] else 0.0,
+            'baseline_byte_hit_rate': t['baseline_hit_bytes'] / t['needed_bytes'] if t['needed_bytes'] else 0.0,
+            'preload_bytes': t['preload_bytes'],
+            'preload_hit_bytes': t['preload_hit_bytes'],
+            'wasted_preload_bytes': t['wasted_bytes'],
+            'truncated_preload_bytes': t['truncated_bytes'],
+            'avg_load_ms': t['load_ms'] / visits,
+            'avg_baseline_load_ms': t['baseline_load_ms'] / visits,
+            'avg_load_ms_saved': (t['baseline_load_ms'] - t['load_ms']) / visits,
+            'out_of_order_visits': t['out_of_order'],
+            'peak_active_clients': t['peak_clients'],
+            'per_page': per_page,
+        }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay logged visits against a modeled browser cache.')
+    parser.add_argument('--data', default='predictpulse_mockdata.json', help='Time-ordered visit log')
+    parser.add_argument('--predictor', choices=['model', 'ngram'], default='model')
+    parser.add_argument('--ngram-model', default='ngram_model.json')
+    parser.add_argument('--policy', choices=['argmax', 'planner'], default='argmax',
+                        help='argmax: first six assets of the likeliest page; planner: byte-budgeted top-k')
+    parser.add_argument('--asset-map', default='public/asset_map.json')
+    parser.add_argument('--byte-budget', type=int, default=250_000)
+    parser.add_argument('--request-budget', type=int, default=6)
+    parser.add_argument('--cache-mb', type=float, default=1.0, help='Per-client cache capacity')
+    parser.add_argument('--eviction', choices=['lru', 'lfu'], default='lru')
+    parser.add_argument('--bandwidth-mbps', type=float, default=10.0)
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--gap-minutes', type=float, default=DEFAULT_GAP_MINUTES, help='Idle gap that ends a client')
+    parser.add_argument('--reorder-visits', type=int, default=REORDER_VISITS,
+                        help='Visits buffered to replay the log in timestamp order')
+    parser.add_argument('--output', default='simulation_results.json')
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.asset_map, 'r') as f:
+            asset_map = json.load(f)
+        predictor = NGramPredictor(args.ngram_model) if args.predictor == 'ngram' else ModelPredictor()
+    except Exception as e:
+        logger.error(f"Failed to load predictor or asset map: {e}")
+        sys.exit(1)
+
+    simulator = Simulator(predictor, args.policy, asset_map,
+                          NetworkModel(args.bandwidth_mbps, args.latency_ms), int(args.cache_mb * 1e6),
+                          lfu=args.eviction == 'lfu', byte_budget=args.byte_budget,
+                          request_budget=args.request_budget, gap_seconds=args.gap_minutes * 60)
+
+    start = time.perf_counter()
+    simulator.run(time_ordered_chunks(iter_records(args.data, REQUIRED_KEYS), args.reorder_visits))
+    elapsed = time.perf_counter() - start
+    results = simulator.report()
+    results['config'] = {k: v for k, v in vars(args).items() if k != 'output'}
+    results['visits_per_sec'] = results['visits'] / max(elapsed, 1e-9)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Replayed {results['visits']} visits in {elapsed:.2f}s ({results['visits_per_sec']:.0f} visits/sec), "
+                f"peak {results['peak_active_clients']} active clients, peak RSS {peak_rss_mb():.1f} MB")
+    logger.info(f"Byte hit rate {results['byte_hit_rate']:.3f} vs {results['baseline_byte_hit_rate']:.3f} without "
+                f"preload; preloaded {results['preload_bytes']} B, wasted {results['wasted_preload_bytes']} B; "
+                f"avg load {results['avg_load_ms']:.1f} ms vs {results['avg_baseline_load_ms']:.1f} ms")
+    for page, stats in results['per_page'].items():
+        logger.info(f"  {page}: {stats['visits']} visits, hit rate {stats['hit_rate']:.3f} "
+                    f"(baseline {stats['baseline_hit_rate']:.3f}), saves {stats['avg_load_ms_saved']:.1f} ms/visit")
+    if results['out_of_order_visits']:
+        logger.warning(f"{results['out_of_order_visits']} visits were replayed late, beyond the "
+                       f"--reorder-visits buffer of {args.reorder_visits}")
+    logger.info(f"Results saved to {args.output}")
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()
@@ -0,0 +1,184 @@
+# sparse_features.py
+import argparse
+import logging
+import sys
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CATEGORICAL_COLS = ['page', 'prev_page', 'device', 'browser']
+NUMERIC_COLS = ['screenWidth', 'loadTime', 'transition_frequency']
+DEFAULT_HASH_FEATURES = 1 << 12
+DENSE_REPORT_LIMIT = 2 * 1024 ** 3
+
+class HashedCategoricalEncoder:
+    """Fixed-width stand-in for ``OneHotEncoder``: every ``col=value`` token hashes to one of ``n_features`` columns.
+
+    The width never depends on the data, so new pages, browsers or devices never change
+    the feature schema; the price is occasional collisions between rare values.
+    """
+
+    def __init__(self, n_features=DEFAULT_HASH_FEATURES):
+        self.n_features = n_features
+
+    def _hasher(self):
+        from sklearn.feature_extraction import FeatureHasher
+        return FeatureHasher(n_features=self.n_features, input_type='string', alternate_sign=False)
+
+    def fit(self, frame):
+        return self
+
+    def transform(self, frame):
+        tokens = zip(*[(f"{col}={value}" for value in frame[col]) for col in frame.columns])
+        return self._hasher().transform(tokens).tocsr()
+
+    def get_feature_names_out(self, input_features=None):
+        return np.array([f"hash_{i}" for i in range(self.n_features)], dtype=object)
+
+def is_sparse_encoder(ohe):
+    """True for encoders fitted by ``encode_features_sparse``; their models must be fed CSR input.
+
+    XGBoost treats implicit zeros in a CSR matrix as missing values, so a model trained
+    on sparse input scores differently on the equivalent dense matrix.
+    """
+    return isinstance(ohe, HashedCategoricalEncoder) or bool(getattr(ohe, 'sparse_output', False))
+
+def _categorical_entries(ohe, frame, column_index):
+    """``(rows, cols)`` of the non-zero categorical features, in ``feature_names`` column space."""
+    rows, cols = [], []
+    if isinstance(ohe, HashedCategoricalEncoder):
+        block = ohe.transform(frame).tocoo()
+        remap = np.array([column_index[name] for name in ohe.get_feature_names_out()], dtype=np.int64)
+        return [block.row.astype(np.int64)], [remap[block.col]]
+    for col, cats in zip(frame.columns, ohe.categories_):
+        mapping = {cat: column_index[f"{col}_{cat}"] for cat in cats if f"{col}_{cat}" in column_index}
+        codes = frame[col].map(mapping).to_numpy(dtype=np.float64)
+        # Unseen values encode to all zeros, as with handle_unknown='ignore'
+        known = ~np.isnan(codes)
+        rows.append(np.flatnonzero(known))
+        cols.append(codes[known].astype(np.int64))
+    return rows, cols
+
+def sparse_feature_matrix(numeric, categorical, ohe, scaler, feature_names):
+    """CSR feature matrix in ``feature_names`` column order, without a dense intermediate.
+
+    Scaled numeric values are stored explicitly (zeros included), so only absent categorical
+    columns are implicit.
+    """
+    from scipy import sparse
+
+    column_index = {name: i for i, name in enumerate(feature_names)}
+    n_rows = len(numeric)
+    scaled = scaler.transform(numeric[NUMERIC_COLS])
+    num_cols = np.array([column_index[col] for col in NUMERIC_COLS], dtype=np.int64)
+    rows = [np.repeat(np.arange(n_rows, dtype=np.int64), len(NUMERIC_COLS))]
+    cols = [np.tile(num_cols, n_rows)]
+    vals = [np.asarray(scaled, dtype=np.float64).ravel()]
+    cat_rows, cat_cols = _categorical_entries(ohe, categorical[CATEGORICAL_COLS], column_index)
+    rows += cat_rows
+    cols += cat_cols
+    vals += [np.ones(len(r)) for r in cat_rows]
+    return sparse.csr_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                             shape=(n_rows, len(feature_names)))
+
+def encode_features_sparse(df, next_pages, hash_features=None):
+    """Sparse counterpart of ``train_model.encode_features``; returns the same tuple with a CSR matrix.
+
+    With ``hash_features`` set, categorical columns are hashed instead of one-hot encoded.
+    """
+    from sklearn.preprocessing import LabelEncoder, OneHotEncoder, StandardScaler
+
+    if hash_features:
+        ohe = HashedCategoricalEncoder(hash_features).fit(df[CATEGORICAL_COLS])
+    else:
+        ohe = OneHotEncoder(sparse_output=True, handle_unknown='ignore').fit(df[CATEGORICAL_COLS])
+    scaler = StandardScaler().fit(df[NUMERIC_COLS])
+    feature_names = NUMERIC_COLS + list(ohe.get_feature_names_out(CATEGORICAL_COLS))
+    X = sparse_feature_matrix(df, df, ohe, scaler, feature_names)
+    logger.info(f"Sparse feature matrix: {X.shape}, {X.nnz} non-zeros, {matrix_nbytes(X) / 1e6:.1f} MB")
+
+    page_encoder = LabelEncoder()
+    y_encoded = page_encoder.fit_transform(next_pages)
+    logger.info(f"Page encoder classes: {page_encoder.classes_}")
+    return X, ohe, page_encoder, y_encoded, scaler, feature_names
+
+def matrix_nbytes(X):
+    from scipy import sparse
+
+    if sparse.issparse(X):
+        return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    return np.asarray(X).nbytes
+
+def synthetic_table(rows, vocab, seed=0):
+    """Feature table with a Zipf-distributed page vocabulary of ``vocab`` routes."""
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    pages = np.array([f"route{i}" for i in range(vocab)], dtype=object)
+    weights = 1.0 / np.arange(1, vocab + 1)
+    weights /= weights.sum()
+    visits = pages[rng.choice(vocab, rows + 1, p=weights)]
+    df = pd.DataFrame({
+        'page': visits[1:],
+        'prev_page': visits[:-1],
+        'device': rng.choice(['iphone', 'mac', 'other', 'android', 'ipad'], rows),
+        'browser': rng.choice(['chrome', 'firefox', 'safari', 'mobile safari', 'edge'], rows),
+        'screenWidth': rng.choice([375, 768, 1366, 1440, 1920], rows),
+        'loadTime': rng.uniform(50, 450, rows),
+        'transition_frequency': np.zeros(rows),
+    })
+    return df, list(pages[rng.choice(vocab, rows, p=weights)])
+
+def encoding_report(rows, vocab_sizes, hash_features=DEFAULT_HASH_FEATURES, train_rounds=10):
+    """Log matrix memory, encode time and XGBoost fit time of dense, sparse and hashed encodings."""
+    from xgboost import XGBClassifier
+
+    report = []
+    for vocab in vocab_sizes:
+        df, next_pages = synthetic_table(rows, vocab)
+        # Keep the class count fixed so fit time reflects the feature encoding, not the label space
+        targets = [page if page in {'route0', 'route1', 'route2'} else 'other' for page in next_pages]
+        n_ohe = sum(df[col].nunique() for col in CATEGORICAL_COLS)
+        for encoding in ['dense', 'sparse', 'hashed']:
+            entry = {'vocab': vocab, 'encoding': encoding, 'rows': rows}
+            if encoding == 'dense' and rows * (n_ohe + len(NUMERIC_COLS)) * 8 > DENSE_REPORT_LIMIT:
+                entry['matrix_bytes'] = rows * (n_ohe + len(NUMERIC_COLS)) * 8
+                entry['skipped'] = 'dense matrix over the report memory limit'
+                report.append(entry)
+                logger.info(f"vocab={vocab} dense: would need {entry['matrix_bytes'] / 1e6:.0f} MB, skipped")
+                continue
+            start = time.perf_counter()
+            if encoding == 'dense':
+                from train_model import encode_features
+                X, _, _, y, _, _ = encode_features(df, targets)
+            else:
+                X, _, _, y, _, _ = encode_features_sparse(df, targets, hash_features if encoding == 'hashed' else None)
+            entry['encode_seconds'] = time.perf_counter() - start
+            entry['matrix_bytes'] = matrix_nbytes(X)
+            entry['columns'] = X.shape[1]
+            start = time.perf_counter()
+            XGBClassifier(n_estimators=train_rounds, max_depth=5, tree_method='hist').fit(X, y)
+            entry['fit_seconds'] = time.perf_counter() - start
+            report.append(entry)
+            logger.info(f"vocab={vocab} {encoding}: {entry['columns']} columns, {entry['matrix_bytes'] / 1e6:.1f} MB, "
+                        f"encode {entry['encode_seconds']:.2f}s, fit ({train_rounds} rounds) {entry['fit_seconds']:.2f}s")
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare dense, sparse and hashed feature encodings.')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--vocab', type=int, nargs='+', default=[10, 1000, 100000], help='Page vocabulary sizes')
+    parser.add_argument('--hash-features', type=int, default=DEFAULT_HASH_FEATURES)
+    parser.add_argument('--rounds', type=int, default=10, help='XGBoost rounds fitted per encoding')
+    args = parser.parse_args(argv)
+    encoding_report(args.rows, args.vocab, args.hash_features, args.rounds)
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()
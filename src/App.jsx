@@ -1,6 +1,6 @@
 import { useEffect } from 'react';
 import { BrowserRouter, Routes, Route, useLocation } from 'react-router-dom';
-import { predictAssets } from './utils/predictAssets';
+import { predictAssets, predictLookaheadAssets } from './utils/predictAssets';
 import ConsentPopup from './components/ConsentPopup.jsx';
 import DownloadLogs from './components/DownloadLogs.jsx';
 import Home from './pages/Home';
@@ -18,6 +18,24 @@ const routes = [
   { path: '/predictpulse/exit', component: () => <h1>Thank you. Close this tab.</h1>, name: 'Exit' },
 ];
 
+// Pages two or three navigations ahead are only warmed when the browser is idle and the
+// connection has bandwidth to spare; rel=prefetch fetches at the lowest priority.
+function scheduleLookaheadPrefetch(currentPage, preloadedUrls) {
+  const connection = navigator.connection;
+  if (connection && (connection.saveData || /2g/.test(connection.effectiveType || ''))) return;
+  const idle = window.requestIdleCallback || (callback => setTimeout(callback, 2000));
+  idle(() => {
+    predictLookaheadAssets(currentPage, preloadedUrls).forEach(asset => {
+      const link = document.createElement('link');
+      link.rel = 'prefetch';
+      link.href = asset.url;
+      link.as = asset.as;
+      link.onerror = () => console.warn(`Prefetch failed for ${asset.url}`);
+      document.head.appendChild(link);
+    });
+  });
+}
+
 function PreloadManager() {
   const location = useLocation();
   const currentRoute = routes.find(r => r.path === location.pathname) || routes[0];
@@ -34,6 +52,7 @@ function PreloadManager() {
         link.onerror = () => console.warn(`Preload failed for ${asset.url}`);
         document.head.appendChild(link);
       });
+      scheduleLookaheadPrefetch(currentRoute.name, assets.map(asset => asset.url));
     } catch (error) {
       console.error('Preload error:', error);
     }
@@ -1,5 +1,11 @@
 import {predictNextPage} from './predictNextPage';
 import assetMap from '../../public/asset_map.json';
+import assetBundles from '../../public/asset_bundles.json';
+import lookahead from '../../public/transition_lookahead.json';
+import preloadPlan from '../../public/preload_plan.json';
+
+const MAX_PRELOADS = 6;
+const MAX_LOOKAHEAD_PREFETCHES = 6;
 
 export function predictAssets(currentPage) {
   // Use window to persist state across calls
@@ -10,13 +16,6 @@ export function predictAssets(currentPage) {
   window.__predictAssetsRun = true;
   console.info('[predictAssets] Running for', currentPage);
 
-  // Extract hashes from DOM
-  const jsScript = document.querySelector('script[src*="/assets/index-"]');
-  const jsHash = jsScript ? jsScript.src.match(/index-(.+)\.js/)[1] : 'placeholder-js';
-  const cssLink = document.querySelector('link[href*="/assets/index-"]');
-  const cssHash = cssLink ? cssLink.href.match(/index-(.+)\.css/)[1] : 'placeholder-css';
-  const assetHashes = {js: jsHash, css: cssHash};
-
   // Parse device and browser from user agent, converting to lowercase
   const userAgent = navigator.userAgent || '';
   let device = 'unknown';
@@ -47,17 +46,90 @@ export function predictAssets(currentPage) {
     loadTime: performance.getEntriesByType('navigation')[0]?.duration || 100
   });
 
-  const assets = assetMap[nextPage] || [];
+  // The byte-budgeted plan from `python preload_planner.py` covers every likely next page at once;
+  // the single predicted page's assets remain the fallback for pages the planner never saw
+  const planned = plannedAssets(currentPage.toLowerCase());
+  const filteredAssets = planned
+    ? resolveAssets(planned, new Set(), preloadPlan.requestBudget)
+    : resolveAssets(pageAssets(nextPage), new Set(), MAX_PRELOADS);
+
+  console.info(`[predictAssets] Predicted for ${currentPage}, next: ${nextPage}, assets:`, filteredAssets);
+  return filteredAssets;
+}
+
+// Assets for pages two or more navigations ahead, most likely first, from the k-step transition
+// table built by `python transition_matrix.py`. Meant for idle-time prefetching; `skipUrls` are
+// the assets already preloaded for the predicted next page.
+export function predictLookaheadAssets(currentPage, skipUrls = []) {
+  if (window.__predictLookaheadRun) return [];
+  window.__predictLookaheadRun = true;
+
+  const page = currentPage.toLowerCase();
+  const steps = lookahead.steps[page] || [];
+  const pages = steps
+    .slice(1)
+    .flat()
+    .filter(([next, prob]) => next !== page && prob >= lookahead.min_prob)
+    .sort((a, b) => b[1] - a[1])
+    .map(([page]) => page)
+    .filter((page, i, all) => all.indexOf(page) === i);
+  const assets = resolveAssets(pages.flatMap(pageAssets), new Set(skipUrls), MAX_LOOKAHEAD_PREFETCHES);
+  console.info(`[predictAssets] Lookahead for ${currentPage}: pages`, pages, 'assets:', assets);
+  return assets;
+}
+
+// Plan for this visit's context (page|prev_page|device|browser), else the page's plan, else null
+function plannedAssets(page) {
+  const path = JSON.parse(sessionStorage.getItem('navPath') || '[]').map(p => p.toLowerCase());
+  if (path[path.length - 1] === page) path.pop();
+  const prevPage = path.length ? path[path.length - 1] : 'none';
+  const {device, browser} = loggedUserAgent(navigator.userAgent || '');
+  const urls = preloadPlan.plans[[page, prevPage, device, browser].join('|')] || preloadPlan.fallback[page];
+  return urls ? urls.map(url => ({url, type: preloadPlan.types[url]})) : null;
+}
+
+// Device and browser the way useUserLogger records them, so they match the planner's context keys
+function loggedUserAgent(userAgent) {
+  const ua = userAgent.toLowerCase();
+  let browser = 'unknown';
+  if (ua.includes('chrome')) browser = 'chrome';
+  else if (ua.includes('firefox')) browser = 'firefox';
+  else if (ua.includes('safari') && ua.includes('mobile')) browser = 'mobile safari';
+  else if (ua.includes('safari')) browser = 'safari';
+  else if (ua.includes('edge')) browser = 'edge';
+  let device = 'other';
+  if (ua.includes('mobile')) device = 'iphone';
+  else if (ua.includes('macintosh')) device = 'mac';
+  return {device, browser};
+}
+
+// Mined core sets list the most often cache-missed assets first; fall back to the latest visit's list
+function pageAssets(page) {
+  return assetBundles.pages[page] || assetMap[page] || [];
+}
+
+function currentAssetHashes() {
+  // Extract hashes from DOM
+  const jsScript = document.querySelector('script[src*="/assets/index-"]');
+  const jsHash = jsScript ? jsScript.src.match(/index-(.+)\.js/)[1] : 'placeholder-js';
+  const cssLink = document.querySelector('link[href*="/assets/index-"]');
+  const cssHash = cssLink ? cssLink.href.match(/index-(.+)\.css/)[1] : 'placeholder-css';
+  return {js: jsHash, css: cssHash};
+}
+
+function resolveAssets(assets, skipUrls, limit) {
+  const assetHashes = currentAssetHashes();
   const loadedAssets = new Set([
     `/predictpulse/assets/index-${assetHashes.js}.js`,
     `/predictpulse/assets/index-${assetHashes.css}.css`,
     '/predictpulse/assets/utils.js',
     '/predictpulse/assets/fonts.css',
     '/predictpulse/assets/font.woff2',
-    `/predictpulse/assets/page1.jpg`
+    `/predictpulse/assets/page1.jpg`,
+    ...skipUrls
   ]);
   const seenUrls = new Set();
-  const filteredAssets = assets
+  return assets
     .reduce((acc, asset) => {
       let url = asset.url;
       if (url.includes('index-.*.js') || url.includes('placeholder-js')) {
@@ -72,10 +144,7 @@ export function predictAssets(currentPage) {
       acc.push({...asset, url, as: getAsValue(asset.type)});
       return acc;
     }, [])
-    .slice(0, 6);
-
-  console.info(`[predictAssets] Predicted for ${currentPage}, next: ${nextPage}, assets:`, filteredAssets);
-  return filteredAssets;
+    .slice(0, limit);
 }
 
 function getAsValue(type) {
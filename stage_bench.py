@@ -0,0 +1,249 @@
+# stage_bench.py
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from instrumentation import RssSampler
+
+logger = logging.getLogger(__name__)
+
+STAGES = ['load', 'extract_features', 'encoding', 'training', 'export_decision_tree', 'evaluation',
+          'generate_asset_map']
+DEFAULT_SIZES = [10_000, 100_000]
+DEFAULT_DATA_DIR = '.bench_data'
+DEFAULT_HISTORY = 'stage_bench_history.jsonl'
+DEFAULT_TOLERANCE = 0.25
+# Slowdowns smaller than this are timer and scheduler noise, whatever the ratio
+DEFAULT_MIN_SECONDS = 0.1
+SAMPLE_INTERVAL = 0.005
+QUIET_LOGGERS = ['train_model', 'evaluate', 'generate_asset_map', 'feature_cache', 'sparse_features']
+
+def train_models(X, y):
+    """The XGBoost and exported decision-tree fits of ``train_model.main``, without cross-validation."""
+    from collections import Counter
+
+    import numpy as np
+    from sklearn.tree import DecisionTreeClassifier
+    from xgboost import XGBClassifier
+
+    from train_model import XGB_PARAMS, class_weights
+
+    weights = class_weights(Counter(y))
+    sample_weights = np.array([weights[label] for label in y])
+    clf_xgb = XGBClassifier(**XGB_PARAMS)
+    clf_xgb.fit(X, y, sample_weight=sample_weights)
+    clf_dt = DecisionTreeClassifier(random_state=42, max_depth=5, min_samples_split=10, min_samples_leaf=5,
+                                    criterion='gini')
+    clf_dt.fit(X, y, sample_weight=sample_weights)
+    return clf_xgb, clf_dt
+
+def evaluate_model(data, clf, ohe, scaler, feature_names, transition_freq, page_encoder):
+    """The ``evaluate.py --batch`` path: vocabulary filter, timestamp sort, columns, one predict_proba."""
+    import pandas as pd
+
+    from evaluate import evaluate_batch, extract_prediction_columns, filter_data_by_model_vocabulary
+
+    page_map = {page: idx for idx, page in enumerate(page_encoder.classes_)}
+    if hasattr(data, 'prediction_columns'):
+        columns = data.prediction_columns(page_map)
+    else:
+        valid_data = filter_data_by_model_vocabulary(data, page_map)
+        valid_data.sort(key=lambda x: pd.to_datetime(x['timestamp']))
+        columns = extract_prediction_columns(valid_data, data)
+    return evaluate_batch(columns, clf, ohe, scaler, feature_names, transition_freq, page_encoder, page_map)
+
+def run_stages(data_path, workdir, max_train_rows=None, records='table'):
+    """Run every pipeline stage once on ``data_path``; wall and CPU time and RSS per stage.
+
+    ``records`` holds the log as a ``VisitTable`` ('table', as the pipeline does) or as the
+    list of dicts the stages used before ('dicts').
+    """
+    # Heavy libraries are imported before the timers start, so the first stage using each is not charged for it
+    import pandas  # noqa: F401
+    import sklearn.preprocessing  # noqa: F401
+    import sklearn.tree  # noqa: F401
+    import xgboost  # noqa: F401
+
+    import evaluate  # noqa: F401
+    from generate_asset_map import generate_asset_map
+    from train_model import (encode_features, export_decision_tree, extract_feature_table, load_and_validate_data,
+                             load_visit_table)
+
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+    results = {}
+
+    def timed(stage, fn, rows):
+        cpu = time.process_time()
+        start = time.perf_counter()
+        with RssSampler(SAMPLE_INTERVAL) as rss:
+            value = fn()
+        seconds = time.perf_counter() - start
+        results[stage] = {
+            'seconds': round(seconds, 4), 'cpu_seconds': round(time.process_time() - cpu, 4), 'rows': rows,
+            'rows_per_sec': round(rows / seconds) if rows and seconds > 0 else None,
+            'rss_start_mb': round(rss.start, 1), 'rss_peak_mb': round(rss.peak, 1), 'rss_end_mb': round(rss.end, 1),
+            'rss_growth_mb': round(rss.peak - rss.start, 1),
+        }
+        return value
+
+    load = load_visit_table if records == 'table' else load_and_validate_data
+    data = timed('load', lambda: load(data_path), None)
+    rows = len(data)
+    results['load']['rows'] = rows
+    results['load']['rows_per_sec'] = round(rows / results['load']['seconds'])
+    extract = data.feature_table if records == 'table' else lambda: extract_feature_table(data)
+    df, next_pages, transition_freq = timed('extract_features', extract, rows)
+    X, ohe, page_encoder, y, scaler, feature_names = timed('encoding', lambda: encode_features(df, next_pages),
+                                                           len(df))
+    train_rows = min(len(y), max_train_rows or len(y))
+    clf_xgb, clf_dt = timed('training', lambda: train_models(X[:train_rows], y[:train_rows]), train_rows)
+    timed('export_decision_tree', lambda: export_decision_tree(clf_dt, feature_names, page_encoder, scaler, ohe,
+                                                               transition_freq,
+                                                               os.path.join(workdir, 'predictNextPage.js')), None)
+    timed('evaluation', lambda: evaluate_model(data, clf_xgb, ohe, scaler, feature_names, transition_freq,
+                                               page_encoder), rows)
+    timed('generate_asset_map', lambda: generate_asset_map(data, os.path.join(workdir, 'asset_map.json')), rows)
+    return results
+
+def ensure_data(size, data_dir, seed):
+    """Generated log of ``size`` visits, reused across runs with the same size and seed."""
+    from synthetic_logs import write_visits
+
+    path = os.path.join(data_dir, f"visits-{size}-seed{seed}.ndjson")
+    if not os.path.exists(path):
+        start = time.perf_counter()
+        tmp_path = f"{path}.tmp"
+        write_visits(tmp_path, size, seed=seed)
+        os.replace(tmp_path, path)
+        logger.info(f"Generated {size} visits into {path} in {time.perf_counter() - start:.1f}s")
+    return path
+
+def run_size(size, args):
+    """Run the stages for one size in a fresh interpreter, so earlier sizes do not skew its memory."""
+    data_path = ensure_data(size, args.data_dir, args.seed)
+    command = [sys.executable, os.path.abspath(__file__), '--child', data_path, '--records', args.records]
+    if args.max_train_rows:
+        command += ['--max-train-rows', str(args.max_train_rows)]
+    proc = subprocess.run(command, capture_output=True, text=True)
+    if proc.returncode != 0:
+        logger.error(f"Stage run on {size} visits failed:\n{proc.stderr.strip()[-2000:]}")
+        sys.exit(1)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def environment():
+    root = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    versions = {}
+    for module in ('numpy', 'pandas', 'sklearn', 'xgboost'):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+    return {'git_commit': commit, 'python': sys.version.split()[0], 'platform': platform.platform(),
+            'cpu_count': os.cpu_count(), 'versions': versions}
+
+def load_history(path):
+    try:
+        with open(path, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+def compare_runs(current, baseline, tolerance=DEFAULT_TOLERANCE, min_seconds=DEFAULT_MIN_SECONDS):
+    """Stages slower, or growing RSS more, than ``baseline`` by over ``tolerance``; logs every ratio."""
+    regressions = []
+    for size, stages in current['results'].items():
+        for stage, now in stages.items():
+            before = baseline['results'].get(size, {}).get(stage)
+            if not before:
+                continue
+            time_ratio = now['seconds'] / before['seconds'] if before['seconds'] else float('inf')
+            memory_ratio = (now['rss_growth_mb'] + 1) / (before['rss_growth_mb'] + 1)
+            flags = []
+            if now['seconds'] - before['seconds'] >= min_seconds and time_ratio > 1 + tolerance:
+                flags.append('time')
+            if now['rss_growth_mb'] >= 10 and memory_ratio > 1 + tolerance:
+                flags.append('memory')
+            logger.info(f"{size:>9} {stage:<21} {before['seconds']:8.3f}s -> {now['seconds']:8.3f}s "
+                        f"(x{time_ratio:.2f}), +{before['rss_growth_mb']:.0f} -> +{now['rss_growth_mb']:.0f} MB"
+                        f"{'  REGRESSION (' + ', '.join(flags) + ')' if flags else ''}")
+            if flags:
+                regressions.append({'size': size, 'stage': stage, 'kinds': flags, 'time_ratio': round(time_ratio, 3),
+                                    'memory_ratio': round(memory_ratio, 3)})
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time and memory-profile each pipeline stage at several data sizes.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Visits per generated log')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='Generated logs, reused between runs')
+    parser.add_argument('--max-train-rows', type=int,
+                        help='Train on at most this many rows, to bound the training stage on large sizes')
+    parser.add_argument('--records', choices=['table', 'dicts'], default='table',
+                        help='Hold the log as an interned VisitTable, or as the list of dicts used before it')
+    parser.add_argument('--history', default=DEFAULT_HISTORY, help='Runs are appended here, one JSON per line')
+    parser.add_argument('--label', help='Free-form note stored with the run')
+    parser.add_argument('--compare', nargs='?', const='previous', metavar='RUN_ID',
+                        help='Compare with a stored run (default: the previous one); exits 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Allowed slowdown or RSS growth before a stage counts as a regression')
+    parser.add_argument('--min-seconds', type=float, default=DEFAULT_MIN_SECONDS,
+                        help='Ignore slowdowns smaller than this many seconds')
+    parser.add_argument('--child', metavar='DATA', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        with tempfile.TemporaryDirectory() as workdir:
+            print(json.dumps(run_stages(args.child, workdir, args.max_train_rows, args.records)))
+        return
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    history = load_history(args.history)
+    run = dict(environment(), run_id=datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ'),
+               label=args.label, seed=args.seed, records=args.records, max_train_rows=args.max_train_rows,
+               results={})
+    for size in args.sizes:
+        stages = run_size(size, args)
+        run['results'][str(size)] = stages
+        for stage in STAGES:
+            s = stages[stage]
+            throughput = f", {s['rows_per_sec']} rows/sec" if s['rows_per_sec'] else ''
+            logger.info(f"{size} visits, {stage}: {s['seconds']:.3f}s (CPU {s['cpu_seconds']:.3f}s{throughput}), "
+                        f"RSS {s['rss_start_mb']:.0f} -> peak {s['rss_peak_mb']:.0f} MB")
+    with open(args.history, 'a') as f:
+        f.write(json.dumps(run) + '\n')
+    logger.info(f"Run {run['run_id']} appended to {args.history}")
+
+    if args.compare:
+        baselines = [r for r in history if args.compare in ('previous', r['run_id'])]
+        if not baselines:
+            logger.error(f"No stored run {args.compare!r} in {args.history} to compare with")
+            sys.exit(1)
+        baseline = baselines[-1]
+        logger.info(f"Comparing with run {baseline['run_id']} (commit {baseline.get('git_commit')})")
+        regressions = compare_runs(run, baseline, args.tolerance, args.min_seconds)
+        if regressions:
+            logger.error(f"{len(regressions)} stage regressions over {args.tolerance:.0%}: "
+                         + ', '.join(f"{r['stage']}@{r['size']} ({'/'.join(r['kinds'])})" for r in regressions))
+            sys.exit(1)
+        logger.info("No stage regressions")
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()
@@ -0,0 +1,344 @@
+# synthetic_logs.py
+import argparse
+import gzip
+import heapq
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from log_stream import peak_rss_mb
+
+logger = logging.getLogger(__name__)
+
+SITE_PAGES = ['Home', 'About', 'Contact', 'ProductList', 'ProductDetails']
+# Links of the mock site (scripts/generate_mockdata.js); generated extra pages link to popular pages
+SITE_LINKS = {
+    'Home': ['ProductList', 'About', 'Contact'],
+    'About': ['Contact', 'Home', 'ProductList'],
+    'Contact': ['Home', 'About', 'ProductList'],
+    'ProductList': ['ProductDetails', 'Home', 'About'],
+    'ProductDetails': ['About', 'Home', 'Contact'],
+}
+SHELL_ASSETS = [
+    ('/predictpulse/assets/fonts.css', 'style'),
+    ('/predictpulse/assets/utils.js', 'script'),
+    ('/predictpulse/assets/font.woff2', 'font'),
+    ('/predictpulse/assets/index-.*.js', 'script'),
+    ('/predictpulse/assets/index-.*.css', 'style'),
+]
+# (browser, device, user-agent template); the version fields vary, so the pool has many distinct strings
+UA_TEMPLATES = [
+    ('Chrome', 'other', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                        'Chrome/{major}.0.{build}.{patch} Safari/537.36'),
+    ('Chrome', 'mac', 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) '
+                      'Chrome/{major}.0.{build}.{patch} Safari/537.36'),
+    ('Chrome', 'other', 'Mozilla/5.0 (Linux; Android {android}; Pixel {pixel}) AppleWebKit/537.36 '
+                        '(KHTML, like Gecko) Chrome/{major}.0.{build}.{patch} Mobile Safari/537.36'),
+    ('Firefox', 'other', 'Mozilla/5.0 (X11; Linux x86_64; rv:{major}.0) Gecko/20100101 Firefox/{major}.0'),
+    ('Firefox', 'other', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:{major}.0) Gecko/20100101 Firefox/{major}.0'),
+    ('Firefox', 'mac', 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:{major}.0) Gecko/20100101 Firefox/{major}.0'),
+    ('Safari', 'mac', 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+                      'Version/{safari}.{minor} Safari/605.1.15'),
+    ('Mobile Safari', 'iphone', 'Mozilla/5.0 (iPhone; CPU iPhone OS {ios}_{minor} like Mac OS X) '
+                                'AppleWebKit/605.1.15 (KHTML, like Gecko) Version/{ios}.{minor} Mobile/15E148 '
+                                'Safari/604.1'),
+]
+SCREEN_WIDTHS = {
+    'iphone': [375, 390, 393, 414, 430],
+    'mac': [1440, 1512, 1728, 1920, 2560],
+    'other': [360, 412, 768, 1366, 1536, 1920],
+}
+DEFAULT_START = '2025-05-10T23:00:00Z'
+DEFAULT_CHUNK_VISITS = 200_000
+
+def zipf_weights(n, exponent):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+def _choice(rng, cumulative, size):
+    """Vectorized draws from the distribution whose CDF is ``cumulative``."""
+    return np.minimum(np.searchsorted(cumulative, rng.random(size), side='right'), len(cumulative) - 1)
+
+def _uuid_strings(rng, n):
+    """``n`` random version-4 UUID strings from one block of random bytes."""
+    hex_digits = rng.bytes(16 * n).hex()
+    variant = '89ab'
+    return [f"{h[0:8]}-{h[8:12]}-4{h[13:16]}-{variant[int(h[16], 16) & 3]}{h[17:20]}-{h[20:32]}"
+            for h in (hex_digits[i:i + 32] for i in range(0, 32 * n, 32))]
+
+class SiteModel:
+    """Pages, their Zipf popularity, the Markov navigation matrix, user agents and asset catalogs."""
+
+    def __init__(self, rng, n_pages=len(SITE_PAGES), page_exponent=1.1, link_weight=0.8, ua_pool=2000,
+                 ua_exponent=1.2, extra_assets=20, extra_mean=2.0):
+        self.pages = SITE_PAGES[:n_pages] + [f"Page{i}" for i in range(len(SITE_PAGES) + 1, n_pages + 1)]
+        n = len(self.pages)
+        self.popularity = zipf_weights(n, page_exponent)
+        # Each page follows its links with probability link_weight (weighted by popularity), else jumps anywhere
+        links = np.zeros((n, n))
+        for i, page in enumerate(self.pages):
+            targets = SITE_LINKS.get(page) or [self.pages[j] for j in _choice(rng, np.cumsum(self.popularity), 3)]
+            for target in targets:
+                if target in self.pages and target != page:
+                    links[i, self.pages.index(target)] = self.popularity[self.pages.index(target)]
+        row_sums = links.sum(axis=1, keepdims=True)
+        links = np.divide(links, row_sums, out=np.zeros_like(links), where=row_sums > 0)
+        jump = np.tile(self.popularity, (n, 1))
+        np.fill_diagonal(jump, 0.0)
+        jump /= jump.sum(axis=1, keepdims=True)
+        has_links = row_sums > 0
+        self.transitions = np.where(has_links, link_weight * links + (1 - link_weight) * jump, jump)
+        self.transition_cdf = np.cumsum(self.transitions, axis=1)
+        self.entry_cdf = np.cumsum(self.popularity)
+
+        # User agents: template, then version numbers, both drawn so a few strings dominate
+        self.ua_strings, self.ua_browser, self.ua_device = [], [], []
+        seen = set()
+        for _ in range(20 * ua_pool):
+            if len(self.ua_strings) >= ua_pool:
+                break
+            browser, device, template = UA_TEMPLATES[int(rng.integers(len(UA_TEMPLATES)))]
+            fields = {'major': 120 + int(rng.integers(12)), 'build': 6000 + int(rng.integers(800)),
+                      'patch': int(rng.integers(200)), 'android': 10 + int(rng.integers(5)),
+                      'pixel': 5 + int(rng.integers(5)), 'safari': 15 + int(rng.integers(4)),
+                      'ios': 15 + int(rng.integers(4)), 'minor': int(rng.integers(7))}
+            ua = template.format(**fields)
+            if ua in seen:
+                continue
+            seen.add(ua)
+            self.ua_strings.append(ua)
+            self.ua_browser.append(browser)
+            self.ua_device.append(device)
+        self.ua_cdf = np.cumsum(zipf_weights(len(self.ua_strings), ua_exponent))
+
+        # Per page: its hero image plus a catalog of extra assets requested a Poisson number of times
+        self.extra_assets = extra_assets
+        self.extra_mean = rng.gamma(2.0, extra_mean / 2.0, n) if extra_assets else np.zeros(n)
+        self.extra_cdf = np.cumsum(zipf_weights(max(extra_assets, 1), 1.0))
+
+    def asset_prefixes(self):
+        """JSON fragments up to ``"fromCache":`` for the shell, hero and catalog assets of every page."""
+        def prefix(url, kind):
+            return f'{{"url":{json.dumps(url)},"type":"{kind}","fromCache":'
+        shell = [prefix(url, kind) for url, kind in SHELL_ASSETS]
+        hero = [prefix(f"/predictpulse/assets/page{i + 1}.jpg", 'img') for i in range(len(self.pages))]
+        extras = [[prefix(f"/predictpulse/assets/{page.lower()}/item{j}.{'jpg' if j % 3 else 'js'}",
+                          'img' if j % 3 else 'script') for j in range(self.extra_assets)] for page in self.pages]
+        return shell, hero, extras
+
+class SessionGenerator:
+    """Vectorized generator of visit records in the ``predictpulse_mockdata.json`` schema.
+
+    Visits are produced in chunks of whole sessions. Session lengths are geometric, entry pages
+    follow Zipf popularity and every next page is a draw from the Markov matrix of the current
+    page; all of it is done per navigation step across every session of the chunk at once.
+    Each session keeps one user agent, drawn from a Zipf-skewed pool. Records are emitted in
+    timestamp order across the whole log.
+    """
+
+    def __init__(self, seed=0, mean_session_length=4.0, max_session_length=50, visits_per_second=5.0,
+                 start=DEFAULT_START, chunk_visits=DEFAULT_CHUNK_VISITS, **site_params):
+        self.rng = np.random.default_rng(seed)
+        self.site = SiteModel(self.rng, **site_params)
+        self.mean_session_length = mean_session_length
+        self.max_session_length = max_session_length
+        self.visits_per_second = visits_per_second
+        self.clock_ms = int(datetime.fromisoformat(start.replace('Z', '+00:00')).timestamp() * 1000)
+        self.chunk_visits = chunk_visits
+        shell, hero, self.extras = self.site.asset_prefixes()
+        # The hero image and shell assets of a visit as one string per page and cache pattern
+        self.fixed_assets = [[','.join(prefix + ('true}' if mask >> bit & 1 else 'false}')
+                                       for bit, prefix in enumerate([hero_prefix] + shell))
+                              for mask in range(1 << (len(shell) + 1))] for hero_prefix in hero]
+        self.page_json = [json.dumps(page) for page in self.site.pages]
+        self.ua_json = [json.dumps(ua) for ua in self.site.ua_strings]
+
+    def _chunk(self, target):
+        rng, site = self.rng, self.site
+        n_sessions = max(1, int(target / self.mean_session_length))
+        lengths = np.minimum(rng.geometric(1.0 / self.mean_session_length, n_sessions), self.max_session_length)
+        width = int(lengths.max())
+        pages = np.zeros((n_sessions, width), dtype=np.int32)
+        pages[:, 0] = _choice(rng, site.entry_cdf, n_sessions)
+        for step in range(1, width):
+            active = np.flatnonzero(lengths > step)
+            current = pages[active, step - 1]
+            draws = rng.random(len(active))
+            pages[active, step] = np.minimum((draws[:, None] > site.transition_cdf[current]).sum(axis=1),
+                                             len(site.pages) - 1)
+
+        session, position = np.nonzero(np.arange(width) < lengths[:, None])
+        page = pages[session, position]
+        n = len(page)
+        span_ms = n / self.visits_per_second * 1000
+        session_start = self.clock_ms + rng.random(n_sessions) * span_ms
+        # Think time between visits: log-normal with a 20 s median
+        gaps = np.where(position > 0, rng.lognormal(np.log(20_000), 1.0, n), 0.0)
+        offsets = np.cumsum(gaps)
+        first = np.flatnonzero(position == 0)
+        offsets -= np.repeat(offsets[first], lengths)
+        timestamps = (session_start[session] + offsets).astype(np.int64)
+        self.clock_ms += int(span_ms)
+
+        ua = _choice(rng, site.ua_cdf, n_sessions)
+        device = np.array(site.ua_device)[ua]
+        widths = np.empty(n_sessions, dtype=np.int64)
+        for name, choices in SCREEN_WIDTHS.items():
+            mask = device == name
+            widths[mask] = rng.choice(choices, mask.sum())
+
+        # Shell assets are mostly cached after the first visit of a session; extras rarely are
+        returning = position > 0
+        shell_cached = rng.random((n, len(SHELL_ASSETS))) < np.where(returning, 0.9, 0.3)[:, None]
+        hero_cached = rng.random(n) < np.where(returning, 0.5, 0.1)
+        extra_counts = rng.poisson(site.extra_mean[page]) if site.extra_assets else np.zeros(n, dtype=np.int64)
+        extra_items = _choice(rng, site.extra_cdf, int(extra_counts.sum()))
+        extra_cached = rng.random(len(extra_items)) < 0.4
+        extra_misses = np.bincount(np.repeat(np.arange(n), extra_counts), weights=~extra_cached, minlength=n)
+        misses = (~shell_cached).sum(axis=1) + ~hero_cached + extra_misses
+        base = np.where(device[session] == 'iphone', np.log(180.0), np.log(110.0))
+        load_times = np.exp(rng.normal(base, 0.35)) + 35.0 * misses
+
+        return {
+            'session': session, 'position': position, 'page': page, 'timestamps': timestamps,
+            'session_ids': _uuid_strings(rng, n_sessions), 'visit_ids': _uuid_strings(rng, n),
+            'ua': ua, 'widths': widths,
+            'cache_mask': hero_cached + (shell_cached << np.arange(1, len(SHELL_ASSETS) + 1)).sum(axis=1),
+            'extra_counts': extra_counts, 'extra_items': extra_items, 'extra_cached': extra_cached,
+            'load_times': load_times, 'lengths': lengths,
+        }
+
+    def iter_lines(self, visits):
+        """Yield ``visits`` NDJSON lines (without newlines) in timestamp order."""
+        for _, line in itertools.islice(self._ordered_lines(visits), visits):
+            yield line
+
+    def _ordered_lines(self, visits):
+        """``(timestamp ms, line)`` pairs in timestamp order, from chunks totalling at least ``visits``.
+
+        Sessions that start late in a chunk run on past its end and overlap the next chunk, whose
+        sessions all start at or after the advanced clock. Visits before that clock are final;
+        later ones are held back and merged with the next chunk's.
+        """
+        held = []
+        generated = 0
+        while generated < visits:
+            chunk = self._chunk(min(self.chunk_visits, visits - generated))
+            generated += len(chunk['page'])
+            merged = heapq.merge(held, self._chunk_lines(chunk), key=lambda item: item[0])
+            held = []
+            for item in merged:
+                if item[0] < self.clock_ms:
+                    yield item
+                else:
+                    held.append(item)
+        yield from held
+
+    def _chunk_lines(self, chunk):
+        """``(timestamp ms, line)`` for every visit of ``chunk``, in timestamp order."""
+        site = self.site
+        n = len(chunk['page'])
+        # navPath of every visit, built incrementally per session (rows are session-major)
+        page = chunk['page'].tolist()
+        position = chunk['position'].tolist()
+        nav_paths = [None] * n
+        for i in range(n):
+            nav_paths[i] = self.page_json[page[i]] if position[i] == 0 else \
+                f"{nav_paths[i - 1]},{self.page_json[page[i]]}"
+        extra_start = np.r_[0, np.cumsum(chunk['extra_counts'])].tolist()
+        extra_items = chunk['extra_items'].tolist()
+        extra_cached = chunk['extra_cached'].tolist()
+        cache_mask = chunk['cache_mask'].tolist()
+        stamps = np.datetime_as_string(chunk['timestamps'].astype('datetime64[ms]'), unit='ms').tolist()
+        session = chunk['session'].tolist()
+        session_ids = chunk['session_ids']
+        visit_ids = chunk['visit_ids']
+        ua = chunk['ua'].tolist()
+        widths = chunk['widths'].tolist()
+        load_times = chunk['load_times'].tolist()
+        timestamps = chunk['timestamps'].tolist()
+        order = np.argsort(chunk['timestamps'], kind='stable').tolist()
+        for i in order:
+            s = session[i]
+            p = page[i]
+            assets = self.fixed_assets[p][cache_mask[i]]
+            if extra_start[i] != extra_start[i + 1]:
+                extras = self.extras[p]
+                assets += ',' + ','.join(extras[extra_items[j]] + ('true}' if extra_cached[j] else 'false}')
+                                         for j in range(extra_start[i], extra_start[i + 1]))
+            u = ua[s]
+            yield timestamps[i], (f'{{"visitId":"{session_ids[s]}-{visit_ids[i]}","page":{self.page_json[p]},'
+                                  f'"timestamp":"{stamps[i]}Z","userAgent":{self.ua_json[u]},'
+                                  f'"navPath":[{nav_paths[i]}],"assets":[{assets}],"screenWidth":{widths[s]},'
+                                  f'"loadTime":{load_times[i]!r},"browser":"{site.ua_browser[u]}",'
+                                  f'"device":"{site.ua_device[u]}"}}')
+
+def write_visits(path, visits, fmt='ndjson', **params):
+    """Stream ``visits`` generated records to ``path`` (``.gz`` compresses); returns the number written."""
+    generator = SessionGenerator(**params)
+    opener = (lambda: gzip.open(path, 'wt', encoding='utf-8', compresslevel=3)) if path.endswith('.gz') \
+        else (lambda: open(path, 'w', encoding='utf-8'))
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    written = 0
+    with opener() as f:
+        if fmt == 'array':
+            f.write('[\n')
+        for line in generator.iter_lines(visits):
+            if fmt == 'array':
+                f.write((',\n' if written else '') + line)
+            else:
+                f.write(line + '\n')
+            written += 1
+        if fmt == 'array':
+            f.write('\n]\n')
+    return written
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate synthetic PredictPulse visit logs at scale.')
+    parser.add_argument('--visits', type=int, default=1_000_000)
+    parser.add_argument('--output', default='synthetic_visits.ndjson',
+                        help='Output log; a .gz suffix compresses it')
+    parser.add_argument('--format', choices=['ndjson', 'array'], default='ndjson',
+                        help="NDJSON lines or one JSON array like predictpulse_mockdata.json")
+    parser.add_argument('--pages', type=int, default=len(SITE_PAGES),
+                        help='Pages on the site; beyond the five real ones, PageN pages are added')
+    parser.add_argument('--page-exponent', type=float, default=1.1, help='Zipf exponent of page popularity')
+    parser.add_argument('--session-length', type=float, default=4.0, help='Mean visits per session (geometric)')
+    parser.add_argument('--ua-pool', type=int, default=2000, help='Distinct user-agent strings')
+    parser.add_argument('--ua-exponent', type=float, default=1.2, help='Zipf exponent of user-agent popularity')
+    parser.add_argument('--extra-assets', type=int, default=20,
+                        help='Catalog size of extra assets per page (0 keeps the fixed six-asset template)')
+    parser.add_argument('--visits-per-second', type=float, default=5.0, help='Average traffic, sets timestamps')
+    parser.add_argument('--start', default=DEFAULT_START)
+    parser.add_argument('--chunk-visits', type=int, default=DEFAULT_CHUNK_VISITS,
+                        help='Visits generated per vectorized chunk (bounds memory)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.pages < 2:
+        logger.error("Need at least two pages")
+        sys.exit(1)
+    start = time.perf_counter()
+    written = write_visits(args.output, args.visits, args.format, seed=args.seed,
+                           mean_session_length=args.session_length, visits_per_second=args.visits_per_second,
+                           start=args.start, chunk_visits=args.chunk_visits, n_pages=args.pages,
+                           page_exponent=args.page_exponent, ua_pool=args.ua_pool, ua_exponent=args.ua_exponent,
+                           extra_assets=args.extra_assets)
+    elapsed = time.perf_counter() - start
+    size_mb = os.path.getsize(args.output) / (1024 * 1024)
+    logger.info(f"Wrote {written} visits to {args.output} ({size_mb:.1f} MB) in {elapsed:.1f}s "
+                f"({written / elapsed:.0f} visits/sec), peak RSS {peak_rss_mb():.1f} MB")
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()
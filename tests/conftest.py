@@ -0,0 +1,36 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture(scope='session')
+def visit_log(tmp_path_factory):
+    """A 2000-visit synthetic NDJSON log."""
+    from synthetic_logs import write_visits
+
+    path = str(tmp_path_factory.mktemp('logs') / 'visits.ndjson')
+    write_visits(path, 2000, seed=0)
+    return path
+
+@pytest.fixture(scope='session')
+def model_dir(tmp_path_factory, visit_log):
+    """A directory holding the joblib files and model bundle trained on ``visit_log``."""
+    import train_model
+
+    path = tmp_path_factory.mktemp('model')
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        train_model.main(['--data', visit_log, '--no-cache', '--run-report', str(path / 'train.json')])
+    finally:
+        os.chdir(cwd)
+    return path
+
+@pytest.fixture
+def in_model_dir(model_dir, monkeypatch):
+    monkeypatch.chdir(model_dir)
+    return model_dir
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+import cohort_eval
+from cohort_eval import (bootstrap, cohort_codes, evaluate_cohorts, grouped_metrics, poisson_weights,
+                         synthetic_predictions)
+from evaluate import compute_metrics
+
+N_CLASSES = 8
+
+
+@pytest.fixture(scope='module')
+def predictions():
+    return synthetic_predictions(4000, 12, N_CLASSES, seed=3)
+
+
+@pytest.mark.parametrize('dimension', ['device+browser', 'browser+screen_band+device'])
+def test_crossed_cohorts_match_compute_metrics(predictions, dimension):
+    columns, y_true, y_pred = predictions
+    codes, labels = cohort_codes(columns, dimension)
+    n, metrics = grouped_metrics(codes, len(labels), y_true, y_pred, N_CLASSES,
+                                 columns['next_cache_hit'].to_numpy(dtype=np.float64),
+                                 columns['next_load_time'].to_numpy(dtype=np.float64))
+
+    parts = dimension.split('+')
+    part_codes = [cohort_codes(columns, part) for part in parts]
+    seen = {tuple(labels_[c] for (_, labels_), c in zip(part_codes, row)) for row in zip(*(c for c, _ in part_codes))}
+    assert sorted(tuple(label.split('|')) for label in labels) == sorted(seen)
+    for g, label in enumerate(labels):
+        mask = np.ones(len(y_true), dtype=bool)
+        for (codes_, labels_), name in zip(part_codes, label.split('|')):
+            mask &= codes_ == labels_.index(name)
+        np.testing.assert_array_equal(codes == g, mask)
+        assert n[g] == mask.sum()
+        expected = compute_metrics(y_true[mask], y_pred[mask], N_CLASSES)
+        for metric in ('accuracy', 'precision', 'recall', 'f1_score'):
+            assert metrics[metric][g] == pytest.approx(expected[metric], abs=1e-12)
+        assert metrics['resource_efficiency'][g] == pytest.approx(columns['next_cache_hit'][mask].mean() * 100)
+        assert metrics['load_time_avg'][g] == pytest.approx(columns['next_load_time'][mask].mean())
+
+
+def _weighted_accuracy_and_f1(w, y_true, y_pred):
+    """One replicate's weighted accuracy and F1, counted directly from the row weights."""
+    support = np.bincount(y_true, weights=w, minlength=N_CLASSES)
+    predicted = np.bincount(y_pred, weights=w, minlength=N_CLASSES)
+    tp = np.bincount(y_true, weights=w * (y_true == y_pred), minlength=N_CLASSES)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        f1 = np.where(support + predicted > 0, 2 * tp / (support + predicted), 0.0)
+    return tp.sum() / w.sum(), (f1 * support).sum() / w.sum()
+
+
+def test_blockwise_bootstrap_matches_a_loop_over_replicates(predictions, monkeypatch):
+    columns, y_true, y_pred = predictions
+    replicates, seed = 40, [0, 1, 2]
+    # Small blocks, so the resample spans several weight blocks
+    monkeypatch.setattr(cohort_eval, 'BLOCK_CELLS', replicates * 256)
+    rows = np.flatnonzero(columns['device'].to_numpy() == 'mac')
+    cache_hit = columns['next_cache_hit'].to_numpy(dtype=np.float64)
+    load_time = columns['next_load_time'].to_numpy(dtype=np.float64)
+    resamples = bootstrap(rows, y_true, y_pred, N_CLASSES, cache_hit, load_time, replicates, seed)
+
+    rng = np.random.default_rng(seed)
+    weights = np.vstack([poisson_weights(rng, (len(rows[start:start + 256]), replicates))
+                         for start in range(0, len(rows), 256)]).astype(np.float64)
+    expected = np.array([_weighted_accuracy_and_f1(weights[:, r], y_true[rows], y_pred[rows])
+                         for r in range(replicates)])
+    np.testing.assert_allclose(resamples['accuracy'], expected[:, 0], rtol=1e-6)
+    np.testing.assert_allclose(resamples['f1_score'], expected[:, 1], rtol=1e-6)
+    np.testing.assert_allclose(resamples['load_time_avg'], weights.T @ load_time[rows] / weights.sum(axis=0),
+                               rtol=1e-5)
+    assert 0.9 < weights.mean() < 1.1 and 0.9 < weights.var() < 1.1
+
+
+def test_intervals_are_fixed_by_the_seed(predictions):
+    columns, y_true, y_pred = predictions
+    run = lambda workers, seed=0: evaluate_cohorts(columns, y_true, y_pred, N_CLASSES, ['device', 'entry_page'],
+                                                   replicates=100, workers=workers, seed=seed)['dimensions']
+    report = run(1)
+    assert report == run(2)
+    assert report != run(1, seed=1)
+    assert report['all']['cohorts'][0]['ci']['accuracy'] == [0.545924, 0.578505]
+    for result in report.values():
+        for cohort in result['cohorts']:
+            lo, hi = cohort['ci']['accuracy']
+            accuracy = cohort['accuracy']
+            assert lo <= accuracy <= hi
+            # Close to the normal-approximation width of a binomial proportion
+            normal = 2 * 1.96 * np.sqrt(accuracy * (1 - accuracy) / cohort['rows'])
+            assert 0.75 * normal < hi - lo < 1.25 * normal
@@ -0,0 +1,72 @@
+import math
+import random
+
+from drift_monitor import DriftMonitor, DriftSnapshot, SlidingWindow, WindowStats
+
+PAGES = ['Home', 'About', 'Contact']
+
+
+def _entry(rng):
+    return {'page': rng.choice(PAGES), 'device': rng.choice(['Mac', 'iPhone']),
+            'screenWidth': rng.choice([390, 1440, 1920]), 'loadTime': rng.randrange(50, 900),
+            'assets': [{'fromCache': rng.random() < 0.3}]}
+
+
+def _monitor(rng, **kwargs):
+    snapshot = DriftSnapshot.build([_entry(rng) for _ in range(500)])
+    options = dict(sliding_seconds=600, panes=6, tumbling_seconds=3600, psi_threshold=0.2,
+                   max_accuracy_drop=0.1, min_events=10, trigger_path=None)
+    options.update(kwargs)
+    return DriftMonitor(snapshot, len(PAGES), [1, 2], **options)
+
+
+def _event(monitor, rng):
+    prediction = rng.sample(range(len(PAGES)), 2) if rng.random() < 0.8 else None
+    return monitor.event(_entry(rng), prediction, rng.randrange(len(PAGES)))
+
+
+def test_sliding_total_matches_brute_force():
+    rng = random.Random(0)
+    monitor = _monitor(rng)
+    new_stats = lambda: WindowStats({name: monitor.snapshot.n_bins(name) for name in monitor.snapshot.features},
+                                    [1, 2])
+    window = SlidingWindow(600, 6, new_stats)
+    seen = []
+    ts = 0.0
+    for _ in range(3000):
+        # Mostly dense traffic, with the odd gap longer than a pane or the whole window
+        ts += rng.choice([rng.uniform(0, 5)] * 20 + [rng.uniform(100, 300), rng.uniform(600, 2000)])
+        event = _event(monitor, rng)
+        if window.add(ts, event):
+            expected = new_stats()
+            for pane_id, old in seen:
+                if window.pane_id - window.panes <= pane_id < window.pane_id:
+                    expected.add(old)
+            assert (window.total.summary(monitor.snapshot, len(PAGES))
+                    == expected.summary(monitor.snapshot, len(PAGES)))
+        seen.append((math.floor(ts / window.pane_width), event))
+
+
+def test_min_events_zero_waits_for_a_prediction():
+    rng = random.Random(1)
+    monitor = _monitor(rng, min_events=0, psi_threshold=-1)
+    monitor._check(0)
+    assert not monitor.triggers
+    monitor.sliding.total.add(_event(monitor, rng) | {'cell': None})
+    monitor._check(60)
+    assert not monitor.triggers
+
+
+def test_cooldown_covers_a_breach_that_comes_back():
+    rng = random.Random(2)
+    monitor = _monitor(rng, psi_threshold=-1, cooldown=1000)
+    for _ in range(50):
+        monitor.sliding.total.add(_event(monitor, rng))
+    monitor._check(0)
+    monitor.psi_threshold = float('inf')
+    monitor._check(100)
+    monitor.psi_threshold = -1
+    monitor._check(200)
+    assert len(monitor.triggers) == 1
+    monitor._check(1000)
+    assert len(monitor.triggers) == 2
@@ -0,0 +1,37 @@
+# tests/test_evaluate.py
+import numpy as np
+import pandas as pd
+
+import evaluate
+
+ROWS = 300
+
+def test_batch_path_matches_row_path(in_model_dir, visit_log):
+    clf, ohe, encoders, page_encoder, scaler, feature_names, transition_freq = evaluate.load_model_and_encoders()
+    page_map = {page: idx for idx, page in enumerate(encoders['page'])}
+    full_data = evaluate.load_and_validate_data(visit_log)
+    valid_data = evaluate.filter_data_by_model_vocabulary(full_data, page_map)
+    valid_data.sort(key=lambda x: pd.to_datetime(x['timestamp']))
+    valid_data = valid_data[:ROWS + 1]
+
+    row_matrix = np.vstack([
+        evaluate.prepare_features_for_prediction(evaluate.extract_features(valid_data[i], full_data, i, transition_freq),
+                                                 ohe, scaler, feature_names)
+        for i in range(ROWS)
+    ])
+    columns = evaluate.extract_prediction_columns(valid_data, full_data)
+    batch_matrix = evaluate.build_feature_matrix(columns, transition_freq, ohe, scaler, feature_names)
+
+    np.testing.assert_allclose(batch_matrix, row_matrix)
+    np.testing.assert_array_equal(clf.predict(batch_matrix), clf.predict(row_matrix))
+
+def test_compute_metrics_matches_sklearn():
+    from sklearn.metrics import f1_score, precision_score, recall_score
+
+    rng = np.random.default_rng(0)
+    y_true = rng.integers(0, 6, 500)
+    y_pred = np.where(rng.random(500) < 0.4, y_true, rng.integers(0, 6, 500))
+    metrics = evaluate.compute_metrics(y_true, y_pred, 6)
+    assert metrics['accuracy'] == np.mean(y_true == y_pred)
+    for name, score in [('precision', precision_score), ('recall', recall_score), ('f1_score', f1_score)]:
+        assert np.isclose(metrics[name], score(y_true, y_pred, average='weighted', zero_division=0))
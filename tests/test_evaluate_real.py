@@ -0,0 +1,29 @@
+import pandas as pd
+import pytest
+
+from evaluate_real import sort_by_timestamp
+
+SAME_OFFSET = ['2025-05-10T23:30:00Z', '2025-05-10T08:15:00.250Z', '2025-05-10T08:15:00.250Z', '2025-05-09T21:00:00Z']
+MIXED_OFFSETS = ['2025-05-10T23:30:00+02:00', '2025-05-10T22:00:00Z', '2025-05-10T01:45:00-05:00',
+                 '2025-05-10T21:30:00Z', '2025-05-10T06:00:00+09:30']
+COMPACT_OFFSETS = ['2025-05-10T23:30:00.5+0530', '2025-05-10T18:00:00Z', '2025-05-10T15:10:00-03:30']
+
+
+@pytest.mark.parametrize('timestamps', [SAME_OFFSET, MIXED_OFFSETS, COMPACT_OFFSETS])
+def test_sort_and_hours_match_per_entry_parsing(timestamps):
+    entries = [{'timestamp': ts, 'i': i} for i, ts in enumerate(timestamps)]
+    expected = sorted(entries, key=lambda x: pd.to_datetime(x['timestamp']))
+
+    ordered, hours = sort_by_timestamp(entries)
+    assert ordered == expected
+    assert hours == [pd.to_datetime(entry['timestamp']).hour for entry in expected]
+
+
+def test_mixed_offsets_keep_the_local_hour():
+    _, hours = sort_by_timestamp([{'timestamp': '2025-05-10T23:30:00+02:00'}, {'timestamp': '2025-05-10T22:00:00Z'}])
+    assert sorted(hours) == [22, 23]
+
+
+def test_malformed_timestamp_raises():
+    with pytest.raises(ValueError):
+        sort_by_timestamp([{'timestamp': '2025-05-10T23:30:00+02:00'}, {'timestamp': 'yesterday'}])
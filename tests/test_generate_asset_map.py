@@ -0,0 +1,90 @@
+import json
+import os
+
+import pytest
+
+from generate_asset_map import AssetMapState, update_asset_map, write_if_changed
+from log_stream import iter_records
+from log_store import LogWriter
+
+
+@pytest.fixture(scope='module')
+def visits(visit_log):
+    return list(iter_records(visit_log, []))
+
+
+def _expected(*batches):
+    state = AssetMapState()
+    for batch in batches:
+        state.merge(batch)
+    return state.asset_map()
+
+
+def _write_ndjson(path, records, mode='w'):
+    with open(path, mode) as f:
+        f.writelines(json.dumps(entry) + '\n' for entry in records)
+
+
+def _update(tmp_path, source):
+    state, output = str(tmp_path / 'state.json'), str(tmp_path / 'asset_map.json')
+    result = update_asset_map([str(source)], state, output)
+    with open(output) as f:
+        return result, json.load(f)
+
+
+def test_ndjson_resumes_after_append_and_skips_an_unchanged_file(visits, tmp_path):
+    log = tmp_path / 'visits.ndjson'
+    _write_ndjson(log, visits[:1200])
+    (new_records, _, written, _), asset_map = _update(tmp_path, log)
+    assert (new_records, written) == (1200, True)
+    assert asset_map == _expected(visits[:1200])
+
+    _write_ndjson(log, visits[1200:], mode='a')
+    (new_records, _, _, _), asset_map = _update(tmp_path, log)
+    assert new_records == len(visits) - 1200
+    assert asset_map == _expected(visits)
+
+    output = tmp_path / 'asset_map.json'
+    mtime = os.stat(output).st_mtime_ns
+    (new_records, updated, written, _), _ = _update(tmp_path, log)
+    assert (new_records, updated, written) == (0, 0, False)
+    assert os.stat(output).st_mtime_ns == mtime
+
+
+@pytest.mark.parametrize('name', ['visits.json', 'visits.ndjson'])
+def test_rewritten_source_is_read_from_the_start(visits, tmp_path, name):
+    log = tmp_path / name
+    write = (lambda records: log.write_text(json.dumps(records))) if name.endswith('.json') else \
+        (lambda records: _write_ndjson(log, records))
+    write(visits[:300])
+    _update(tmp_path, log)
+
+    # Larger than before, so only the changed first block shows it was rewritten
+    write(visits[300:1000])
+    (new_records, _, _, _), asset_map = _update(tmp_path, log)
+    assert new_records == 700
+    assert asset_map == _expected(visits[:300], visits[300:1000])
+
+
+def test_log_store_resumes_from_its_fingerprint(visits, tmp_path):
+    store = tmp_path / 'store'
+    with LogWriter(str(store), segment_records=500) as writer:
+        writer.append(visits[:800])
+    (new_records, _, _, _), _ = _update(tmp_path, store)
+    assert new_records == 800
+
+    (new_records, _, written, _), _ = _update(tmp_path, store)
+    assert (new_records, written) == (0, False)
+
+    with LogWriter(str(store), segment_records=500) as writer:
+        writer.append(visits[800:])
+    (new_records, _, _, _), asset_map = _update(tmp_path, store)
+    assert new_records == len(visits) - 800
+    assert asset_map == _expected(visits)
+
+
+def test_write_if_changed(tmp_path):
+    path = str(tmp_path / 'asset_map.json')
+    assert write_if_changed(path, {'Home': []})
+    assert not write_if_changed(path, {'Home': []})
+    assert write_if_changed(path, {'Home': [{'url': '/a.js', 'type': 'script'}]})
@@ -0,0 +1,31 @@
+import joblib
+from scipy import sparse
+
+import incremental_train
+from sparse_features import is_sparse_encoder
+
+
+def test_sparse_model_stays_sparse(visit_log, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open(visit_log) as f:
+        lines = f.readlines()
+    log = tmp_path / 'growing.ndjson'
+    log.write_text(''.join(lines[:1500]))
+    base = ['--data', str(log), '--no-cache']
+
+    incremental_train.main(base + ['--full', '--encoding', 'sparse'])
+    state = incremental_train.TrainingState.load(incremental_train.DEFAULT_STATE)
+    assert is_sparse_encoder(state.ohe)
+
+    with open(log, 'a') as f:
+        f.writelines(lines[1500:])
+    incremental_train.main(base)
+    state = incremental_train.TrainingState.load(incremental_train.DEFAULT_STATE)
+    assert state.updates_since_full == 1
+    assert is_sparse_encoder(state.ohe)
+    assert sparse.issparse(incremental_train.encode_rows(state.reservoir, state.ohe, state.scaler,
+                                                         state.feature_names))
+
+    # A retrain without --encoding keeps the state's encoding
+    incremental_train.main(base + ['--full'])
+    assert is_sparse_encoder(joblib.load('ohe_encoder.joblib'))
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from generate_asset_map import timestamp_key
+from log_store import LogReader, LogWriter, read_manifest
+from log_stream import iter_records
+from ngram_model import session_id
+
+
+@pytest.fixture(scope='module')
+def visits(visit_log):
+    return list(iter_records(visit_log, []))
+
+
+def test_round_trip_and_windowed_reads(visits, tmp_path):
+    store = str(tmp_path / 'store')
+    with LogWriter(store, segment_records=300, block_records=40) as writer:
+        for start in range(0, len(visits), 70):
+            writer.append(visits[start:start + 70])
+
+    reader = LogReader(store)
+    assert list(reader.iter_records()) == visits
+    assert list(iter_records(store, [])) == visits
+
+    times = sorted(timestamp_key(v['timestamp']) for v in visits)
+    lo, hi = times[len(times) // 3], times[len(times) // 2]
+    assert list(reader.iter_records(lo, hi)) == [v for v in visits if lo <= timestamp_key(v['timestamp']) < hi]
+    assert reader.last_read['blocks_read'] < len(visits) // 40
+
+    session = session_id(visits[len(visits) // 2]['visitId'])
+    assert list(reader.iter_records(session=session)) == [v for v in visits if session_id(v['visitId']) == session]
+
+
+def test_batches_split_at_the_segment_limit(visits, tmp_path):
+    store = str(tmp_path / 'store')
+    with LogWriter(store, segment_records=500, block_records=100) as writer:
+        writer.append(visits[:1200])
+        writer.append(visits[1200:1250])
+    segments = read_manifest(store)['segments']
+    assert [seg['records'] for seg in segments] == [500, 500]
+    assert list(LogReader(store).iter_records()) == visits[:1250]
+
+
+def test_byte_limit_allows_at_most_one_record_over(visits, tmp_path):
+    store = str(tmp_path / 'store')
+    limit = 20_000
+    with LogWriter(store, segment_bytes=limit) as writer:
+        writer.append(visits[:400])
+    longest = max(len(json.dumps(v)) + 1 for v in visits[:400])
+    segments = read_manifest(store)['segments']
+    assert len(segments) > 1
+    assert all(limit <= seg['raw_bytes'] < limit + longest for seg in segments)
+
+
+def test_read_appended_resumes_from_the_record_count(visits, tmp_path):
+    store = str(tmp_path / 'store')
+    with LogWriter(store, segment_records=250, block_records=50) as writer:
+        writer.append(visits[:900])
+        first, position = LogReader(store).read_appended({'offset': None, 'count': 0})
+        writer.append(visits[900:1000])
+    rest, position = LogReader(store).read_appended(position)
+    assert first == visits[:900]
+    assert rest == visits[900:1000]
+    assert position['count'] == 1000
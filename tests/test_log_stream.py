@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+import log_stream
+
+
+def _records(n):
+    return [{'page': f'p{i % 7}', 'visit': i, 'flag': i % 2 == 0, 'load': -1.5e3 + i, 'note': None}
+            for i in range(n)]
+
+
+@pytest.mark.parametrize('indent', [None, 2])
+def test_json_array_round_trip(tmp_path, monkeypatch, indent):
+    monkeypatch.setattr(log_stream, 'READ_SIZE', 97)
+    records = _records(500)
+    path = tmp_path / 'log.json'
+    path.write_text(json.dumps(records, indent=indent))
+    assert list(log_stream.iter_raw_records(str(path))) == records
+
+
+def test_malformed_element_fails_without_reading_on(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_stream, 'READ_SIZE', 256)
+    text = json.dumps(_records(2000))
+    cut = text.index('{"page"', len(text) // 10)
+    path = tmp_path / 'bad.json'
+    path.write_text(text[:cut] + '{"page": oops}, ' + text[cut:])
+
+    reads = []
+    original = log_stream.open_log
+
+    def counting_open(file_path):
+        f = original(file_path)
+        read = f.read
+        f.read = lambda size=-1: reads.append(size) or read(size)
+        return f
+
+    monkeypatch.setattr(log_stream, 'open_log', counting_open)
+    with pytest.raises(json.JSONDecodeError):
+        for _ in log_stream.iter_raw_records(str(path)):
+            pass
+    assert sum(reads) < len(text) // 5
@@ -0,0 +1,51 @@
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import evaluate
+from model_bundle import ModelBundle, load_legacy_artifacts
+
+ROWS = 300
+
+
+def test_bundle_round_trips_the_joblib_artifacts(in_model_dir, visit_log):
+    clf, ohe, page_encoder, scaler, feature_names, transition_freq, encoders = load_legacy_artifacts()
+    bundle = ModelBundle()
+
+    assert bundle.feature_names == list(feature_names)
+    assert bundle.transition_freq == transition_freq
+    assert bundle.encoders == encoders
+    np.testing.assert_array_equal(bundle.page_encoder.classes_, page_encoder.classes_)
+    np.testing.assert_array_equal(bundle.scaler.mean_, scaler.mean_)
+    np.testing.assert_array_equal(bundle.scaler.scale_, scaler.scale_)
+
+    page_map = {page: idx for idx, page in enumerate(encoders['page'])}
+    full_data = evaluate.load_and_validate_data(visit_log)
+    valid_data = evaluate.filter_data_by_model_vocabulary(full_data, page_map)
+    valid_data.sort(key=lambda x: pd.to_datetime(x['timestamp']))
+    columns = evaluate.extract_prediction_columns(valid_data[:ROWS + 1], full_data)
+    X = evaluate.build_feature_matrix(columns, transition_freq, ohe, scaler, feature_names)
+    X_bundle = evaluate.build_feature_matrix(columns, bundle.transition_freq, bundle.ohe, bundle.scaler,
+                                             bundle.feature_names)
+
+    np.testing.assert_array_equal(X_bundle, X)
+    np.testing.assert_allclose(bundle.clf.predict_proba(X), clf.predict_proba(X), rtol=1e-6)
+    np.testing.assert_allclose(bundle.forest_classifier().predict_proba(X), clf.predict_proba(X), atol=1e-5)
+
+
+def test_tampered_file_fails_its_checksum(model_dir, tmp_path):
+    bundle_dir = str(tmp_path / 'model_bundle')
+    shutil.copytree(model_dir / 'model_bundle', bundle_dir)
+    with open(f"{bundle_dir}/scaler_mean.npy", 'r+b') as f:
+        f.seek(-1, 2)
+        last = f.read(1)
+        f.seek(-1, 2)
+        f.write(bytes([last[0] ^ 1]))
+
+    bundle = ModelBundle(bundle_dir)
+    assert bundle.feature_names
+    with pytest.raises(ValueError, match='Checksum mismatch'):
+        bundle.scaler
+    assert ModelBundle(bundle_dir, verify=False).scaler.mean_ is not None
@@ -0,0 +1,27 @@
+import json
+
+from log_stream import iter_records
+from ngram_model import CONTEXT_SEPARATOR, NGramModel, main
+
+
+def _table_lookup(table, context):
+    """The browser-side lookup: the longest context in the table, backing off to shorter ones."""
+    context = [page.lower() for page in context][-table['order']:]
+    for n in range(len(context), -1, -1):
+        best = table['table'].get(CONTEXT_SEPARATOR.join(context[len(context) - n:]))
+        if best is not None:
+            return table['pages'][best]
+    return None
+
+
+def test_exported_table_matches_predict(visit_log, tmp_path):
+    path = tmp_path / 'ngram_table.json'
+    main(['--data', visit_log, '--output', str(tmp_path / 'ngram_model.json'), '--export-table', str(path)])
+    table = json.loads(path.read_text())
+    model = NGramModel.load(tmp_path / 'ngram_model.json')
+    assert len(table['table']) <= len(model.best)
+
+    pages = [entry['page'] for entry in iter_records(visit_log, ['page'])]
+    for i in range(len(pages)):
+        for context in (pages[max(0, i - 3):i], pages[i:i + 1] + ['Unknown'], []):
+            assert _table_lookup(table, context) == model.predict(context)
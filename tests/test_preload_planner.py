@@ -0,0 +1,21 @@
+from preload_planner import client_plan, plan_preload
+
+
+def test_shared_assets_count_once_and_ties_prefer_larger():
+    classes = ['home', 'about', 'contact']
+    page_assets = {'home': ['shared', 'small'], 'about': ['shared', 'large'], 'contact': ['other']}
+    sizes = {'shared': 10, 'small': 5, 'large': 50, 'other': 20}
+    probs = [0.4, 0.4, 0.2]
+
+    assert plan_preload(probs, classes, page_assets, sizes, byte_budget=1000, request_budget=2) == ['shared', 'large']
+    # 'large' no longer fits, so the next asset that does is taken instead
+    assert plan_preload(probs, classes, page_assets, sizes, byte_budget=30, request_budget=3) == ['shared', 'small']
+
+
+def test_client_plan_falls_back_like_the_client():
+    classes = ['home', 'about']
+    page_assets = {'home': ['h'], 'about': ['a']}
+    plans, fallback = {'home|none|mac|chrome': ['x']}, {'home': ['y']}
+    assert client_plan(plans, fallback, 'home|none|mac|chrome', 'home', [0.9, 0.1], classes, page_assets) == ['x']
+    assert client_plan(plans, fallback, 'home|about|mac|chrome', 'home', [0.9, 0.1], classes, page_assets) == ['y']
+    assert client_plan(plans, fallback, 'about|none|mac|chrome', 'about', [0.2, 0.8], classes, page_assets) == ['a']
@@ -0,0 +1,24 @@
+import random
+
+from preload_simulator import record_columns, time_ordered_chunks
+
+
+def _visit(i, page='Home'):
+    return {'timestamp': f'2025-05-10T10:{i // 60:02d}:{i % 60:02d}Z', 'page': page, 'navPath': [page],
+            'device': 'Mac', 'browser': 'Chrome', 'screenWidth': 1440, 'loadTime': 100.0}
+
+
+def test_time_ordered_chunks_sorts_within_the_buffer():
+    visits = [_visit(i) for i in range(500)]
+    shuffled = visits[:]
+    random.Random(0).shuffle(shuffled)
+
+    chunks = list(time_ordered_chunks(shuffled, buffer_size=len(shuffled), chunk_size=64))
+    assert [len(c) for c in chunks] == [64] * 7 + [52]
+    assert [v for chunk in chunks for v in chunk] == visits
+
+
+def test_record_columns_transition_targets_follow_the_replay():
+    chunk = [_visit(0, 'Home'), _visit(1, 'About')]
+    assert record_columns(chunk, _visit(2, 'Contact'))['transition_next'].tolist() == ['about', 'contact']
+    assert record_columns(chunk)['transition_next'].tolist() == ['about', 'none']
@@ -0,0 +1,11 @@
+import json
+
+from synthetic_logs import SessionGenerator
+
+
+def test_logs_are_in_time_order_across_chunks():
+    lines = list(SessionGenerator(seed=1, chunk_visits=300).iter_lines(3000))
+    timestamps = [json.loads(line)['timestamp'] for line in lines]
+    assert len(lines) == 3000
+    assert timestamps == sorted(timestamps)
+    assert lines == list(SessionGenerator(seed=1, chunk_visits=300).iter_lines(3000))
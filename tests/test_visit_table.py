@@ -0,0 +1,16 @@
+import random
+
+from visit_table import verify_parity
+
+
+def test_table_matches_the_dict_paths(visit_log):
+    verify_parity(visit_log)
+
+
+def test_table_matches_the_dict_paths_out_of_order(visit_log, tmp_path):
+    with open(visit_log) as f:
+        lines = f.readlines()
+    random.Random(0).shuffle(lines)
+    shuffled = tmp_path / 'shuffled.ndjson'
+    shuffled.write_text(''.join(lines))
+    verify_parity(str(shuffled))
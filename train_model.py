@@ -1,15 +1,23 @@
 import json
-import pandas as pd
 import numpy as np
-import joblib
-from xgboost import XGBClassifier
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.preprocessing import OneHotEncoder, LabelEncoder, StandardScaler
-from sklearn.model_selection import train_test_split, TimeSeriesSplit, cross_val_score
 from collections import Counter
+import argparse
 import logging
 import sys
 import os
+import tempfile
+import instrumentation
+from log_stream import REQUIRED_KEYS, iter_records, peak_rss_mb
+from drift_monitor import DEFAULT_SNAPSHOT, DriftSnapshot
+from feature_cache import DEFAULT_CACHE_DIR, FeatureCache
+from forest_export import (LEAF_DTYPES, THRESHOLD_DTYPES, budget_report, compile_forest, export_forest_js,
+                           verify_forest_parity)
+from lookup_table import DEFAULT_MAX_CELLS, compile_lookup_table, verify_table_parity
+from model_bundle import DEFAULT_BUNDLE_DIR, write_bundle
+from sparse_features import DEFAULT_HASH_FEATURES, encode_features_sparse
+from tree_export import (export_tree_arrays_js, flatten_tree, report_export_formats, sample_js_inputs,
+                         verify_tree_parity)
+from visit_table import VisitTable
 
 logging.basicConfig(
     level=logging.INFO,
@@ -19,13 +27,16 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 def load_and_validate_data(file_path):
+    """Valid records as a list of dicts, all held in memory; ``load_visit_table`` keeps only columns."""
     logger.info("Loading data...")
     try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        required_keys = ['page', 'navPath', 'userAgent', 'timestamp', 'loadTime', 'browser', 'device', 'screenWidth']
-        valid_data = [entry for entry in data if all(k in entry for k in required_keys)]
-        logger.info(f"Loaded {len(valid_data)} valid entries from {len(data)} total entries.")
+        stats = {}
+        with instrumentation.current().stage('load') as stage:
+            valid_data = list(iter_records(file_path, REQUIRED_KEYS, stats))
+            stage['rows'] = stats['total']
+        instrumentation.current().count('records_invalid', stats['total'] - len(valid_data))
+        logger.info(f"Loaded {len(valid_data)} valid entries from {stats['total']} total entries. "
+                    f"Peak RSS: {peak_rss_mb():.1f} MB")
         if not valid_data:
             raise ValueError("No valid data entries found.")
         return valid_data
@@ -33,6 +44,21 @@ def load_and_validate_data(file_path):
         logger.error(f"Error loading data: {e}")
         raise
 
+def load_visit_table(file_path):
+    """``load_and_validate_data`` into an interned, columnar ``VisitTable`` instead of a list of dicts."""
+    logger.info("Loading data...")
+    stats = {}
+    with instrumentation.current().stage('load') as stage:
+        visits = VisitTable.from_log(file_path, stats)
+        stage['rows'] = stats['total']
+    instrumentation.current().count('records_invalid', stats['total'] - len(visits))
+    logger.info(f"Loaded {len(visits)} valid entries from {stats['total']} total entries "
+                f"({visits.nbytes / (1024 * 1024):.1f} MB as a table). Peak RSS: {peak_rss_mb():.1f} MB")
+    if not len(visits):
+        logger.error("Error loading data: No valid data entries found.")
+        raise ValueError("No valid data entries found.")
+    return visits
+
 def extract_features(entry, data, i, transition_freq):
     try:
         nav_path = entry['navPath']
@@ -49,13 +75,38 @@ def extract_features(entry, data, i, transition_freq):
             'loadTime': entry['loadTime'],
             'transition_frequency': transition_freq.get(transition, 0)
         }
-        logger.debug(f"Extracted features: {features}")
+        if instrumentation.sampled(logger, logging.DEBUG, 'extracted_features'):
+            logger.debug(f"Extracted features: {features}")
         return features
     except Exception as e:
         logger.error(f"Error extracting features: {e}")
         raise
 
-def prepare_features_for_training(data):
+CATEGORICAL_COLS = ['page', 'prev_page', 'device', 'browser']
+NUMERIC_COLS = ['screenWidth', 'loadTime', 'transition_frequency']
+XGB_PARAMS = {
+    'random_state': 42,
+    'max_depth': 5,
+    'n_estimators': 300,
+    'learning_rate': 0.05,
+    'min_child_weight': 3,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'gamma': 0.1,
+    'eval_metric': 'mlogloss',
+}
+CLASS_WEIGHT_EXPONENT = 1.5
+
+def class_weights(class_counts, exponent=CLASS_WEIGHT_EXPONENT):
+    """Inverse-frequency class weights, sharpened by ``exponent`` (0 disables weighting)."""
+    total_samples = sum(class_counts.values())
+    n_classes = len(class_counts)
+    return {i: (total_samples / (n_classes * count)) ** exponent for i, count in class_counts.items()}
+
+def extract_feature_table(data):
+    """Extract the raw feature table, next-page targets and transition counts from the log."""
+    import pandas as pd
+
     features_list = []
     next_pages = []
     transitions = [(data[i]['page'].lower(), data[i+1]['page'].lower()) for i in range(len(data)-1)]
@@ -76,9 +127,14 @@ def prepare_features_for_training(data):
 
     df = pd.DataFrame(features_list)
     logger.info(f"DataFrame columns: {df.columns.tolist()}")
+    return df, next_pages, transition_freq
+
+def encode_features(df, next_pages):
+    import pandas as pd
+    from sklearn.preprocessing import OneHotEncoder, LabelEncoder, StandardScaler
 
-    categorical_cols = ['page', 'prev_page', 'device', 'browser']
-    numeric_cols = ['screenWidth', 'loadTime', 'transition_frequency']
+    categorical_cols = CATEGORICAL_COLS
+    numeric_cols = NUMERIC_COLS
 
     ohe = OneHotEncoder(sparse_output=False, handle_unknown='ignore')
     encoded_cols = pd.DataFrame(
@@ -99,9 +155,118 @@ def prepare_features_for_training(data):
     y_encoded = page_encoder.fit_transform(next_pages)
     logger.info(f"Page encoder classes: {page_encoder.classes_}")
 
+    return features, ohe, page_encoder, y_encoded, scaler, feature_names
+
+def prepare_features_for_training(data):
+    df, next_pages, transition_freq = extract_feature_table(data)
+    features, ohe, page_encoder, y_encoded, scaler, feature_names = encode_features(df, next_pages)
     return features, ohe, page_encoder, y_encoded, scaler, feature_names, transition_freq
 
-def export_decision_tree(clf, feature_names, page_encoder, scaler, ohe, transition_freq):
+# Set in the parent before a fork-based pool starts, so workers read the log without pickling it
+_shard_source = None
+
+def extract_shard(data, start, end):
+    """Extract features for rows ``start..end-1``; ``data[end]`` is only read as the successor row.
+
+    ``transition_frequency`` needs the global counts, so it is left out here and the
+    shard's transition pairs are returned for the caller to resolve after merging.
+    """
+    columns = {col: [] for col in CATEGORICAL_COLS + NUMERIC_COLS[:-1]}
+    transitions = []
+    next_pages = []
+    for i in range(start, end):
+        features = extract_features(data[i], data, i, {})
+        for col in columns:
+            columns[col].append(features[col])
+        next_page = data[i + 1]['page'].lower()
+        transitions.append((features['page'], next_page))
+        next_pages.append(next_page)
+    return columns, transitions, next_pages, Counter(transitions)
+
+def _extract_shard_from_source(bounds):
+    start, end = bounds
+    return extract_shard(_shard_source, start, end)
+
+def _extract_shard_from_slice(shard):
+    return extract_shard(shard, 0, len(shard) - 1)
+
+def extract_feature_table_parallel(data, workers):
+    """Parallel ``extract_feature_table``: contiguous shards in a process pool, counters merged afterwards."""
+    global _shard_source
+    import multiprocessing
+    import pandas as pd
+
+    n_rows = len(data) - 1
+    if workers <= 1 or n_rows < 2 * workers:
+        return extract_feature_table(data)
+
+    bounds = [(n_rows * k // workers, n_rows * (k + 1) // workers) for k in range(workers)]
+    if 'fork' in multiprocessing.get_all_start_methods():
+        _shard_source = data
+        try:
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                shards = pool.map(_extract_shard_from_source, bounds)
+        finally:
+            _shard_source = None
+    else:
+        # Each shard carries its successor row so the boundary transition is still seen
+        with multiprocessing.Pool(workers) as pool:
+            shards = pool.map(_extract_shard_from_slice, [data[start:end + 1] for start, end in bounds])
+
+    transition_freq = Counter()
+    for _, _, _, shard_freq in shards:
+        transition_freq.update(shard_freq)
+    logger.info(f"Page transitions: {transition_freq}")
+
+    df = pd.DataFrame({col: [v for columns, _, _, _ in shards for v in columns[col]]
+                       for col in CATEGORICAL_COLS + NUMERIC_COLS[:-1]})
+    # Same lookup as extract_features, so both paths produce identical tables
+    df['transition_frequency'] = [transition_freq.get(f"{src}_{dst}", 0)
+                                  for _, transitions, _, _ in shards for src, dst in transitions]
+    df = df[['page', 'prev_page', 'device', 'browser', 'screenWidth', 'loadTime', 'transition_frequency']]
+    next_pages = [p for _, _, shard_next, _ in shards for p in shard_next]
+    logger.info(f"DataFrame columns: {df.columns.tolist()}")
+    return df, next_pages, transition_freq
+
+def scaling_report(data, worker_counts=(1, 2, 4, 8)):
+    """Log feature-extraction throughput for each worker count."""
+    import time
+
+    rows = len(data) - 1
+    baseline = None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        extract_feature_table_parallel(data, workers)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        logger.info(f"Scaling: {workers} worker(s): {rows / elapsed:.0f} rows/sec, "
+                    f"{elapsed:.3f}s, speedup {baseline / elapsed:.2f}x")
+
+def load_feature_table(args):
+    """Load the feature table from the cache, or parse the log and populate the cache."""
+    cache = None if args.no_cache else FeatureCache(args.cache_dir)
+    key = cache.key(args.data, 'train') if cache else None
+    table = None
+    if cache:
+        with instrumentation.current().stage('feature_cache'):
+            table = cache.load_table(key)
+    if table is None:
+        if args.workers > 1:
+            data = load_and_validate_data(args.data)
+            with instrumentation.current().stage('extract_features', rows=len(data) - 1):
+                table = extract_feature_table_parallel(data, args.workers)
+        else:
+            visits = load_visit_table(args.data)
+            with instrumentation.current().stage('extract_features', rows=len(visits) - 1):
+                table = visits.feature_table()
+        if cache:
+            cache.store_table(key, *table, CATEGORICAL_COLS, NUMERIC_COLS)
+    if cache:
+        cache.report()
+    return table
+
+def export_decision_tree(clf, feature_names, page_encoder, scaler, ohe, transition_freq,
+                         output_path='src/utils/predictNextPage.js'):
     """Export DecisionTreeClassifier as JavaScript function"""
     tree = clf.tree_
     lines = ["export function predictNextPage(data) {"]
@@ -183,19 +348,73 @@ def export_decision_tree(clf, feature_names, page_encoder, scaler, ohe, transiti
     lines.append("}")
 
     # Write to file
-    os.makedirs('src/utils', exist_ok=True)
-    with open('src/utils/predictNextPage.js', 'w') as f:
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'w') as f:
         f.write('\n'.join(lines))
-    logger.info("Generated src/utils/predictNextPage.js")
-
-def main():
-    data = load_and_validate_data('predictpulse_mockdata.json')
+    logger.info(f"Generated {output_path}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Train the next-page model and export predictNextPage.js.')
+    parser.add_argument('--data', default='predictpulse_mockdata.json',
+                        help='Training log: JSON array, NDJSON or .gz/.zst compressed NDJSON')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='Feature cache directory')
+    parser.add_argument('--no-cache', action='store_true', help='Always re-extract features from the log')
+    parser.add_argument('--workers', type=int, default=1, help='Processes for sharded feature extraction')
+    parser.add_argument('--tree-format', choices=['nested', 'arrays'], default='nested',
+                        help='predictNextPage.js layout: nested if statements or flattened typed arrays')
+    parser.add_argument('--compare-tree-formats', action='store_true',
+                        help='Report bundle size and per-call latency of both export formats')
+    parser.add_argument('--export-forest', action='store_true',
+                        help='Export the XGBoost model to src/utils/predictNextPageForest.js')
+    parser.add_argument('--forest-rounds', type=int, help='Keep only the first N boosting rounds')
+    parser.add_argument('--forest-depth', type=int, help='Cut exported trees at this depth')
+    parser.add_argument('--forest-thresholds', choices=list(THRESHOLD_DTYPES), default='float32')
+    parser.add_argument('--forest-leaves', choices=list(LEAF_DTYPES), default='float32')
+    parser.add_argument('--forest-report', action='store_true',
+                        help='Report accuracy, bytes and latency of the forest export at several budgets')
+    parser.add_argument('--lookup-table', choices=['tree', 'xgb'],
+                        help='Precompile the decision tree or the XGBoost model into a dense lookup table')
+    parser.add_argument('--lookup-max-cells', type=int, default=DEFAULT_MAX_CELLS,
+                        help='Largest table to build before falling back to the tree')
+    parser.add_argument('--scaling-report', action='store_true',
+                        help='Report extraction throughput at 1/2/4/8 workers and exit')
+    parser.add_argument('--params', help='Sweep results file (hyperparam_sweep.py) whose winner to train')
+    parser.add_argument('--encoding', choices=['dense', 'sparse', 'hashed'], default='dense',
+                        help='Feature matrix: dense one-hot, sparse CSR one-hot, or fixed-width hashed CSR')
+    parser.add_argument('--hash-features', type=int, default=DEFAULT_HASH_FEATURES,
+                        help='Hashed categorical columns (--encoding hashed)')
+    parser.add_argument('--bundle-dir', default=DEFAULT_BUNDLE_DIR,
+                        help='Versioned model bundle written alongside the joblib files')
+    instrumentation.add_arguments(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.scaling_report:
+        scaling_report(load_and_validate_data(args.data))
+        return
+    with instrumentation.from_args(args, 'train') as run:
+        train(args, run)
+
+def train(args, run):
     try:
-        X, ohe, page_encoder, y_encoded, scaler, feature_names, transition_freq = prepare_features_for_training(data)
+        df, next_pages, transition_freq = load_feature_table(args)
+        with run.stage('encode', rows=len(df)):
+            if args.encoding == 'dense':
+                X, ohe, page_encoder, y_encoded, scaler, feature_names = encode_features(df, next_pages)
+            else:
+                X, ohe, page_encoder, y_encoded, scaler, feature_names = encode_features_sparse(
+                    df, next_pages, args.hash_features if args.encoding == 'hashed' else None)
     except Exception as e:
         logger.error(f"Error preparing features: {e}")
         raise
 
+    import joblib
+    import pandas as pd
+    from sklearn.model_selection import train_test_split, TimeSeriesSplit, cross_val_score
+    from sklearn.tree import DecisionTreeClassifier
+    from xgboost import XGBClassifier
+
     X_train, X_test, y_train, y_test = train_test_split(
         X, y_encoded, test_size=0.2, random_state=42, stratify=y_encoded
     )
@@ -203,30 +422,27 @@ def main():
     logger.info(f"y_train shape: {y_train.shape}, y_test shape: {y_test.shape}")
 
     # Train XGBClassifier
-    clf_xgb = XGBClassifier(
-        random_state=42,
-        max_depth=5,
-        n_estimators=300,
-        learning_rate=0.05,
-        min_child_weight=3,
-        subsample=0.8,
-        colsample_bytree=0.8,
-        gamma=0.1,
-        eval_metric='mlogloss'
-    )
-    class_counts = Counter(y_encoded)
-    total_samples = len(y_encoded)
-    n_classes = len(class_counts)
-    class_weights = {i: (total_samples / (n_classes * count)) ** 1.5 for i, count in class_counts.items()}
-    logger.info(f"Class weights: {class_weights}")
-    sample_weights = np.array([class_weights[y] for y in y_train])
+    xgb_params = dict(XGB_PARAMS)
+    exponent = CLASS_WEIGHT_EXPONENT
+    if args.params:
+        with open(args.params, 'r') as f:
+            winner = json.load(f)['winner']
+        xgb_params.update(winner['xgb_params'])
+        exponent = winner['class_weight_exponent']
+        logger.info(f"Using swept parameters {winner['xgb_params']}, class weight exponent {exponent}")
+    clf_xgb = XGBClassifier(**xgb_params)
+    weights = class_weights(Counter(y_encoded), exponent)
+    logger.info(f"Class weights: {weights}")
+    sample_weights = np.array([weights[y] for y in y_train])
     logger.info(f"Sample weights shape: {sample_weights.shape}")
 
-    clf_xgb.fit(X_train, y_train, sample_weight=sample_weights)
+    with run.stage('fit_xgboost', rows=len(y_train)):
+        clf_xgb.fit(X_train, y_train, sample_weight=sample_weights)
 
     # Cross-validation for XGBClassifier
     tscv = TimeSeriesSplit(n_splits=5)
-    cv_scores = cross_val_score(clf_xgb, X, y_encoded, cv=tscv, scoring='accuracy')
+    with run.stage('cross_validation', rows=len(y_encoded)):
+        cv_scores = cross_val_score(clf_xgb, X, y_encoded, cv=tscv, scoring='accuracy')
     cv_mean = cv_scores.mean()
     cv_std = cv_scores.std()
     logger.info(f"XGBClassifier Cross-validation accuracy: {cv_mean:.4f} ± {cv_std:.4f}")
@@ -234,7 +450,7 @@ def main():
     test_accuracy = clf_xgb.score(X_test, y_test)
     logger.info(f"XGBClassifier Test accuracy: {test_accuracy:.4f}")
 
-    feature_importance = pd.Series(clf_xgb.feature_importances_, index=X.columns).sort_values(ascending=False)
+    feature_importance = pd.Series(clf_xgb.feature_importances_, index=feature_names).sort_values(ascending=False)
     logger.info(f"Feature importance:\n{feature_importance}")
     nonzero_features = feature_importance[feature_importance > 0].index.tolist()
     logger.info(f"Non-zero importance features: {nonzero_features}, count: {len(nonzero_features)}")
@@ -247,27 +463,76 @@ def main():
         min_samples_leaf=5,
         criterion='gini'
     )
-    clf_dt.fit(X_train, y_train, sample_weight=sample_weights)
+    with run.stage('fit_tree', rows=len(y_train)):
+        clf_dt.fit(X_train, y_train, sample_weight=sample_weights)
 
     # Export DecisionTreeClassifier as JavaScript
-    export_decision_tree(clf_dt, feature_names, page_encoder, scaler, ohe, transition_freq)
+    with run.stage('export'):
+        if args.encoding == 'hashed':
+            logger.warning("Hashed features have no browser-side encoder; skipping the JavaScript exports")
+        elif args.tree_format == 'arrays':
+            # sklearn trees treat implicit CSR zeros as zeros, so a dense sample checks the sparse model too
+            if not verify_tree_parity(clf_dt, flatten_tree(clf_dt), X[:10000].toarray() if args.encoding == 'sparse' else X):
+                logger.error("Not exporting a decision tree that disagrees with the fitted model")
+                sys.exit(1)
+            export_tree_arrays_js(clf_dt, feature_names, page_encoder, scaler, ohe, transition_freq)
+        else:
+            export_decision_tree(clf_dt, feature_names, page_encoder, scaler, ohe, transition_freq)
+        if args.compare_tree_formats and args.encoding != 'hashed':
+            with tempfile.TemporaryDirectory() as tmp:
+                paths = {'nested': os.path.join(tmp, 'nested.js'), 'arrays': os.path.join(tmp, 'arrays.js')}
+                export_decision_tree(clf_dt, feature_names, page_encoder, scaler, ohe, transition_freq, paths['nested'])
+                export_tree_arrays_js(clf_dt, feature_names, page_encoder, scaler, ohe, transition_freq, paths['arrays'])
+                report_export_formats(paths, sample_js_inputs(df))
+
+        # XGBoost reads implicit CSR zeros as missing values, which the compiled dense exports cannot reproduce
+        # The unpruned forest is checked here and stored in the bundle
+        forest = compile_forest(clf_xgb) if args.encoding == 'dense' else None
+        if args.encoding != 'dense' and (args.export_forest or args.forest_report or args.lookup_table):
+            logger.warning("Forest and lookup-table exports need --encoding dense; skipping them")
+        elif args.export_forest or args.forest_report:
+            encoder_args = (feature_names, page_encoder, scaler, ohe, transition_freq)
+            if not verify_forest_parity(clf_xgb, forest, X_test):
+                logger.error("Not exporting a forest that disagrees with the XGBoost model")
+                sys.exit(1)
+            if args.export_forest:
+                pruned = (args.forest_rounds, args.forest_depth, args.forest_thresholds, args.forest_leaves)
+                export_forest_js(forest if pruned == (None, None, 'float32', 'float32')
+                                 else compile_forest(clf_xgb, *pruned), *encoder_args)
+            if args.forest_report:
+                budget_report(clf_xgb, X_test, y_test, encoder_args, js_inputs=sample_js_inputs(df))
+
+        if args.lookup_table and args.encoding == 'dense':
+            table_model = clf_xgb if args.lookup_table == 'xgb' else clf_dt
+            lookup = compile_lookup_table(table_model, feature_names, ohe, scaler, page_encoder.classes_,
+                                          max_cells=args.lookup_max_cells)
+            if lookup is not None:
+                if not verify_table_parity(lookup, table_model, df, X):
+                    logger.error("Not exporting a lookup table that disagrees with the model")
+                    sys.exit(1)
+                lookup.export_js()
+                joblib.dump(lookup, 'lookup_table.joblib')
 
     # Save model and encoders
-    joblib.dump(clf_xgb, 'model.joblib')
-    joblib.dump(ohe, 'ohe_encoder.joblib')
-    joblib.dump(page_encoder, 'page_encoder.joblib')
-    joblib.dump(scaler, 'scaler.joblib')
-    joblib.dump(feature_names, 'feature_names.joblib')
-    joblib.dump(transition_freq, 'transition_freq.joblib')
-
-    encoders = {
-        'page': list(page_encoder.classes_),
-        'browser': ['chrome', 'firefox', 'safari', 'mobile safari'],
-        'device': ['iphone', 'mac', 'other']
-    }
-    os.makedirs('public', exist_ok=True)
-    with open('public/encoders.json', 'w') as f:
-        json.dump(encoders, f, indent=2)
+    with run.stage('save'):
+        joblib.dump(clf_xgb, 'model.joblib')
+        joblib.dump(ohe, 'ohe_encoder.joblib')
+        joblib.dump(page_encoder, 'page_encoder.joblib')
+        joblib.dump(scaler, 'scaler.joblib')
+        joblib.dump(feature_names, 'feature_names.joblib')
+        joblib.dump(transition_freq, 'transition_freq.joblib')
+
+        encoders = {
+            'page': list(page_encoder.classes_),
+            'browser': ['chrome', 'firefox', 'safari', 'mobile safari'],
+            'device': ['iphone', 'mac', 'other']
+        }
+        os.makedirs('public', exist_ok=True)
+        with open('public/encoders.json', 'w') as f:
+            json.dump(encoders, f, indent=2)
+        write_bundle(args.bundle_dir, clf_xgb, ohe, page_encoder, scaler, feature_names, transition_freq, encoders, forest)
+        # drift_monitor.py compares live traffic against the distribution this model was trained on
+        DriftSnapshot.from_feature_table(df, args.data).save(DEFAULT_SNAPSHOT)
 
     # Save results
     results = {
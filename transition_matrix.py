@@ -0,0 +1,222 @@
+# transition_matrix.py
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+from log_stream import iter_records
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HORIZON = 3
+DEFAULT_TOP = 3
+DEFAULT_MIN_PROB = 0.05
+DEFAULT_PRUNE = 1e-6
+DEFAULT_OUTPUT = 'public/transition_lookahead.json'
+
+class TransitionMatrix:
+    """Sparse page-to-page transition probabilities, normalized per source page.
+
+    ``power(k)`` is the k-step matrix: entry ``[a, b]`` is the probability of being on page
+    ``b`` exactly ``k`` navigations after page ``a``. Powers are built by repeated sparse
+    multiplication and cached, so every horizon up to the largest requested costs one
+    product. Entries below ``prune`` are dropped from each power to keep it sparse on large
+    page sets. Pages never left have an all-zero row.
+    """
+
+    def __init__(self, pages, counts, prune=DEFAULT_PRUNE):
+        import scipy.sparse as sp
+
+        self.pages = list(pages)
+        self.index = {page: idx for idx, page in enumerate(self.pages)}
+        self.counts = sp.csr_matrix(counts, dtype=np.float64)
+        out_degree = np.asarray(self.counts.sum(axis=1)).ravel()
+        inverse = np.divide(1.0, out_degree, out=np.zeros_like(out_degree), where=out_degree > 0)
+        self.prune = prune
+        self._powers = {1: sp.csr_matrix(sp.diags(inverse) @ self.counts)}
+
+    @classmethod
+    def from_counts(cls, transition_freq, pages=None, prune=DEFAULT_PRUNE):
+        """Build from ``train_model``'s ``Counter`` of ``(src, dst)`` pairs.
+
+        With ``pages`` given, the matrix uses that order and transitions touching other pages
+        are dropped; otherwise every page seen is included, sorted.
+        """
+        import scipy.sparse as sp
+
+        if pages is None:
+            pages = sorted({page for pair in transition_freq for page in pair})
+        index = {page: idx for idx, page in enumerate(pages)}
+        pairs = [(index[src], index[dst], count) for (src, dst), count in transition_freq.items()
+                 if src in index and dst in index]
+        src, dst, count = (np.array(column) for column in zip(*pairs)) if pairs else ([], [], [])
+        counts = sp.coo_matrix((count, (src, dst)), shape=(len(pages), len(pages)))
+        return cls(pages, counts, prune)
+
+    @classmethod
+    def from_log(cls, sources, pages=None, prune=DEFAULT_PRUNE):
+        """Count consecutive lower-cased page pairs in log order, as ``train_model`` does."""
+        transition_freq = Counter()
+        for path in sources:
+            previous = None
+            for entry in iter_records(path, ['page']):
+                page = entry['page'].lower()
+                if previous is not None:
+                    transition_freq[(previous, page)] += 1
+                previous = page
+        return cls.from_counts(transition_freq, pages, prune)
+
+    @property
+    def matrix(self):
+        return self._powers[1]
+
+    def power(self, k):
+        """The cached k-step transition matrix (CSR), computing the missing steps below ``k``."""
+        if k < 1:
+            raise ValueError(f"Horizon must be at least 1, got {k}")
+        step = max(j for j in self._powers if j <= k)
+        while step < k:
+            product = (self._powers[step] @ self.matrix).tocsr()
+            if self.prune:
+                product.data[product.data < self.prune] = 0.0
+                product.eliminate_zeros()
+            step += 1
+            self._powers[step] = product
+        return self._powers[k]
+
+    def step_probs(self, pages, k):
+        """Dense ``(len(pages), n_pages)`` k-step probabilities from each page (unknown pages get zeros)."""
+        idx = np.array([self.index.get(page, -1) for page in pages])
+        probs = np.zeros((len(idx), len(self.pages)))
+        known = idx >= 0
+        probs[known] = self.power(k)[idx[known]].toarray()
+        return probs
+
+    def propagate(self, probs, k):
+        """Spread next-page distributions (rows over ``pages``) ``k`` more steps along the chain."""
+        return np.asarray(np.asarray(probs) @ self.power(k)) if k else np.asarray(probs)
+
+    def top(self, page, k, n=DEFAULT_TOP, min_prob=0.0):
+        """The ``n`` most likely pages exactly ``k`` steps after ``page``, as ``(page, probability)``."""
+        if page not in self.index:
+            return []
+        row = self.power(k)[self.index[page]]
+        order = np.argsort(-row.data, kind='stable')[:n]
+        return [(self.pages[row.indices[i]], float(row.data[i])) for i in order if row.data[i] >= min_prob]
+
+    def lookahead_table(self, horizon=DEFAULT_HORIZON, n=DEFAULT_TOP, min_prob=DEFAULT_MIN_PROB):
+        """Per source page, the top pages at each step ``1..horizon``, for the client preloader."""
+        return {
+            'horizon': horizon, 'min_prob': min_prob, 'pages': self.pages,
+            'steps': {page: [[[dst, round(prob, 4)] for dst, prob in self.top(page, k, n, min_prob)]
+                             for k in range(1, horizon + 1)] for page in self.pages},
+        }
+
+def hits_at_k(scores, targets, k):
+    """Boolean per row: is ``targets[i]`` (a column index) among the ``k`` highest ``scores[i]``?
+
+    Counting the strictly higher scores avoids a sort; ties go to the target, and a target
+    scored zero is never a hit.
+    """
+    scores = np.asarray(scores)
+    target_scores = scores[np.arange(len(targets)), targets]
+    return ((scores > target_scores[:, None]).sum(axis=1) < k) & (target_scores > 0)
+
+def synthetic_counts(n_pages, out_degree, seed=0):
+    """Sparse transition counts with Zipf-popular destinations, for benchmarking large page sets."""
+    import scipy.sparse as sp
+
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, n_pages + 1)
+    weights /= weights.sum()
+    src = np.repeat(np.arange(n_pages), out_degree)
+    dst = rng.choice(n_pages, size=src.size, p=weights)
+    count = rng.integers(1, 100, size=src.size)
+    return sp.coo_matrix((count, (src, dst)), shape=(n_pages, n_pages)).tocsr()
+
+def bench(args):
+    """Time building k-step powers on a large sparse chain, cached lookups, and a dense baseline."""
+    results = []
+    for n_pages in args.bench_pages:
+        counts = synthetic_counts(n_pages, args.bench_degree, args.seed)
+        chain = TransitionMatrix(range(n_pages), counts, prune=args.prune)
+        start = time.perf_counter()
+        chain.power(args.horizon)
+        build_s = time.perf_counter() - start
+        queries = np.random.default_rng(args.seed).integers(0, n_pages, size=1000)
+        start = time.perf_counter()
+        for page in queries:
+            chain.top(int(page), args.horizon, args.top)
+        query_us = (time.perf_counter() - start) / len(queries) * 1e6
+        result = {'pages': n_pages, 'out_degree': args.bench_degree, 'horizon': args.horizon,
+                  'power_build_s': round(build_s, 4), 'top_query_us': round(query_us, 2),
+                  'nnz': {k: int(chain.power(k).nnz) for k in range(1, args.horizon + 1)}}
+        if n_pages <= args.dense_limit:
+            dense = chain.matrix.toarray()
+            start = time.perf_counter()
+            np.linalg.matrix_power(dense, args.horizon)
+            result['dense_power_s'] = round(time.perf_counter() - start, 4)
+        results.append(result)
+        dense_text = f", dense matrix_power {result['dense_power_s'] * 1e3:.0f} ms" if 'dense_power_s' in result else ''
+        logger.info(f"{n_pages} pages: powers 1..{args.horizon} in {build_s * 1e3:.0f} ms "
+                    f"(nnz {list(result['nnz'].values())}){dense_text}; cached top-{args.top} query "
+                    f"{query_us:.1f} us")
+    with open(args.bench_output, 'w') as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Benchmark saved to {args.bench_output}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the sparse page transition matrix and export k-step lookahead.')
+    parser.add_argument('--data', nargs='+', default=['predictpulse_mockdata.json', 'predictpulse_realdata.json'],
+                        help='Logs to count transitions in; missing files are skipped')
+    parser.add_argument('--horizon', type=int, default=DEFAULT_HORIZON, help='Largest number of steps ahead')
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP, help='Pages kept per source and step')
+    parser.add_argument('--min-prob', type=float, default=DEFAULT_MIN_PROB,
+                        help='Smallest k-step probability exported for preloading')
+    parser.add_argument('--prune', type=float, default=DEFAULT_PRUNE,
+                        help='Drop k-step entries below this probability to keep the powers sparse')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--bench', action='store_true', help='Benchmark k-step powers on synthetic page sets')
+    parser.add_argument('--bench-pages', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--bench-degree', type=int, default=10, help='Distinct successors per page in the benchmark')
+    parser.add_argument('--dense-limit', type=int, default=2000, help='Largest page set also timed densely')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bench-output', default='transition_bench.json')
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        bench(args)
+        return
+    sources = [path for path in args.data if os.path.exists(path)]
+    if not sources:
+        logger.error(f"None of {args.data} exist")
+        sys.exit(1)
+    chain = TransitionMatrix.from_log(sources, prune=args.prune)
+    if chain.matrix.nnz == 0:
+        logger.error("No page transitions found")
+        sys.exit(1)
+    start = time.perf_counter()
+    table = chain.lookahead_table(args.horizon, args.top, args.min_prob)
+    logger.info(f"{len(chain.pages)} pages, {chain.matrix.nnz} transitions; {args.horizon}-step lookahead "
+                f"built in {(time.perf_counter() - start) * 1e3:.1f} ms")
+    for page in chain.pages:
+        steps = '; '.join(f"{k + 1}: " + ', '.join(f"{dst} {prob:.2f}" for dst, prob in step)
+                          for k, step in enumerate(table['steps'][page]))
+        logger.info(f"{page} -> {steps}")
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(table, f, indent=2)
+    logger.info(f"Lookahead table saved to {args.output}")
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()
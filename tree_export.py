@@ -0,0 +1,193 @@
+# tree_export.py
+import gzip
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CATEGORICAL_COLS = ['page', 'prev_page', 'device', 'browser']
+NUMERIC_COLS = ['screenWidth', 'loadTime', 'transition_frequency']
+
+def flatten_tree(clf):
+    """Flatten a fitted DecisionTreeClassifier into parallel node arrays (``feature < 0`` marks a leaf)."""
+    tree = clf.tree_
+    return {
+        'feature': np.where(tree.children_left == -1, -1, tree.feature).astype(np.int32),
+        'threshold': tree.threshold.astype(np.float64),
+        'left': tree.children_left.astype(np.int32),
+        'right': tree.children_right.astype(np.int32),
+        'leaf_class': np.asarray(clf.classes_)[tree.value[:, 0, :].argmax(axis=1)].astype(np.int32),
+    }
+
+def predict_tree_arrays(arrays, X):
+    """Evaluate flattened tree arrays for every row of ``X`` at once.
+
+    Inputs are cast to float32 before comparing, exactly as sklearn does, so the
+    result matches ``clf.predict`` bit for bit.
+    """
+    X = np.asarray(X, dtype=np.float32)
+    feature, threshold = arrays['feature'], arrays['threshold']
+    left, right = arrays['left'], arrays['right']
+    rows = np.arange(X.shape[0])
+    node = np.zeros(X.shape[0], dtype=np.int32)
+    active = feature[node] >= 0
+    while active.any():
+        idx = rows[active]
+        n = node[idx]
+        go_left = X[idx, feature[n]] <= threshold[n]
+        node[idx] = np.where(go_left, left[n], right[n])
+        active[idx] = feature[node[idx]] >= 0
+    return arrays['leaf_class'][node]
+
+def verify_tree_parity(clf, arrays, X):
+    """Check that the array evaluator reproduces ``clf.predict`` on ``X``."""
+    expected = clf.predict(X)
+    actual = predict_tree_arrays(arrays, X)
+    mismatches = int((expected != actual).sum())
+    if mismatches:
+        logger.error(f"Array tree parity check failed: {mismatches} of {len(expected)} predictions differ")
+    else:
+        logger.info(f"Array tree parity check passed on {len(expected)} rows")
+    return mismatches == 0
+
+def _typed_array(kind, values):
+    return f"new {kind}({json.dumps([v.item() if hasattr(v, 'item') else v for v in values])})"
+
+def _js_number(value):
+    return repr(float(value)) if np.isfinite(value) else '0'
+
+def js_feature_encoder(feature_names, scaler, ohe, transition_freq):
+    """Module-scope JS that turns a ``predictNextPage`` input into the model's feature vector.
+
+    The preprocessing matches ``export_decision_tree``, but categories resolve to feature
+    indices through hoisted maps instead of per-call object literals and ``indexOf``.
+    """
+    column_index = {name: idx for idx, name in enumerate(feature_names)}
+    category_index = {}
+    for col, cats in zip(CATEGORICAL_COLS, ohe.categories_):
+        category_index[col] = {str(cat): column_index[f"{col}_{cat}"] for cat in cats if f"{col}_{cat}" in column_index}
+    numeric = [[column_index[col], _js_number(scaler.mean_[i]), _js_number(scaler.scale_[i])]
+               for i, col in enumerate(NUMERIC_COLS) if col in column_index]
+    # The client only ever looks up `${page}_unknown`, so ship just those counts
+    unknown_freq = {f"{src}_{dst}": count for (src, dst), count in transition_freq.items() if dst == 'unknown'}
+    return [
+        f"const CATEGORY_INDEX = {json.dumps(category_index)};",
+        f"const NUMERIC = [{', '.join(f'[{i}, {m}, {s}]' for i, m, s in numeric)}];",
+        f"const TRANSITION_FREQ = {json.dumps(unknown_freq)};",
+        "// Float32 storage reproduces the float32 cast both sklearn and XGBoost apply to inputs",
+        f"const FEATURES = new Float32Array({len(feature_names)});",
+        "",
+        "function encodeFeatures(data) {",
+        "  const page = data.page?.toLowerCase() || 'home';",
+        "  const browser = data.browser?.toLowerCase() || 'chrome';",
+        "  const device = data.device?.toLowerCase() || 'other';",
+        "  const navPath = data.navPath || [page];",
+        "  const prevPage = navPath.length >= 2 ? navPath[navPath.length - 2].toLowerCase() : 'none';",
+        "  const numericValues = [data.screenWidth || 1920, data.loadTime || 100, TRANSITION_FREQ[`${page}_unknown`] || 0];",
+        "  FEATURES.fill(0);",
+        "  for (let i = 0; i < NUMERIC.length; i++) {",
+        "    const [idx, mean, scale] = NUMERIC[i];",
+        "    FEATURES[idx] = (numericValues[i] - mean) / scale;",
+        "  }",
+        "  const categoryValues = {page, prev_page: prevPage, device, browser};",
+        "  for (const col in CATEGORY_INDEX) {",
+        "    const idx = CATEGORY_INDEX[col][categoryValues[col]];",
+        "    if (idx !== undefined) FEATURES[idx] = 1;",
+        "  }",
+        "  return FEATURES;",
+        "}",
+    ]
+
+def export_tree_arrays_js(clf, feature_names, page_encoder, scaler, ohe, transition_freq,
+                          output_path='src/utils/predictNextPage.js'):
+    """Export the tree as typed arrays with module-scope lookup tables and an iterative evaluator."""
+    arrays = flatten_tree(clf)
+    n_classes = len(page_encoder.classes_)
+    leaf_type = 'Uint8Array' if n_classes <= 256 else 'Uint16Array'
+    # Signed, since -1 marks a leaf
+    max_feature = int(arrays['feature'].max(initial=0))
+    feature_type = 'Int8Array' if max_feature < 128 else 'Int16Array' if max_feature < 32768 else 'Int32Array'
+
+    lines = [
+        "// Generated by train_model.py (--tree-format arrays)",
+        f"const PAGES = {json.dumps([str(p) for p in page_encoder.classes_])};",
+        f"const FEATURE = {_typed_array(feature_type, arrays['feature'])};",
+        f"const THRESHOLD = new Float64Array([{', '.join(_js_number(t) for t in arrays['threshold'])}]);",
+        f"const LEFT = {_typed_array('Int32Array', arrays['left'])};",
+        f"const RIGHT = {_typed_array('Int32Array', arrays['right'])};",
+        f"const LEAF = {_typed_array(leaf_type, arrays['leaf_class'])};",
+        *js_feature_encoder(feature_names, scaler, ohe, transition_freq),
+        "",
+        "export function predictNextPage(data) {",
+        "  const features = encodeFeatures(data);",
+        "  let node = 0;",
+        "  while (FEATURE[node] >= 0) {",
+        "    node = features[FEATURE[node]] <= THRESHOLD[node] ? LEFT[node] : RIGHT[node];",
+        "  }",
+        "  return PAGES[LEAF[node]];",
+        "}",
+    ]
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'w') as f:
+        f.write('\n'.join(lines))
+    logger.info(f"Generated {output_path} (array format, {len(arrays['feature'])} nodes)")
+    return arrays
+
+_NODE_BENCH = """
+import {readFileSync} from 'fs';
+import {predictNextPage} from './model.mjs';
+const inputs = JSON.parse(readFileSync(process.argv[2], 'utf8'));
+const iterations = Number(process.argv[3]);
+let sink = 0;
+for (let i = 0; i < 1000; i++) sink += predictNextPage(inputs[i % inputs.length]).length;
+const start = process.hrtime.bigint();
+for (let i = 0; i < iterations; i++) sink += predictNextPage(inputs[i % inputs.length]).length;
+const elapsed = Number(process.hrtime.bigint() - start);
+console.log(JSON.stringify({ns_per_call: elapsed / iterations, sink}));
+"""
+
+def measure_js_latency(js_path, inputs, iterations=100000):
+    """Per-call latency of ``predictNextPage`` in nanoseconds under Node, or ``None`` if Node is unavailable."""
+    node = shutil.which('node')
+    if node is None:
+        return None
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copy(js_path, os.path.join(tmp, 'model.mjs'))
+        with open(os.path.join(tmp, 'bench.mjs'), 'w') as f:
+            f.write(_NODE_BENCH)
+        with open(os.path.join(tmp, 'inputs.json'), 'w') as f:
+            json.dump(inputs, f)
+        result = subprocess.run([node, 'bench.mjs', 'inputs.json', str(iterations)],
+                                cwd=tmp, capture_output=True, text=True, timeout=300)
+    if result.returncode != 0:
+        logger.warning(f"Node benchmark failed for {js_path}: {result.stderr.strip()}")
+        return None
+    return json.loads(result.stdout)['ns_per_call']
+
+def report_export_formats(paths, inputs):
+    """Log raw size, gzip size and Node per-call latency for each generated module."""
+    report = {}
+    for name, path in paths.items():
+        with open(path, 'rb') as f:
+            source = f.read()
+        latency = measure_js_latency(path, inputs)
+        report[name] = {'bytes': len(source), 'gzip_bytes': len(gzip.compress(source)), 'ns_per_call': latency}
+        latency_text = f"{latency:.0f} ns/call" if latency is not None else "latency n/a (node not found)"
+        logger.info(f"{name} export: {len(source)} bytes, {report[name]['gzip_bytes']} gzipped, {latency_text}")
+    return report
+
+def sample_js_inputs(df, n=1000):
+    """Client-side ``predictNextPage`` inputs reconstructed from rows of the raw feature table."""
+    rows = df.head(n)
+    return [
+        {'page': page, 'navPath': [prev, page] if prev != 'none' else [page], 'device': device, 'browser': browser,
+         'screenWidth': float(width), 'loadTime': float(load)}
+        for page, prev, device, browser, width, load in zip(
+            rows['page'], rows['prev_page'], rows['device'], rows['browser'], rows['screenWidth'], rows['loadTime'])
+    ]
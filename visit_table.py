@@ -0,0 +1,358 @@
+# visit_table.py
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from generate_asset_map import timestamp_key
+from log_stream import REQUIRED_KEYS, iter_records, peak_rss_mb
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BENCH_SIZES = [100_000]
+DEFAULT_BENCH_OUTPUT = 'visit_table_bench.json'
+
+def _intern(values):
+    """Strings of an interning dict in code order, as an object array (``-1`` indexes the extra ``'none'``)."""
+    return np.array(list(values) + ['none'], dtype=object)
+
+def _lower_codes(names):
+    """Codes of the lower-cased strings for each code in ``names``, and the lower-cased strings."""
+    index = {}
+    codes = np.array([index.setdefault(name.lower(), len(index)) for name in names[:-1]] + [-1], dtype=np.int32)
+    return codes, _intern(index)
+
+def _numeric(buffer, all_ints):
+    values = np.frombuffer(buffer, dtype=np.float64)
+    return values.astype(np.int64) if all_ints else values
+
+class VisitTable:
+    """The log as NumPy columns, with every repeated string interned to a small integer code once.
+
+    Pages, previous and entry pages (``navPath[-2]``, ``navPath[0]``), devices, browsers, user agents and asset URLs
+    and types are stored as ``int32`` codes into per-column string tables. Lower-cased names
+    are computed once per distinct string rather than once per row. Assets are a CSR layout:
+    row ``i`` owns ``asset_url[asset_offsets[i]:asset_offsets[i + 1]]``. Timestamps are kept
+    as epoch seconds (``timestamp_key``) for ordering, plus the raw strings in one byte buffer.
+    A row is about 70 bytes plus 9 per asset, against several kilobytes as a parsed dict.
+    """
+
+    def __init__(self, columns, pools, numeric_ints, timestamps, timestamp_offsets):
+        self.__dict__.update(columns)
+        self.pools = pools
+        self.numeric_ints = numeric_ints
+        self._timestamps = timestamps
+        self._timestamp_offsets = timestamp_offsets
+        self.page_lower, self.page_names = _lower_codes(pools['page'])
+        self.device_lower, self.device_names = _lower_codes(pools['device'])
+        self.browser_lower, self.browser_names = _lower_codes(pools['browser'])
+
+    @classmethod
+    def from_records(cls, records):
+        """Build from parsed log entries (``iter_records`` output), holding one entry at a time."""
+        pools = {name: {} for name in ('page', 'device', 'browser', 'user_agent', 'asset_url', 'asset_type')}
+        page_index, device_index, browser_index, ua_index, url_index, type_index = pools.values()
+        page, prev_page, entry_page, device, browser, user_agent = (array('i') for _ in range(6))
+        screen_width, load_time, ts = array('d'), array('d'), array('d')
+        asset_offsets, asset_url, asset_type, asset_from_cache = array('q', [0]), array('i'), array('i'), array('b')
+        timestamps, timestamp_offsets = bytearray(), array('q', [0])
+        width_ints = load_ints = True
+        for entry in records:
+            page.append(page_index.setdefault(entry['page'], len(page_index)))
+            nav_path = entry['navPath']
+            prev_page.append(page_index.setdefault(nav_path[-2], len(page_index)) if len(nav_path) >= 2 else -1)
+            entry_page.append(page_index.setdefault(nav_path[0], len(page_index)) if nav_path else -1)
+            device.append(device_index.setdefault(entry['device'], len(device_index)))
+            browser.append(browser_index.setdefault(entry['browser'], len(browser_index)))
+            user_agent.append(ua_index.setdefault(entry['userAgent'], len(ua_index)))
+            width, load = entry['screenWidth'], entry['loadTime']
+            width_ints = width_ints and type(width) is int
+            load_ints = load_ints and type(load) is int
+            screen_width.append(width)
+            load_time.append(load)
+            timestamp = entry['timestamp']
+            ts.append(timestamp_key(timestamp))
+            timestamps += timestamp.encode() if isinstance(timestamp, str) else b''
+            timestamp_offsets.append(len(timestamps))
+            for asset in entry.get('assets', []):
+                asset_url.append(url_index.setdefault(asset.get('url'), len(url_index)))
+                asset_type.append(type_index.setdefault(asset.get('type'), len(type_index)))
+                asset_from_cache.append(bool(asset.get('fromCache', False)))
+            asset_offsets.append(len(asset_url))
+
+        columns = {
+            'page': np.frombuffer(page, dtype=np.int32), 'prev_page': np.frombuffer(prev_page, dtype=np.int32),
+            'entry_page': np.frombuffer(entry_page, dtype=np.int32),
+            'device': np.frombuffer(device, dtype=np.int32), 'browser': np.frombuffer(browser, dtype=np.int32),
+            'user_agent': np.frombuffer(user_agent, dtype=np.int32),
+            'screen_width': _numeric(screen_width, width_ints), 'load_time': _numeric(load_time, load_ints),
+            'ts': np.frombuffer(ts, dtype=np.float64),
+            'asset_offsets': np.frombuffer(asset_offsets, dtype=np.int64),
+            'asset_url': np.frombuffer(asset_url, dtype=np.int32), 'asset_type': np.frombuffer(asset_type, dtype=np.int32),
+            'asset_from_cache': np.frombuffer(asset_from_cache, dtype=np.int8).astype(bool),
+        }
+        columns['cache_hits'] = np.add.reduceat(np.append(columns['asset_from_cache'], False).astype(np.int32),
+                                                columns['asset_offsets'][:-1]) if len(page) else np.zeros(0, np.int32)
+        # reduceat repeats the value at an offset for empty slices; those rows have no assets at all
+        columns['cache_hits'][np.diff(columns['asset_offsets']) == 0] = 0
+        pools = {name: _intern(index) for name, index in pools.items()}
+        return cls(columns, pools, {'screenWidth': width_ints, 'loadTime': load_ints}, bytes(timestamps),
+                   np.frombuffer(timestamp_offsets, dtype=np.int64))
+
+    @classmethod
+    def from_log(cls, file_path, stats=None):
+        """Stream a log (any format ``log_stream`` reads) into a table, skipping invalid entries as the loaders do."""
+        return cls.from_records(iter_records(file_path, REQUIRED_KEYS, stats))
+
+    def __len__(self):
+        return len(self.page)
+
+    def timestamp(self, i):
+        return self._timestamps[self._timestamp_offsets[i]:self._timestamp_offsets[i + 1]].decode()
+
+    @property
+    def nbytes(self):
+        """Bytes held by the columns, the timestamp buffer and the interned strings."""
+        arrays = [value for value in self.__dict__.values() if isinstance(value, np.ndarray)]
+        strings = [name for pool in list(self.pools.values()) + [self.page_names, self.device_names,
+                                                                  self.browser_names] for name in pool]
+        return (sum(a.nbytes for a in arrays) + len(self._timestamps)
+                + sum(sys.getsizeof(name) for name in strings if isinstance(name, str)))
+
+    def _prev_page_lower(self, rows):
+        # A missing previous page is code -1, whose lower-cased code is -1 too: the trailing 'none'
+        return self.page_names[self.page_lower[self.prev_page[rows]]]
+
+    def feature_table(self):
+        """``train_model.extract_feature_table`` on this log: the same DataFrame, targets and counts."""
+        import pandas as pd
+
+        if len(self) < 2:
+            logger.error("No features extracted.")
+            raise ValueError("No features extracted.")
+        page = self.page_lower[self.page]
+        pairs = page[:-1].astype(np.int64) * len(self.page_names) + page[1:]
+        unique_pairs, first, inverse, counts = np.unique(pairs, return_index=True, return_inverse=True,
+                                                         return_counts=True)
+        # Counter(transitions) keeps first-seen order; each distinct pair is looked up once, as extract_features does
+        seen_order = np.argsort(first, kind='stable')
+        keys = [(self.page_names[pair // len(self.page_names)], self.page_names[pair % len(self.page_names)])
+                for pair in unique_pairs.tolist()]
+        transition_freq = Counter({keys[j]: int(counts[j]) for j in seen_order.tolist()})
+        logger.info(f"Page transitions: {transition_freq}")
+        pair_freq = np.array([transition_freq.get(f"{src}_{dst}", 0) for src, dst in keys], dtype=np.int64)
+
+        rows = np.arange(len(self) - 1)
+        df = pd.DataFrame({
+            'page': self.page_names[page[:-1]],
+            'prev_page': self._prev_page_lower(rows),
+            'device': self.device_names[self.device_lower[self.device[:-1]]],
+            'browser': self.browser_names[self.browser_lower[self.browser[:-1]]],
+            'screenWidth': self.screen_width[:-1],
+            'loadTime': self.load_time[:-1],
+            'transition_frequency': pair_freq[inverse],
+        })
+        next_pages = self.page_names[page[1:]].tolist()
+        return df, next_pages, transition_freq
+
+    def prediction_columns(self, page_map):
+        """``evaluate.extract_prediction_columns`` after the vocabulary filter and timestamp sort, or None
+        when fewer than two rows are in ``page_map``.
+
+        Rows are ordered by ``timestamp_key``, stably, where ``evaluate`` sorts on ``pd.to_datetime``;
+        the two agree on ISO-8601 timestamps.
+        """
+        import pandas as pd
+
+        page = self.page_lower[self.page]
+        in_vocabulary = np.array([name in page_map for name in self.page_names])
+        valid = np.flatnonzero(in_vocabulary[page])
+        logger.info(f"Valid pages after filtering: {len(valid)}")
+        if len(valid) < 2:
+            return None
+        order = valid[np.argsort(self.ts[valid], kind='stable')]
+        rows, next_rows = order[:-1], order[1:]
+        n_rows = len(rows)
+        # As in evaluate, the transition target comes from the unfiltered, unsorted log
+        transition_next = self.page_names[page[1:n_rows + 1]].tolist()
+        transition_next += ['none'] * (n_rows - len(transition_next))
+        return pd.DataFrame({
+            'page': self.page_names[page[rows]],
+            'prev_page': self._prev_page_lower(rows),
+            'device': self.device_names[self.device_lower[self.device[rows]]],
+            'browser': self.browser_names[self.browser_lower[self.browser[rows]]],
+            'screenWidth': self.screen_width[rows],
+            'loadTime': self.load_time[rows],
+            'transition_next': transition_next,
+            'actual': self.page_names[page[next_rows]],
+            'next_cache_hit': self.cache_hits[next_rows] > 0,
+            'next_load_time': self.load_time[next_rows],
+            'entry_page': self.page_names[self.page_lower[self.entry_page[rows]]],
+            'ts': self.ts[rows],
+        })
+
+    def latest_entries(self):
+        """Per page, its latest entry (first on ties) with assets deduplicated, for ``AssetMapState.merge``."""
+        if not len(self):
+            return []
+        order = np.lexsort((np.arange(len(self)), -self.ts, self.page))
+        first = order[np.r_[True, self.page[order][1:] != self.page[order][:-1]]]
+        # Page codes also count navPath pages, so emit pages in the order they first appear as a page, as merge does
+        first = first[np.argsort(np.unique(self.page, return_index=True)[1], kind='stable')]
+        urls, types = self.pools['asset_url'], self.pools['asset_type']
+        entries = []
+        for i in first.tolist():
+            seen = set()
+            assets = []
+            for j in range(self.asset_offsets[i], self.asset_offsets[i + 1]):
+                key = (self.asset_url[j], self.asset_type[j])
+                if key not in seen:
+                    seen.add(key)
+                    assets.append({'url': urls[key[0]], 'type': types[key[1]],
+                                   'fromCache': bool(self.asset_from_cache[j])})
+            entries.append({'page': self.pools['page'][self.page[i]], 'timestamp': self.timestamp(i),
+                            'assets': assets})
+        return entries
+
+    def summary(self):
+        return {'rows': len(self), 'assets': len(self.asset_url), 'bytes': self.nbytes,
+                **{f"distinct_{name}": len(pool) - 1 for name, pool in self.pools.items()}}
+
+def measure(path, representation):
+    """Load ``path`` as dicts or as a table and extract training features; RSS and timings."""
+    import pandas as pd  # noqa: F401 -- imported before measuring, so neither side pays for it
+
+    from instrumentation import RssSampler, current_rss_mb
+    from train_model import extract_feature_table
+
+    train_logger = logging.getLogger('train_model')
+    train_logger.setLevel(logging.WARNING)
+    logger.setLevel(logging.WARNING)
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    with RssSampler() as rss:
+        if representation == 'table':
+            data = VisitTable.from_log(path)
+        else:
+            # The dict baseline being measured: every record held in memory
+            data = list(iter_records(path, REQUIRED_KEYS))
+    load_s = time.perf_counter() - start
+    rss_loaded = current_rss_mb()
+    start = time.perf_counter()
+    df, next_pages, transition_freq = (data.feature_table() if representation == 'table'
+                                       else extract_feature_table(data))
+    extract_s = time.perf_counter() - start
+    rows = len(data)
+    return {
+        'representation': representation, 'rows': rows, 'load_s': round(load_s, 3),
+        'resident_mb': round(rss_loaded - rss_before, 1),
+        'mb_per_million': round((rss_loaded - rss_before) / rows * 1e6, 1),
+        'extract_s': round(extract_s, 3), 'extract_rows_per_sec': round((rows - 1) / extract_s),
+        'load_peak_mb': round(rss.peak - rss_before, 1),
+    }
+
+def verify_parity(path):
+    """Check that the table reproduces the dict-based feature, prediction and asset-map outputs."""
+    import pandas as pd
+
+    from evaluate import extract_prediction_columns, filter_data_by_model_vocabulary
+    from generate_asset_map import AssetMapState
+    from train_model import extract_feature_table
+
+    # Parity needs the dict-based outputs too, so this check holds the whole log
+    data = list(iter_records(path, REQUIRED_KEYS))
+    table = VisitTable.from_records(data)
+    df, next_pages, transition_freq = extract_feature_table(data)
+    table_df, table_next, table_freq = table.feature_table()
+    pd.testing.assert_frame_equal(df, table_df)
+    assert next_pages == table_next and transition_freq == table_freq, 'targets or transition counts differ'
+
+    page_map = {page: idx for idx, page in enumerate(sorted(set(next_pages))[::2])}
+    valid_data = filter_data_by_model_vocabulary(data, page_map)
+    valid_data.sort(key=lambda x: pd.to_datetime(x['timestamp']))
+    pd.testing.assert_frame_equal(extract_prediction_columns(valid_data, data), table.prediction_columns(page_map))
+
+    from_dicts, from_table = AssetMapState(), AssetMapState()
+    from_dicts.merge(data)
+    from_table.merge(table.latest_entries())
+    assert json.dumps(from_dicts.asset_map()) == json.dumps(from_table.asset_map()), 'asset maps differ'
+    logger.info(f"Parity: features, prediction columns and asset map identical on {len(data)} rows")
+
+def bench(args):
+    from synthetic_logs import write_visits
+
+    results = []
+    os.makedirs(args.data_dir, exist_ok=True)
+    for size in args.bench_sizes:
+        path = os.path.join(args.data_dir, f"visits-{size}-seed{args.seed}.ndjson")
+        if not os.path.exists(path):
+            write_visits(f"{path}.tmp", size, seed=args.seed)
+            os.replace(f"{path}.tmp", path)
+        if size == args.bench_sizes[0]:
+            verify_parity(path)
+        size_results = {}
+        for representation in ('dicts', 'table'):
+            # A fresh interpreter per measurement, so one representation's garbage does not inflate the other
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--measure', representation, path],
+                                  capture_output=True, text=True)
+            if proc.returncode != 0:
+                logger.error(f"Measuring {representation} on {size} visits failed:\n{proc.stderr.strip()[-2000:]}")
+                sys.exit(1)
+            size_results[representation] = json.loads(proc.stdout.strip().splitlines()[-1])
+        dicts, table = size_results['dicts'], size_results['table']
+        logger.info(f"{size} visits: dicts {dicts['mb_per_million']:.0f} MB/M visits, load {dicts['load_s']:.2f}s, "
+                    f"extract {dicts['extract_rows_per_sec']} rows/sec; table {table['mb_per_million']:.0f} MB/M "
+                    f"visits, load {table['load_s']:.2f}s, extract {table['extract_rows_per_sec']} rows/sec "
+                    f"({dicts['resident_mb'] / max(table['resident_mb'], 0.1):.0f}x less memory, "
+                    f"{dicts['extract_s'] / table['extract_s']:.0f}x faster extraction)")
+        results.append({'visits': size, **size_results})
+    with open(args.bench_output, 'w') as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Benchmark saved to {args.bench_output}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load a log into the interned columnar visit table and report its size.')
+    parser.add_argument('--data', default='predictpulse_mockdata.json',
+                        help='JSON array, NDJSON, .gz/.zst NDJSON or log store directory')
+    parser.add_argument('--bench', action='store_true',
+                        help='Compare memory and feature-extraction throughput against lists of dicts')
+    parser.add_argument('--bench-sizes', type=int, nargs='+', default=DEFAULT_BENCH_SIZES,
+                        help='Synthetic visits per benchmark log')
+    parser.add_argument('--data-dir', default='.bench_data', help='Generated benchmark logs, reused between runs')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bench-output', default=DEFAULT_BENCH_OUTPUT)
+    parser.add_argument('--measure', nargs=2, metavar=('REPRESENTATION', 'DATA'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        print(json.dumps(measure(args.measure[1], args.measure[0])))
+        return
+    if args.bench:
+        bench(args)
+        return
+    if not os.path.exists(args.data):
+        logger.error(f"{args.data} does not exist")
+        sys.exit(1)
+    start = time.perf_counter()
+    stats = {}
+    table = VisitTable.from_log(args.data, stats)
+    summary = table.summary()
+    logger.info(f"Loaded {summary['rows']} of {stats['total']} entries in {time.perf_counter() - start:.2f}s: "
+                f"{summary['bytes'] / (1024 * 1024):.1f} MB, {summary['distinct_page']} pages, "
+                f"{summary['distinct_user_agent']} user agents, {summary['distinct_asset_url']} asset URLs; "
+                f"peak RSS {peak_rss_mb():.1f} MB")
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()